@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import sys
+from typing import Awaitable, Callable, Optional
+
+import utils
+from commands import AsyncInProcessExecutor, AsyncSocketExecutor, DeviceError
+from constant import (
+    FILENAME_MAIN_SSD,
+    FILENAME_SCRIPT_DEFAULT,
+    MESSAGE_DONE,
+    MESSAGE_ERROR,
+    MESSAGE_FAIL,
+    MESSAGE_HELP,
+    MESSAGE_INVALID_SHELL_CMD,
+    MESSAGE_PASS,
+    ShellCommandEnum
+)
+from logger import Logger
+from nand_image import device_capacity
+from shell import ONE_ARGS_REQUIRE_COMMANDS, TWO_ARGS_REQUIRE_COMMANDS, ShellParser
+
+ALL_LBAS = (0, sys.maxsize)
+
+
+class AsyncSSDController:
+    """SSDController whose commands can be in flight together.
+
+    Every method submits its command immediately and returns a task to await. A command
+    waits only for earlier in-flight commands whose LBAs overlap its own, and F waits
+    for everything, so the results are the same as issuing the commands one by one in
+    call order.
+    """
+
+    def __init__(self, executor) -> None:
+        self.executor = executor
+        self._in_flight: list[tuple[int, int, asyncio.Task]] = []
+        self._capacity: Optional[int] = None
+        self._local_capacity: Optional[int] = None
+
+    def _submit(self, start: int, end: int, args: list, done_or_error: bool = False) -> asyncio.Task:
+        if not isinstance(start, int) or not isinstance(end, int):
+            start, end = 0, 0  # the SSD rejects it; it cannot conflict with anything
+        earlier = [task for s, e, task in self._in_flight if s < end and start < e]
+        args = [FILENAME_MAIN_SSD] + [str(arg) for arg in args]
+        task = asyncio.ensure_future(self._run_after(earlier, args, done_or_error))
+        entry = (start, end, task)
+        self._in_flight.append(entry)
+        task.add_done_callback(lambda _: self._in_flight.remove(entry))
+        return task
+
+    async def _run_after(self, earlier: list[asyncio.Task], args: list[str], done_or_error: bool) -> str:
+        if earlier:
+            await asyncio.wait(earlier)
+        output = await self.executor.run(args)
+        if output is None:
+            return MESSAGE_ERROR
+        if done_or_error:
+            return MESSAGE_DONE if output == "" else MESSAGE_ERROR
+        return output
+
+    def read(self, lba: int) -> asyncio.Task:
+        return self._submit(lba, lba + 1, ["R", lba])
+
+    def write(self, lba: int, value: str) -> asyncio.Task:
+        return self._submit(lba, lba + 1, ["W", lba, value], done_or_error=True)
+
+    def read_range(self, start: int, end: int) -> asyncio.Task:
+        return self._submit(start, end, ["RR", start, end])
+
+    def write_range(self, start: int, end: int, value: str) -> asyncio.Task:
+        return self._submit(start, end, ["RW", start, end, value], done_or_error=True)
+
+    def erase(self, lba: int, size: int) -> asyncio.Task:
+        return self._submit(lba, lba + size, ["E", lba, size], done_or_error=True)
+
+    def flush(self) -> asyncio.Task:
+        return self._submit(*ALL_LBAS, ["F"], done_or_error=True)
+
+    async def capacity(self) -> int:
+        """Ask the device once, and again after the device here has been formatted to another capacity.
+
+        Commands that validate against it await it before submitting, so it should be
+        known before they are pipelined behind other commands. Raises DeviceError when
+        the device does not answer.
+        """
+        local_capacity = device_capacity()
+        if self._capacity is None or local_capacity != self._local_capacity:
+            output = await self._submit(0, 0, ["I"])
+            if not output.isdigit():
+                raise DeviceError("the device did not report its capacity")
+            self._capacity, self._local_capacity = int(output), local_capacity
+        return self._capacity
+
+    async def close(self) -> None:
+        await self.executor.close()
+
+
+class AsyncCommandExecutor:
+    """CommandExecutor on top of AsyncSSDController, with the same messages."""
+    logging: Callable = Logger().print
+
+    def __init__(self, ssd_controller: AsyncSSDController) -> None:
+        self.ssd_controller = ssd_controller
+
+    async def read(self, lba: int) -> str:
+        lba = utils.safe_int(lba)
+        ret = await self.ssd_controller.read(lba)
+        if ret == MESSAGE_ERROR:
+            return "[Read] ERROR"
+
+        self.logging("... COMPLETE")
+        return f"[Read] LBA {lba:02d} : {ret}"
+
+    async def write(self, lba: int, value: str) -> str:
+        lba = utils.safe_int(lba)
+        ret = await self.ssd_controller.write(lba, value)
+        if ret == MESSAGE_ERROR:
+            return "[Write] ERROR"
+
+        self.logging("... COMPLETE")
+        return "[Write] Done"
+
+    async def full_write(self, value: str) -> str:
+        ret = await self.ssd_controller.write_range(0, await self.ssd_controller.capacity(), value)
+        if ret == MESSAGE_ERROR:
+            return "[Full Write] ERROR"
+
+        self.logging("... COMPLETE")
+        return "[Full Write] Done"
+
+    async def full_read(self, num_iter: Optional[int] = None) -> str:
+        header = "[Full Read]"
+        num_iter = num_iter or await self.ssd_controller.capacity()
+        values = (await self.ssd_controller.read_range(0, num_iter)).split()
+        if len(values) != num_iter:
+            return f"{header} ERROR"
+
+        results = [header]
+        results += [f"LBA {i:0>2} : {value}" for i, value in enumerate(values)]
+        self.logging("... COMPLETE")
+        return "\n".join(results)
+
+    async def erase(self, lba: int, size: int) -> str:
+        lba = utils.safe_int(lba)
+        size = utils.safe_int(size)
+
+        if not utils.validate_erase_args(lba, size, await self.ssd_controller.capacity()):
+            return "[Erase] ERROR"
+
+        if await self.ssd_controller.erase(lba=lba, size=size) == MESSAGE_ERROR:
+            return "[Erase] ERROR"
+
+        self.logging("... COMPLETE")
+        return "[Erase] Done"
+
+    async def erase_range(self, start_lba: int, end_lba: int) -> str:
+        start_lba = utils.safe_int(start_lba)
+        end_lba = utils.safe_int(end_lba)
+
+        if not utils.validate_erase_range_args(start_lba, end_lba, await self.ssd_controller.capacity()):
+            return "[Erase Range] ERROR"
+
+        ret = await self.erase(start_lba, end_lba - start_lba + 1)
+        if MESSAGE_ERROR in ret:
+            return "[Erase Range] ERROR"
+
+        self.logging("... COMPLETE")
+        return "[Erase Range] Done"
+
+    async def flush(self) -> str:
+        ret = await self.ssd_controller.flush()
+        if ret == MESSAGE_ERROR:
+            return "[Flush] ERROR"
+
+        self.logging("... COMPLETE")
+        return "[Flush] Done"
+
+
+class AsyncScriptExecutor:
+    """The test scripts, submitting each group of independent commands as one pipeline."""
+    logging: Callable = Logger().print
+
+    def __init__(self, ssd_controller: AsyncSSDController, command_executor: AsyncCommandExecutor) -> None:
+        self.ssd_controller = ssd_controller
+        self.command_executor = command_executor
+
+    async def _write_then_compare(self, lbas: list[int], value: str) -> bool:
+        # Reads are queued right behind the writes; per-LBA ordering makes them see the new value.
+        writes = [self.ssd_controller.write(lba, value) for lba in lbas]
+        reads = [self.ssd_controller.read(lba) for lba in lbas]
+        results = await asyncio.gather(*writes, *reads)
+        return MESSAGE_ERROR not in results[:len(lbas)] and all(ret == value for ret in results[len(lbas):])
+
+    async def script_1(self, num_iter: int = 20) -> str:
+        for n in range(num_iter):
+            if not await self._write_then_compare(list(range(n * 5, n * 5 + 5)), utils.get_random_value()):
+                return MESSAGE_FAIL
+
+        self.logging("... COMPLETE")
+        return MESSAGE_PASS
+
+    async def script_2(self, num_iter: int = 30) -> str:
+        for _ in range(num_iter):
+            if not await self._write_then_compare([4, 0, 3, 1, 2], utils.get_random_value()):
+                return MESSAGE_FAIL
+
+        self.logging("... COMPLETE")
+        return MESSAGE_PASS
+
+    async def script_3(self, num_iter: int = 200) -> str:
+        lba_1, lba_2 = (0, await self.ssd_controller.capacity() - 1)
+        for _ in range(num_iter):
+            value = utils.get_random_value()
+            _, _, value_1, value_2 = await asyncio.gather(
+                self.ssd_controller.write(lba=lba_1, value=value),
+                self.ssd_controller.write(lba=lba_2, value=value),
+                self.ssd_controller.read(lba_1),
+                self.ssd_controller.read(lba_2),
+            )
+            if value_1 != value_2:
+                return MESSAGE_FAIL
+
+        self.logging("... COMPLETE")
+        return MESSAGE_PASS
+
+    async def script_4(self, num_iter: int = 30) -> str:
+        ret = await self.command_executor.erase_range(0, 2)
+        if MESSAGE_ERROR in ret:
+            return MESSAGE_FAIL
+
+        capacity = await self.ssd_controller.capacity()
+        for _ in range(num_iter):
+            steps = []
+            for start_lba in range(2, capacity - 1, 2):
+                end_lba = min(start_lba + 2, capacity - 1)
+                steps += [self.command_executor.write(start_lba, val) for val in utils.get_two_diff_random_value()]
+                steps.append(self.command_executor.erase_range(start_lba, end_lba))
+            if any(MESSAGE_ERROR in ret for ret in await asyncio.gather(*steps)):
+                return MESSAGE_FAIL
+
+        self.logging("... COMPLETE")
+        return MESSAGE_PASS
+
+
+class AsyncShell:
+    """Shell that keeps reading commands while earlier ones are still running.
+
+    Results are printed in input order. Piping a command file into it runs the whole
+    file as one pipeline.
+    """
+    logging: Callable = Logger().print
+    shell_parser = ShellParser
+
+    def __init__(self, ssd_controller: AsyncSSDController) -> None:
+        self.ssd_controller = ssd_controller
+        self.command_executor = AsyncCommandExecutor(ssd_controller)
+        self.script_executor = AsyncScriptExecutor(ssd_controller, self.command_executor)
+        self._command_mapping_dict = {
+            ShellCommandEnum.READ: self.command_executor.read,
+            ShellCommandEnum.WRITE: self.command_executor.write,
+            ShellCommandEnum.FULLREAD: self.command_executor.full_read,
+            ShellCommandEnum.FULLWRITE: self.command_executor.full_write,
+            ShellCommandEnum.ERASE: self.command_executor.erase,
+            ShellCommandEnum.ERASE_RANGE: self.command_executor.erase_range,
+            ShellCommandEnum.FLUSH: self.command_executor.flush,
+            ShellCommandEnum.SCRIPT_1: self.script_executor.script_1,
+            ShellCommandEnum.SCRIPT_2: self.script_executor.script_2,
+            ShellCommandEnum.SCRIPT_3: self.script_executor.script_3,
+            ShellCommandEnum.SCRIPT_4: self.script_executor.script_4,
+        }
+
+    def parse(self, user_input: str) -> tuple[Optional[ShellCommandEnum], list]:
+        parts = user_input.split()
+        if not parts:
+            return None, []
+
+        cmd, args = self.shell_parser.find_command(parts[0]), parts[1:]
+        if cmd in TWO_ARGS_REQUIRE_COMMANDS and len(args) != 2:
+            return ShellCommandEnum.INVALID, []
+        if cmd in ONE_ARGS_REQUIRE_COMMANDS and len(args) != 1:
+            return ShellCommandEnum.INVALID, []
+        return cmd, args
+
+    async def execute_command(self, cmd: ShellCommandEnum, args: list) -> str:
+        if cmd == ShellCommandEnum.HELP:
+            return MESSAGE_HELP
+        func: Optional[Callable[..., Awaitable[str]]] = self._command_mapping_dict.get(cmd)
+        if func is None:
+            return MESSAGE_INVALID_SHELL_CMD
+        try:
+            return await func(*args)
+        except TypeError:
+            return MESSAGE_INVALID_SHELL_CMD
+        except DeviceError:
+            return MESSAGE_ERROR
+
+    async def run_lines(self, lines) -> list[str]:
+        """Submit every line without waiting, then collect the results in order."""
+        with contextlib.suppress(DeviceError):
+            await self.ssd_controller.capacity()
+        tasks = []
+        for line in lines:
+            cmd, args = self.parse(line)
+            if cmd is None:
+                continue
+            self.logging(f"Command: {cmd.name} ({args})")
+            if cmd == ShellCommandEnum.EXIT:
+                break
+            tasks.append(asyncio.ensure_future(self.execute_command(cmd, args)))
+        return list(await asyncio.gather(*tasks))
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        pending: asyncio.Queue = asyncio.Queue()
+
+        async def print_results() -> None:
+            while (task := await pending.get()) is not None:
+                print(await task)
+
+        with contextlib.suppress(DeviceError):
+            await self.ssd_controller.capacity()
+        printer = asyncio.ensure_future(print_results())
+        while True:
+            try:
+                user_input = await loop.run_in_executor(None, input, "Shell> " if sys.stdin.isatty() else "")
+            except (KeyboardInterrupt, EOFError):
+                break
+            cmd, args = self.parse(user_input)
+            if cmd is None:
+                continue
+            self.logging(f"Command: {cmd.name} ({args})")
+            if cmd == ShellCommandEnum.EXIT:
+                break
+            pending.put_nowait(asyncio.ensure_future(self.execute_command(cmd, args)))
+
+        pending.put_nowait(None)
+        await printer
+
+    async def run_script(self, script: str = FILENAME_SCRIPT_DEFAULT) -> None:
+        try:
+            with open(script, "r") as f:
+                cmds = f.readlines()
+
+        except FileNotFoundError:
+            print(MESSAGE_ERROR)
+            return
+
+        for cmd in cmds:
+            cmd_enum = self.shell_parser.find_command(command_str=cmd.strip())
+            print(f"{cmd_enum.value:<28}___   Run...", end="", flush=True)
+            if cmd_enum == ShellCommandEnum.EXIT:
+                break
+            ret = await self.execute_command(cmd_enum, args=[])
+            if ret == MESSAGE_PASS:
+                print("Pass")
+            else:
+                print("FAIL!")
+                break
+
+
+ASYNC_SSD_EXECUTORS = {
+    "socket": AsyncSocketExecutor,
+    "inprocess": AsyncInProcessExecutor,
+}
+
+
+async def main(script: Optional[str], backend: str, device: Optional[str] = None) -> None:
+    executor = AsyncSocketExecutor(device=device) if device else ASYNC_SSD_EXECUTORS[backend]()
+    ssd_controller = AsyncSSDController(executor)
+    shell = AsyncShell(ssd_controller)
+    try:
+        if script:
+            await shell.run_script(script=script)
+        else:
+            await shell.run()
+    finally:
+        await ssd_controller.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("script", nargs="?")
+    parser.add_argument("--backend", choices=ASYNC_SSD_EXECUTORS, default="socket")
+    parser.add_argument("--device", help="device of an `ssd.py --serve-devices` daemon (implies socket)")
+    parsed = parser.parse_args()
+    Logger().enable_async()
+    asyncio.run(main(parsed.script, parsed.backend, parsed.device))
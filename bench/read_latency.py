@@ -0,0 +1,59 @@
+"""p50/p99 latency of R commands against buffer fullness.
+
+    python -m bench.read_latency [--reads N]
+
+Each level seeds the buffer with that many pending writes and times single-LBA reads
+of unbuffered LBAs through SSD.run. Reads never flush, so the columns stay flat.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from bench.stats import percentile
+from buffer_manager import Buffer, BufferManager
+from constant import SIZE_LBA
+from ssd import SSD, FileManager
+
+
+def measure(fullness: int, reads: int) -> list[float]:
+    if not 0 <= fullness < SIZE_LBA:
+        raise ValueError(f"fullness should leave some of the {SIZE_LBA} LBAs unbuffered")
+    ssd = SSD(file_manager=FileManager(), buffer_manager=BufferManager(), write_output_file=False)
+    ssd.buffer_manager.set_buffer(
+        [Buffer(command="W", lba=lba, data="0xABCDABCD") for lba in range(fullness)]
+    )
+
+    samples = []
+    for i in range(reads):
+        lba = SIZE_LBA - 1 - i % (SIZE_LBA - fullness)
+        begin = time.perf_counter()
+        ssd.run([None, "R", str(lba)])
+        samples.append(time.perf_counter() - begin)
+    assert len(ssd.buffer_manager) == fullness
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reads", type=int, default=1000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            # At least one LBA has to stay unbuffered to be read from the NAND.
+            depth = min(BufferManager().depth, SIZE_LBA - 1)
+            print(f"{'buffered':>8} {'p50 (us)':>10} {'p99 (us)':>10}")
+            for fullness in range(depth + 1):
+                samples = measure(fullness, args.reads)
+                print(f"{fullness:>8} {statistics.median(samples) * 1e6:>10.1f} "
+                      f"{percentile(samples, 99) * 1e6:>10.1f}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
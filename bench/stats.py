@@ -0,0 +1,18 @@
+import statistics
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples: list[float]) -> dict:
+    """Count, throughput and p50/p95/p99 latency in microseconds of one command's samples."""
+    total = sum(samples)
+    return {
+        "count": len(samples),
+        "ops_per_sec": len(samples) / total if total else 0.0,
+        "p50_us": statistics.median(samples) * 1e6,
+        "p95_us": percentile(samples, 95) * 1e6,
+        "p99_us": percentile(samples, 99) * 1e6,
+    }
@@ -0,0 +1,335 @@
+"""Throughput and per-command latency of SSD workloads across storage and transport backends.
+
+    python -m bench.suite [--ops N] [--storages text,image,sparse] [--transports inprocess,socket]
+                          [--workloads ...] [--mix R:W:E] [--seed N] [--json results.json]
+                          [--ftl greedy|cost_benefit] [--buffer-depth N]
+
+Every (storage, transport, workload) run gets a fresh device in its own temporary
+directory. Workloads drive an SSDController class, and the ScriptExecutor scripts run
+unchanged on top of it. Every controller call is timed and reported under its ssd.py
+command (R, W, RR, RW, E, F). The "process" transport spawns ssd.py per command and is
+left out of the default set.
+
+With --ftl the device runs on the simulated flash translation layer (see ftl.py) and
+every result also reports its write amplification, GC stall time and block wear. The
+buffer is flushed at the end of such a run so every accepted write reaches the flash;
+comparing --buffer-depth values shows how much the buffer merging saves the flash.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from bench.stats import summarize
+from buffer_manager import BUFFER_DEPTH_ENV
+from commands import InProcessExecutor, SocketExecutor
+from constant import FILENAME_MAIN_SSD, MESSAGE_ERROR, MESSAGE_PASS, SIZE_LBA, SOCKET_PATH
+from ftl import FTL_ENV, FTL_POLICIES
+from logger import Logger
+from shell import InProcessSSDController, ScriptExecutor, SocketSSDController, SSDController
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORAGES = ("text", "image", "sparse")
+TRANSPORTS = ("inprocess", "socket", "process")
+DEFAULT_TRANSPORTS = ("inprocess", "socket")
+TIMED_COMMANDS = {
+    "read": "R",
+    "write": "W",
+    "read_range": "RR",
+    "write_range": "RW",
+    "erase": "E",
+    "flush": "F",
+}
+VALUE = "0x0000ABCD"
+SERVER_START_TIMEOUT = 10.0
+
+
+def timed_controller(controller: type[SSDController], samples: dict[str, list[float]]) -> type[SSDController]:
+    """Subclass of `controller` whose commands append their latency to samples[command]."""
+
+    def timed(name: str, command: str) -> classmethod:
+        method = getattr(controller, name)
+
+        def timed_method(cls, *args, **kwargs):
+            begin = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                samples[command].append(time.perf_counter() - begin)
+
+        return classmethod(timed_method)
+
+    return type(
+        f"Timed{controller.__name__}",
+        (controller,),
+        {name: timed(name, command) for name, command in TIMED_COMMANDS.items()},
+    )
+
+
+@contextmanager
+def device_env(ftl: Optional[str], buffer_depth: Optional[int]) -> Iterator[None]:
+    """Set $SSD_FTL and $SSD_BUFFER_DEPTH for the run, including the ssd.py processes it starts."""
+    saved = {name: os.environ.get(name) for name in (FTL_ENV, BUFFER_DEPTH_ENV)}
+    for name, value in ((FTL_ENV, ftl), (BUFFER_DEPTH_ENV, buffer_depth)):
+        if value is not None:
+            os.environ[name] = str(value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def format_storage(storage: str) -> None:
+    # Importing ssd creates the NAND and buffer files in the current directory.
+    from ssd import format_device
+
+    if storage != "text":
+        format_device(SIZE_LBA, storage)
+
+
+def flash_stats() -> Optional[dict]:
+    # format_storage() already imported ssd inside the device directory.
+    from ssd import ftl_stats
+
+    return ftl_stats()
+
+
+@contextmanager
+def inprocess_transport() -> Iterator[type[SSDController]]:
+    yield type("BenchInProcessSSDController", (InProcessSSDController,), {
+        "executor": InProcessExecutor(),
+        "_capacity": None,
+    })
+
+
+@contextmanager
+def socket_transport() -> Iterator[type[SSDController]]:
+    server = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, FILENAME_MAIN_SSD), "--serve"])
+    executor = SocketExecutor(os.path.abspath(SOCKET_PATH))
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while not os.path.exists(SOCKET_PATH):
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("ssd.py --serve did not start")
+            time.sleep(0.01)
+        yield type("BenchSocketSSDController", (SocketSSDController,), {
+            "executor": executor,
+            "_capacity": None,
+        })
+    finally:
+        executor.close()
+        server.terminate()
+        server.wait()
+
+
+@contextmanager
+def process_transport() -> Iterator[type[SSDController]]:
+    # ProcessExecutor runs "python ssd.py" in the current directory.
+    os.symlink(os.path.join(REPO_DIR, FILENAME_MAIN_SSD), FILENAME_MAIN_SSD)
+    yield SSDController
+
+
+TRANSPORT_FACTORIES: dict[str, Callable] = {
+    "inprocess": inprocess_transport,
+    "socket": socket_transport,
+    "process": process_transport,
+}
+
+
+def sequential_write(controller: type[SSDController], ops: int, rng: random.Random, mix) -> bool:
+    capacity = controller.capacity()
+    return all(controller.write(lba % capacity, VALUE) != MESSAGE_ERROR for lba in range(ops))
+
+
+def random_write(controller: type[SSDController], ops: int, rng: random.Random, mix) -> bool:
+    capacity = controller.capacity()
+    return all(controller.write(rng.randrange(capacity), VALUE) != MESSAGE_ERROR for _ in range(ops))
+
+
+def read_after_write(controller: type[SSDController], ops: int, rng: random.Random, mix) -> bool:
+    capacity = controller.capacity()
+    for _ in range(ops // 2):
+        lba, value = rng.randrange(capacity), f"0x{rng.getrandbits(32):08X}"
+        controller.write(lba, value)
+        if controller.read(lba) != value:
+            return False
+    return True
+
+
+def erase_heavy(controller: type[SSDController], ops: int, rng: random.Random, mix) -> bool:
+    """Three erases of 1-10 LBAs for every write."""
+    capacity = controller.capacity()
+    for op in range(ops):
+        lba = rng.randrange(capacity)
+        if op % 4 == 3:
+            ret = controller.write(lba, VALUE)
+        else:
+            ret = controller.erase(lba, min(rng.randint(1, 10), capacity - lba))
+        if ret == MESSAGE_ERROR:
+            return False
+    return True
+
+
+def mixed(controller: type[SSDController], ops: int, rng: random.Random, mix) -> bool:
+    """Single-LBA reads, writes and erases in the --mix ratio."""
+    capacity = controller.capacity()
+    commands = rng.choices(("R", "W", "E"), weights=mix, k=ops)
+    for command in commands:
+        lba = rng.randrange(capacity)
+        if command == "R":
+            ret = controller.read(lba)
+        elif command == "W":
+            ret = controller.write(lba, VALUE)
+        else:
+            ret = controller.erase(lba, 1)
+        if ret == MESSAGE_ERROR:
+            return False
+    return True
+
+
+def script(name: str) -> Callable:
+    def run_script(controller: type[SSDController], ops: int, rng: random.Random, mix) -> bool:
+        return getattr(ScriptExecutor.using(controller), name)() == MESSAGE_PASS
+
+    return run_script
+
+
+WORKLOADS: dict[str, Callable] = {
+    "sequential_write": sequential_write,
+    "random_write": random_write,
+    "read_after_write": read_after_write,
+    "erase_heavy": erase_heavy,
+    "mixed": mixed,
+    "script_1": script("script_1"),
+    "script_2": script("script_2"),
+    "script_3": script("script_3"),
+    "script_4": script("script_4"),
+}
+
+
+def run_workload(storage: str, transport: str, workload: str, ops: int, seed: int, mix=(1, 1, 1),
+                 ftl: Optional[str] = None, buffer_depth: Optional[int] = None) -> dict:
+    """Run one workload on a freshly formatted device in a temporary directory."""
+    samples: dict[str, list[float]] = defaultdict(list)
+    # The scripts draw their values from the module-level generator.
+    random.seed(seed)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, device_env(ftl, buffer_depth):
+        os.chdir(workdir)
+        try:
+            # The shell logger keeps the log path it was created with, usually a relative one.
+            os.makedirs(Logger().log_dir, exist_ok=True)
+            open(Logger().latest_log, "a").close()
+            format_storage(storage)
+            with TRANSPORT_FACTORIES[transport]() as controller:
+                begin = time.perf_counter()
+                ok = WORKLOADS[workload](timed_controller(controller, samples), ops, random.Random(seed), mix)
+                elapsed = time.perf_counter() - begin
+                if ftl is not None:
+                    controller.flush()
+            flash = flash_stats() if ftl is not None else None
+        finally:
+            os.chdir(cwd)
+
+    num_commands = sum(len(each) for each in samples.values())
+    return {
+        "storage": storage,
+        "transport": transport,
+        "workload": workload,
+        "ok": ok,
+        "commands": num_commands,
+        "seconds": elapsed,
+        "ops_per_sec": num_commands / elapsed if elapsed else 0.0,
+        "latency": {command: summarize(each) for command, each in sorted(samples.items())},
+        "ftl": flash,
+    }
+
+
+def print_result(result: dict) -> None:
+    status = "" if result["ok"] else "  FAILED"
+    print(f"{result['storage']:<7} {result['transport']:<10} {result['workload']:<17} "
+          f"{result['commands']:>7} cmds {result['ops_per_sec']:>10.1f} ops/s{status}")
+    for command, stats in result["latency"].items():
+        print(f"{'':>36}{command:<3}{stats['count']:>7} "
+              f"p50 {stats['p50_us']:>9.1f}us  p95 {stats['p95_us']:>9.1f}us  p99 {stats['p99_us']:>9.1f}us")
+    flash = result["ftl"]
+    if flash:
+        print(f"{'':>36}FTL {flash['policy']}: WA {flash['write_amplification']:.2f} "
+              f"({flash['nand_writes']}/{flash['host_writes']} pages), {flash['gc_runs']} GCs "
+              f"stalling {flash['gc_stall_us'] / 1000:.1f}ms, erases/block "
+              f"{flash['erase_count_min']}-{flash['erase_count_max']}")
+
+
+def parse_choices(value: str, choices) -> list[str]:
+    names = value.split(",")
+    unknown = [name for name in names if name not in choices]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown {', '.join(unknown)}; choose from {', '.join(choices)}")
+    return names
+
+
+def parse_mix(value: str) -> tuple[int, int, int]:
+    try:
+        weights = tuple(int(weight) for weight in value.split(":"))
+    except ValueError:
+        weights = ()
+    if len(weights) != 3 or min(weights) < 0 or sum(weights) == 0:
+        raise argparse.ArgumentTypeError("mix should be R:W:E weights such as 70:20:10")
+    return weights
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=1000, help="commands per synthetic workload")
+    parser.add_argument("--storages", type=lambda v: parse_choices(v, STORAGES), default=list(STORAGES))
+    parser.add_argument("--transports", type=lambda v: parse_choices(v, TRANSPORTS),
+                        default=list(DEFAULT_TRANSPORTS))
+    parser.add_argument("--workloads", type=lambda v: parse_choices(v, WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--mix", type=parse_mix, default=(70, 20, 10))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--ftl", choices=FTL_POLICIES, help="simulate an FTL with this GC policy")
+    parser.add_argument("--buffer-depth", type=int, help=f"override ${BUFFER_DEPTH_ENV}")
+    args = parser.parse_args()
+
+    results = []
+    for storage in args.storages:
+        for transport in args.transports:
+            for workload in args.workloads:
+                result = run_workload(storage, transport, workload, args.ops, args.seed, args.mix,
+                                      args.ftl, args.buffer_depth)
+                print_result(result)
+                results.append(result)
+
+    if args.json:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "ops": args.ops,
+            "mix": args.mix,
+            "seed": args.seed,
+            "ftl": args.ftl,
+            "buffer_depth": args.buffer_depth,
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
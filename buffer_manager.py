@@ -1,10 +1,17 @@
-import glob
-import re
+import os
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
+from tracing import traced
+from wal import WriteAheadLog
+
+ERASED_VALUE = "0x00000000"
 BUFFER_INDEX = 5
-BUFFER_DIRECTORY = "./buffer"
+BUFFER_DEPTH_ENV = "SSD_BUFFER_DEPTH"
+BUFFER_JOURNAL = "buffer.journal"
+JOURNAL_COMPACT_RECORDS = 64
 
 
 class Buffer:
@@ -27,98 +34,273 @@ class Buffer:
 
 
 class BufferManager:
+    """Command buffer kept as LBA-ordered pending erases with pending writes on top.
+
+    A buffered read is answered from the pending writes, or by bisecting the erase
+    extents, so an erase costs the same whatever its length. Served reads are counted.
+
+    Erases are disjoint [start, end) extents in a sorted list; writes are a sorted set of
+    LBAs. A pending write always wins over a pending erase of the same LBA, because a
+    later erase drops the writes it covers. Flushing therefore applies every erase
+    first and every write after it, which is also the order get_buffer() returns.
 
-    def __init__(self) -> None:
-        self.path: Path = Path(BUFFER_DIRECTORY)
-        self.buffers: list[Buffer] = []
-        self._check_initial_buffer()
+    Every accepted command is appended to a write-ahead log as one checksummed record;
+    replaying the intact records rebuilds the buffer and a torn tail left by a crash is
+    cut off on load. A flush logs an F record before touching the NAND and checkpoints
+    the log to empty once the NAND is persisted. A replayed F record therefore means that
+    flush was interrupted, and flush_pending tells the SSD to redo it. A long log is
+    checkpointed to the current buffer contents.
+    """
+
+    def __init__(
+            self,
+            path: str = BUFFER_JOURNAL,
+            depth: Optional[int] = None,
+            fsync: Optional[str] = None,
+    ) -> None:
+        self.path: Path = Path(path)
+        self.depth: int = depth or int(os.environ.get(BUFFER_DEPTH_ENV, BUFFER_INDEX))
+        self.wal = WriteAheadLog(self.path, policy=fsync)
+        self.flush_pending: bool = False
+        self._writes: dict[int, str] = {}
+        self._write_lbas: list[int] = []
+        self._erase_starts: list[int] = []
+        self._erase_ends: dict[int, int] = {}
+        self.read_hits: int = 0
+        self.read_misses: int = 0
+        self._deferred: bool = False
+        self._pending_records: list[str] = []
+        self._needs_compact: bool = False
         self._register_buffer()
 
-    def _check_initial_buffer(self) -> None:
-        self.path.mkdir(parents=False, exist_ok=True)
-        filenames = [p.name for p in self.path.iterdir()]
-        for idx in range(1, BUFFER_INDEX + 1):
-            pattern: re.Pattern = re.compile(rf"^{idx}_.*$")
-            if any(pattern.match(f) for f in filenames):
-                continue
-            new = self.path / f"{idx}_empty"
-            new.touch()
+    def __len__(self) -> int:
+        return len(self._write_lbas) + len(self._erase_starts)
+
+    def is_full(self) -> bool:
+        return len(self) >= self.depth
 
+    def is_overflowing(self) -> bool:
+        """True once a command took a slot beyond the configured depth."""
+        return len(self) > self.depth
+
+    def refresh(self) -> None:
+        """Pick up journal records appended by other processes."""
+        if not self._deferred:
+            self._register_buffer()
+
+    @traced
     def get_buffer(self) -> list[Buffer]:
-        self._register_buffer()
-        return self.buffers
+        self.refresh()
+
+        buffers = [
+            Buffer(command="E", lba=start, range=self._erase_ends[start] - start)
+            for start in self._erase_starts
+        ]
+        buffers += [Buffer(command="W", lba=lba, data=self._writes[lba]) for lba in self._write_lbas]
+        for idx, buffer in enumerate(buffers):
+            buffer.idx = idx + 1
+        return buffers
 
+    @traced
     def set_buffer(self, buffers: list[Buffer]) -> None:
-        self.buffers = buffers
-        self._update_file()
+        self._clear()
+        self.flush_pending = False
+        for buffer in buffers:
+            self._apply(buffer.command, buffer.lba, buffer.data if buffer.command == "W" else buffer.range)
+        self._pending_records.clear()
+        if self._deferred:
+            self._needs_compact = True
+        else:
+            self._compact()
 
-    def _update_file(self) -> None:
-        for filename in self.path.iterdir():
-            filename.unlink(missing_ok=False)
+    def write(self, lba: int, data: str) -> None:
+        self._apply_write(lba, data)
+        self._append_record(f"W:{lba}:{data}")
 
-        for idx, buffer in enumerate(self.buffers):
-            buffer.idx = idx + 1
-            filename = self.path / str(buffer)
-            filename.touch()
+    def erase(self, lba: int, size: int) -> None:
+        self._apply_erase(lba, size)
+        self._append_record(f"E:{lba}:{size}")
+
+    def begin_flush(self) -> None:
+        """Log that the buffered commands are about to be applied to the NAND."""
+        self.flush_pending = True
+        self._append_record("F")
+
+    def lookup(self, lba: int) -> Optional[str]:
+        """Return the pending value of an LBA, "0x00000000" if erased, or None if not buffered."""
+        value = self._writes.get(lba)
+        if value is None and self._is_erased(lba):
+            value = ERASED_VALUE
+        if value is None:
+            self.read_misses += 1
+        else:
+            self.read_hits += 1
+        return value
+
+    @traced
+    def overlay(self, start: int, end: int) -> tuple[list[tuple[int, int]], dict[int, str]]:
+        """Pending erased extents, clipped to [start, end), and pending writes in [start, end).
+
+        Writes win over the extents they fall in. Nothing visits every LBA of the range.
+        """
+        erased = [(max(s, start), min(e, end)) for s, e in self._extents_between(start, end)]
+        lo, hi = bisect_left(self._write_lbas, start), bisect_left(self._write_lbas, end)
+        writes = {lba: self._writes[lba] for lba in self._write_lbas[lo:hi]}
+
+        hits = sum(e - s for s, e in erased) + sum(not self._is_erased(lba) for lba in writes)
+        self.read_hits += hits
+        self.read_misses += end - start - hits
+        return erased, writes
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.read_hits + self.read_misses
+        return self.read_hits / total if total else 0.0
+
+    def _clear(self) -> None:
+        self._writes.clear()
+        self._write_lbas.clear()
+        self._erase_starts.clear()
+        self._erase_ends.clear()
 
-        for idx in range(len(self.buffers) + 1, BUFFER_INDEX + 1):
-            filename = self.path / f"{idx}_empty"
-            filename.touch()
+    def _apply(self, command: str, lba: int, arg) -> None:
+        if command == "W":
+            self._apply_write(lba, arg)
+        elif command == "E":
+            self._apply_erase(lba, int(arg))
+        elif command == "F":
+            self.flush_pending = True
 
+    def _apply_write(self, lba: int, data: str) -> None:
+        if lba not in self._writes:
+            insort(self._write_lbas, lba)
+        self._writes[lba] = data
+
+        idx = bisect_right(self._erase_starts, lba) - 1
+        if idx < 0:
+            return
+        start = self._erase_starts[idx]
+        end = self._erase_ends[start]
+        if lba < end:
+            self._remove_extent(start)
+            self._insert_extent(*self._shrink_extent(start, end))
+
+    def _apply_erase(self, lba: int, size: int) -> None:
+        start, end = lba, lba + size
+        lo, hi = bisect_left(self._write_lbas, start), bisect_left(self._write_lbas, end)
+        for each_lba in self._write_lbas[lo:hi]:
+            del self._writes[each_lba]
+        del self._write_lbas[lo:hi]
+
+        overlaps = self._extents_between(start, end)
+        for s, _ in overlaps:
+            self._remove_extent(s)
+        start = min([start] + [s for s, _ in overlaps])
+        end = max([end] + [e for _, e in overlaps])
+
+        start, end = self._merge_neighbors(start, end)
+        self._insert_extent(start, end)
+
+    def _is_erased(self, lba: int) -> bool:
+        idx = bisect_right(self._erase_starts, lba) - 1
+        return idx >= 0 and lba < self._erase_ends[self._erase_starts[idx]]
+
+    def _extents_between(self, start: int, end: int) -> list[tuple[int, int]]:
+        """Extents overlapping [start, end)."""
+        idx = max(bisect_right(self._erase_starts, start) - 1, 0)
+        overlaps = []
+        while idx < len(self._erase_starts) and self._erase_starts[idx] < end:
+            s = self._erase_starts[idx]
+            if self._erase_ends[s] > start:
+                overlaps.append((s, self._erase_ends[s]))
+            idx += 1
+        return overlaps
+
+    def _merge_neighbors(self, start: int, end: int) -> tuple[int, int]:
+        idx = bisect_left(self._erase_starts, start) - 1
+        if idx >= 0:
+            left = self._erase_starts[idx]
+            if self._erase_ends[left] == start:
+                self._remove_extent(left)
+                start = left
+
+        if end in self._erase_ends:
+            right_end = self._erase_ends[end]
+            self._remove_extent(end)
+            end = right_end
+        return start, end
+
+    def _shrink_extent(self, start: int, end: int) -> tuple[int, int]:
+        """Drop LBAs at either edge that a pending write already overrides."""
+        while start < end and start in self._writes:
+            start += 1
+        while end > start and end - 1 in self._writes:
+            end -= 1
+        return start, end
+
+    def _insert_extent(self, start: int, end: int) -> None:
+        if start >= end:
+            return
+        insort(self._erase_starts, start)
+        self._erase_ends[start] = end
+
+    def _remove_extent(self, start: int) -> None:
+        del self._erase_starts[bisect_left(self._erase_starts, start)]
+        del self._erase_ends[start]
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        """Keep the buffer in memory and write it back once, on commit() or exit."""
+        self._register_buffer()
+        self._deferred = True
+        try:
+            yield
+        finally:
+            self._deferred = False
+            self.commit()
+
+    def commit(self) -> None:
+        if self._needs_compact:
+            self._compact()
+        elif self._pending_records:
+            self.wal.append(";".join(self._pending_records))
+        self._pending_records.clear()
+        self._needs_compact = False
+
+    def _append_record(self, entry: str) -> None:
+        if self._deferred:
+            self._pending_records.append(entry)
+        elif self.wal.num_records >= JOURNAL_COMPACT_RECORDS:
+            self._compact()
+        else:
+            self.wal.append(entry)
+
+    @traced
+    def _compact(self) -> None:
+        self.wal.checkpoint(";".join(
+            [f"E:{start}:{self._erase_ends[start] - start}" for start in self._erase_starts]
+            + [f"W:{lba}:{self._writes[lba]}" for lba in self._write_lbas]
+            + (["F"] if self.flush_pending else [])
+        ))
+
+    @traced
     def _register_buffer(self) -> None:
-        """Register self.buffers from the filenames in the buffer directory."""
-        buffers: list[Buffer] = []
-        filenames = sorted(glob.glob(f"{self.path}/*"))
-        for filename in filenames:
-            if filename.endswith("empty"):
-                continue
+        """Replay log records that this process has not applied yet."""
+        replaced, payloads = self.wal.read_tail()
+        if replaced:
+            self._clear()
+            self.flush_pending = False
+        for payload in payloads:
+            for command, lba, arg in self._decode_entries(payload):
+                self._apply(command, lba, arg)
 
-            args = filename.split("_")
-            if len(args) < 4 or args[1] not in ["W", "E"]:
+    @staticmethod
+    def _decode_entries(payload: str) -> list[tuple[str, int, str]]:
+        entries = []
+        for entry in payload.split(";") if payload else []:
+            if entry == "F":
+                entries.append(("F", 0, ""))
                 continue
-
-            cmd = args[1]
-            kwargs = {"command": cmd, "lba": int(args[2]), "data": "", "range": 0}
-            if cmd == "W":
-                kwargs.update({"data": args[3]})
-            if cmd == "E":
-                kwargs.update({"range": int(args[3])})
-            buffers.append(Buffer(**kwargs))
-
-        self.buffers = buffers
-
-    @classmethod
-    def update(
-            cls,
-            buffers: list[Buffer],
-            idx: int,
-            new_buffer: Buffer,
-            new_buffers: list[Buffer],
-    ) -> tuple[bool, list[Buffer]]:
-        new_buffers += buffers[idx + 1:]
-        new_buffers.append(new_buffer)
-        return False, new_buffers
-
-    @classmethod
-    def merge_overall(cls, new_buffers: list[Buffer]) -> list[Buffer]:
-        merge_buffers = []
-        command_list = [""] * 100
-        for buffer in new_buffers:
-            if buffer.command == "W":
-                command_list[buffer.lba] = buffer.command
-            elif buffer.command == "E":
-                for each_lba in range(buffer.lba, buffer.lba + buffer.range):
-                    command_list[each_lba] = buffer.command
-
-        for buffer in new_buffers:
-            if buffer.command == "W" and command_list[buffer.lba] == buffer.command:
-                merge_buffers.append(buffer)
-            elif buffer.command == "E":
-                valid_command_check = True
-                for each_lba in range(buffer.lba, buffer.lba + buffer.range):
-                    if command_list[each_lba] != buffer.command:
-                        valid_command_check = False
-                        break
-                if valid_command_check:
-                    merge_buffers.append(buffer)
-        return merge_buffers
+            command, lba, arg = entry.split(":")
+            entries.append((command, int(lba), arg))
+        return entries
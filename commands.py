@@ -1,10 +1,28 @@
+import asyncio
+import itertools
+import socket
 import subprocess
 from abc import ABC, abstractmethod
-from typing import List
+from collections import deque
+from typing import List, Optional
+
+from constant import SOCKET_PATH
+from tracing import traced
+
+
+class DeviceError(RuntimeError):
+    """The device could not answer a command the shell cannot go on without."""
+
+
+def _request_line(args: List[str], device: Optional[str]) -> str:
+    # The daemon already runs ssd.py, so only the ssd.py arguments are sent.
+    line = " ".join(args[1:])
+    return f"{device} {line}" if device else line
 
 
 class ProcessExecutor:
     @staticmethod
+    @traced
     def run(executable: str, args: List[str]) -> bool:
         try:
             result = subprocess.run(
@@ -16,10 +34,186 @@ class ProcessExecutor:
             return False
 
 
+class SocketExecutor:
+    """Send commands to a running `ssd.py --serve` daemon instead of spawning ssd.py.
+
+    With `device`, commands go to that device of an `ssd.py --serve-devices` daemon.
+    """
+
+    def __init__(self, socket_path: str = SOCKET_PATH, device: Optional[str] = None):
+        self.socket_path = socket_path
+        self.device = device
+        self.output: Optional[str] = None
+        self._sock: Optional[socket.socket] = None
+        self._stream = None
+
+    def _connect(self) -> None:
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(self.socket_path)
+        self._stream = self._sock.makefile("rwb")
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+        if self._sock is not None:
+            self._sock.close()
+        self._sock, self._stream = None, None
+
+    @traced
+    def run(self, executable: str, args: List[str]) -> bool:
+        self.output = None
+        try:
+            if self._stream is None:
+                self._connect()
+            self._stream.write(f"{_request_line(args, self.device)}\n".encode())
+            self._stream.flush()
+            line = self._stream.readline()
+        except OSError:
+            self.close()
+            return False
+
+        if not line:
+            self.close()
+            return False
+
+        self.output = line.decode().rstrip("\n")
+        return True
+
+
+class _PipelinedConnection:
+    """One daemon connection with any number of requests in flight.
+
+    The daemon answers the requests of a connection in order, so responses are
+    matched to the oldest waiting future.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.waiting: deque[asyncio.Future] = deque()
+        self.reader_task = asyncio.ensure_future(self._read_responses())
+
+    async def request(self, line: str) -> Optional[str]:
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.append(future)
+        self.writer.write(f"{line}\n".encode())
+        await self.writer.drain()
+        return await future
+
+    async def _read_responses(self) -> None:
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                self.waiting.popleft().set_result(line.decode().rstrip("\n"))
+        except (OSError, IndexError):
+            pass
+        while self.waiting:
+            self.waiting.popleft().set_result(None)
+
+    async def close(self) -> None:
+        self.reader_task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+        while self.waiting:
+            self.waiting.popleft().set_result(None)
+
+
+class AsyncSocketExecutor:
+    """Pipeline commands to a running `ssd.py --serve` daemon over a few connections.
+
+    run() returns the daemon's response line, or None if the daemon is unreachable.
+    Commands are spread round-robin, so ordering between them is up to the caller.
+    With `device`, commands go to that device of an `ssd.py --serve-devices` daemon.
+    """
+
+    def __init__(self, socket_path: str = SOCKET_PATH, connections: int = 4, device: Optional[str] = None):
+        self.socket_path = socket_path
+        self.device = device
+        self.num_connections = connections
+        self._connections: list[_PipelinedConnection] = []
+        self._next = itertools.count()
+        self._connect_lock = asyncio.Lock()
+
+    async def _connect(self) -> None:
+        async with self._connect_lock:
+            while len(self._connections) < self.num_connections:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+                self._connections.append(_PipelinedConnection(reader, writer))
+
+    async def close(self) -> None:
+        connections, self._connections = self._connections, []
+        for connection in connections:
+            await connection.close()
+
+    async def run(self, args: List[str]) -> Optional[str]:
+        # Same argument list as the blocking executors; the daemon gets everything after ssd.py.
+        try:
+            if not self._connections:
+                await self._connect()
+            connection = self._connections[next(self._next) % len(self._connections)]
+            output = await connection.request(_request_line(args, self.device))
+        except OSError:
+            output = None
+        if output is None:
+            await self.close()
+        return output
+
+
+class InProcessExecutor:
+    """Call ssd.SSD.run directly in this process; the result is returned in-band."""
+
+    def __init__(self):
+        self.output: Optional[str] = None
+        self._ssd = None
+
+    @property
+    def ssd(self):
+        if self._ssd is None:
+            # Importing ssd touches the NAND and buffer files, so defer it to first use.
+            from buffer_manager import BufferManager
+            from read_cache import create_read_cache
+            from ssd import SSD, create_file_manager
+            self._ssd = SSD(
+                file_manager=create_file_manager(read_cache=create_read_cache()),
+                buffer_manager=BufferManager(),
+                write_output_file=False,
+            )
+        return self._ssd
+
+    @traced
+    def run(self, executable: str, args: List[str]) -> bool:
+        self.output = None
+        try:
+            self.output = self.ssd.run(args)
+            return True
+        except Exception:
+            return False
+
+
+class AsyncInProcessExecutor:
+    """InProcessExecutor behind the async run() interface; commands complete one at a time."""
+
+    def __init__(self):
+        self.executor = InProcessExecutor()
+
+    async def run(self, args: List[str]) -> Optional[str]:
+        if not self.executor.run('python', args):
+            return None
+        return self.executor.output
+
+    async def close(self) -> None:
+        pass
+
+
 class ShellCommand(ABC):
-    def __init__(self, ssd_path: str):
+    def __init__(self, ssd_path: str, executor=None):
         self.ssd_path = ssd_path
-        self.executor = ProcessExecutor()
+        self.executor = executor if executor is not None else ProcessExecutor()
 
     @abstractmethod
     def execute(self) -> bool:
@@ -27,8 +221,8 @@ class ShellCommand(ABC):
 
 
 class ReadShellCommand(ShellCommand):
-    def __init__(self, ssd_path: str, lba: int):
-        super().__init__(ssd_path)
+    def __init__(self, ssd_path: str, lba: int, executor=None):
+        super().__init__(ssd_path, executor)
         self.lba = lba
 
     def execute(self) -> bool:
@@ -36,8 +230,8 @@ class ReadShellCommand(ShellCommand):
 
 
 class WriteShellCommand(ShellCommand):
-    def __init__(self, ssd_path: str, lba: int, value: str):
-        super().__init__(ssd_path)
+    def __init__(self, ssd_path: str, lba: int, value: str, executor=None):
+        super().__init__(ssd_path, executor)
         self.lba = lba
         self.value = value
 
@@ -45,9 +239,30 @@ class WriteShellCommand(ShellCommand):
         return self.executor.run('python', [self.ssd_path, 'W', str(self.lba), self.value])
 
 
+class ReadRangeShellCommand(ShellCommand):
+    def __init__(self, ssd_path: str, start: int, end: int, executor=None):
+        super().__init__(ssd_path, executor)
+        self.start = start
+        self.end = end
+
+    def execute(self) -> bool:
+        return self.executor.run('python', [self.ssd_path, 'RR', str(self.start), str(self.end)])
+
+
+class WriteRangeShellCommand(ShellCommand):
+    def __init__(self, ssd_path: str, start: int, end: int, value: str, executor=None):
+        super().__init__(ssd_path, executor)
+        self.start = start
+        self.end = end
+        self.value = value
+
+    def execute(self) -> bool:
+        return self.executor.run('python', [self.ssd_path, 'RW', str(self.start), str(self.end), self.value])
+
+
 class EraseShellCommand(ShellCommand):
-    def __init__(self, ssd_path: str, lba: int, size: int):
-        super().__init__(ssd_path)
+    def __init__(self, ssd_path: str, lba: int, size: int, executor=None):
+        super().__init__(ssd_path, executor)
         self.lba = lba
         self.size = size
 
@@ -56,8 +271,16 @@ class EraseShellCommand(ShellCommand):
 
 
 class FlushShellCommand(ShellCommand):
-    def __init__(self, ssd_path: str):
-        super().__init__(ssd_path)
+    def __init__(self, ssd_path: str, executor=None):
+        super().__init__(ssd_path, executor)
 
     def execute(self) -> bool:
         return self.executor.run('python', [self.ssd_path, 'F'])
+
+
+class InfoShellCommand(ShellCommand):
+    def __init__(self, ssd_path: str, executor=None):
+        super().__init__(ssd_path, executor)
+
+    def execute(self) -> bool:
+        return self.executor.run('python', [self.ssd_path, 'I'])
@@ -21,13 +21,19 @@ class ShellCommandEnum(Enum):
 SIZE_LBA = 100
 
 FILENAME = "ssd_nand.txt"
+FILENAME_IMAGE = "ssd_nand.img"
+FILENAME_SPARSE = "ssd_nand.sparse"
 FILENAME_OUT = "ssd_output.txt"
 FILENAME_MAIN_SSD = "ssd.py"
 FILENAME_SCRIPT_DEFAULT = "shell_script.txt"
+SOCKET_PATH = "ssd.sock"
 
 LOG_FILE_MAX_SIZE = 10 * 1024
 LOG_FILE_NAME = "latest.log"
 LOG_METHOD_NAME_WIDTH = 30
+LOG_QUEUE_SIZE = 10000
+LOG_RETENTION_COUNT = 10
+LOG_RETENTION_SIZE = 1024 * 1024
 PAST_LOG_FILE_FORMAT = "until_%y%m%d_%Hh_%Mm_%Ss.log"
 
 MESSAGE_DONE = "DONE"
@@ -0,0 +1,232 @@
+"""Simulated flash translation layer: out-of-place page writes, garbage collection and wear.
+
+Set $SSD_FTL to a garbage collection policy ("greedy" or "cost_benefit") to run every
+NAND write and erase of a device through it. The stored values are unchanged; the FTL
+only models where the flash would have put them. Every LBA is one page. A write programs
+the next free page of the open block and invalidates the page that held the LBA before,
+an erase only unmaps its LBAs (a TRIM), and a block can only be reused once garbage
+collection has copied its valid pages elsewhere and erased it.
+
+Write amplification is flash pages programmed per page written by the host. GC stall
+time is the flash time spent relocating pages and erasing blocks inside host writes,
+from the PAGE_READ_US / PAGE_PROGRAM_US / BLOCK_ERASE_US latency model.
+"""
+import json
+import math
+import os
+from collections import deque
+from typing import Optional
+
+from wal import replace_durably
+
+FTL_ENV = "SSD_FTL"
+FTL_SUFFIX = ".ftl"
+POLICY_GREEDY = "greedy"
+POLICY_COST_BENEFIT = "cost_benefit"
+FTL_POLICIES = (POLICY_GREEDY, POLICY_COST_BENEFIT)
+PAGES_PER_BLOCK = 8
+OVERPROVISION = 0.25
+GC_RESERVE_BLOCKS = 2
+PAGE_READ_US = 50
+PAGE_PROGRAM_US = 200
+BLOCK_ERASE_US = 1500
+UNMAPPED = -1
+
+
+class FlashTranslationLayer:
+    """L2P page map over `capacity` LBAs plus OVERPROVISION spare blocks.
+
+    Host writes and relocated pages share one open block. Taking a new open block leaves
+    at least GC_RESERVE_BLOCKS erased blocks, collecting victims until it does: "greedy"
+    picks the block with the fewest valid pages, "cost_benefit" the one maximizing
+    (1 - u) * age / 2u, where u is its valid fraction and age the host writes since it
+    was last programmed. The spare blocks guarantee a victim always has an invalid page.
+    """
+
+    def __init__(
+            self,
+            capacity: int,
+            policy: str = POLICY_GREEDY,
+            pages_per_block: int = PAGES_PER_BLOCK,
+            overprovision: float = OVERPROVISION,
+    ) -> None:
+        if policy not in FTL_POLICIES:
+            raise ValueError(f"{FTL_ENV} should be one of {FTL_POLICIES}")
+        self.capacity = capacity
+        self.policy = policy
+        self.pages_per_block = pages_per_block
+        user_blocks = math.ceil(capacity / pages_per_block)
+        self.num_blocks = user_blocks + max(GC_RESERVE_BLOCKS + 1, math.ceil(user_blocks * overprovision))
+
+        self.l2p: list[int] = [UNMAPPED] * capacity
+        self.p2l: list[int] = [UNMAPPED] * (self.num_blocks * pages_per_block)
+        self.valid: list[int] = [0] * self.num_blocks
+        self.erase_counts: list[int] = [0] * self.num_blocks
+        self.programmed_at: list[int] = [0] * self.num_blocks
+        self.free: deque[int] = deque(range(1, self.num_blocks))
+        self.active: int = 0
+        self.next_page: int = 0
+        self.clock: int = 0
+        self._collecting: bool = False
+
+        self.host_writes: int = 0
+        self.nand_writes: int = 0
+        self.gc_runs: int = 0
+        self.gc_relocations: int = 0
+        self.gc_stall_us: int = 0
+
+    def write(self, start: int, end: int) -> None:
+        """Program a fresh page for every LBA of [start, end)."""
+        for lba in range(start, end):
+            self.clock += 1
+            self.host_writes += 1
+            self._invalidate(lba)
+            self._program(lba)
+
+    def trim(self, start: int, end: int) -> None:
+        """Unmap [start, end); their pages become garbage without programming anything."""
+        for lba in range(start, end):
+            self._invalidate(lba)
+
+    @property
+    def write_amplification(self) -> float:
+        return self.nand_writes / self.host_writes if self.host_writes else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "host_writes": self.host_writes,
+            "nand_writes": self.nand_writes,
+            "write_amplification": self.write_amplification,
+            "gc_runs": self.gc_runs,
+            "gc_relocations": self.gc_relocations,
+            "gc_stall_us": self.gc_stall_us,
+            "erase_count_min": min(self.erase_counts),
+            "erase_count_max": max(self.erase_counts),
+            "erase_count_mean": sum(self.erase_counts) / self.num_blocks,
+            "erase_counts": list(self.erase_counts),
+        }
+
+    def _invalidate(self, lba: int) -> None:
+        ppa = self.l2p[lba]
+        if ppa != UNMAPPED:
+            self.p2l[ppa] = UNMAPPED
+            self.valid[ppa // self.pages_per_block] -= 1
+            self.l2p[lba] = UNMAPPED
+
+    def _program(self, lba: int) -> None:
+        if self.next_page == self.pages_per_block:
+            self._open_block()
+        ppa = self.active * self.pages_per_block + self.next_page
+        self.next_page += 1
+        self.l2p[lba] = ppa
+        self.p2l[ppa] = lba
+        self.valid[self.active] += 1
+        self.programmed_at[self.active] = self.clock
+        self.nand_writes += 1
+
+    def _open_block(self) -> None:
+        self.active = self.free.popleft()
+        self.next_page = 0
+        if self._collecting:
+            return
+        self._collecting = True
+        try:
+            while len(self.free) < GC_RESERVE_BLOCKS:
+                self._collect()
+        finally:
+            self._collecting = False
+
+    def _collect(self) -> None:
+        victim = self._select_victim()
+        base = victim * self.pages_per_block
+        moved = 0
+        for ppa in range(base, base + self.pages_per_block):
+            lba = self.p2l[ppa]
+            if lba != UNMAPPED:
+                self._invalidate(lba)
+                self._program(lba)
+                moved += 1
+        self.erase_counts[victim] += 1
+        self.free.append(victim)
+        self.gc_runs += 1
+        self.gc_relocations += moved
+        self.gc_stall_us += moved * (PAGE_READ_US + PAGE_PROGRAM_US) + BLOCK_ERASE_US
+
+    def _select_victim(self) -> int:
+        free = set(self.free)
+        candidates = [
+            block for block in range(self.num_blocks)
+            if block != self.active and block not in free and self.valid[block] < self.pages_per_block
+        ]
+        if self.policy == POLICY_GREEDY:
+            return min(candidates, key=lambda block: self.valid[block])
+        return max(candidates, key=self._cost_benefit)
+
+    def _cost_benefit(self, block: int) -> float:
+        utilization = self.valid[block] / self.pages_per_block
+        if utilization == 0:
+            return math.inf
+        return (1 - utilization) * (self.clock - self.programmed_at[block]) / (2 * utilization)
+
+    def save(self, path: str) -> None:
+        """Write the map, block state and counters to `path`; p2l and valid counts are derived."""
+        state = {
+            "capacity": self.capacity,
+            "policy": self.policy,
+            "pages_per_block": self.pages_per_block,
+            "num_blocks": self.num_blocks,
+            "l2p": self.l2p,
+            "erase_counts": self.erase_counts,
+            "programmed_at": self.programmed_at,
+            "free": list(self.free),
+            "active": self.active,
+            "next_page": self.next_page,
+            "clock": self.clock,
+            "host_writes": self.host_writes,
+            "nand_writes": self.nand_writes,
+            "gc_runs": self.gc_runs,
+            "gc_relocations": self.gc_relocations,
+            "gc_stall_us": self.gc_stall_us,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        replace_durably(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, capacity: int, policy: str) -> "FlashTranslationLayer":
+        """The FTL saved at `path`, or a fresh one if there is none or it models another device."""
+        ftl = cls(capacity, policy)
+        if not os.path.exists(path):
+            return ftl
+        with open(path, "r") as f:
+            state = json.load(f)
+        if (state["capacity"], state["pages_per_block"], state["num_blocks"]) != \
+                (capacity, ftl.pages_per_block, ftl.num_blocks):
+            return ftl
+
+        for name in ("l2p", "erase_counts", "programmed_at", "active", "next_page", "clock",
+                     "host_writes", "nand_writes", "gc_runs", "gc_relocations", "gc_stall_us"):
+            setattr(ftl, name, state[name])
+        ftl.free = deque(state["free"])
+        for lba, ppa in enumerate(ftl.l2p):
+            if ppa != UNMAPPED:
+                ftl.p2l[ppa] = lba
+                ftl.valid[ppa // ftl.pages_per_block] += 1
+        return ftl
+
+
+def saved_stats(path: str) -> dict:
+    """Statistics of the FTL saved at `path`, whatever device it models."""
+    with open(path, "r") as f:
+        state = json.load(f)
+    return FlashTranslationLayer.load(path, state["capacity"], state["policy"]).stats()
+
+
+def ftl_policy() -> Optional[str]:
+    """The $SSD_FTL garbage collection policy, or None when the FTL is off."""
+    policy = os.environ.get(FTL_ENV) or None
+    if policy is not None and policy not in FTL_POLICIES:
+        raise ValueError(f"{FTL_ENV} should be one of {FTL_POLICIES}")
+    return policy
@@ -1,22 +1,34 @@
 from __future__ import annotations
 
+import atexit
 import glob
-import inspect
 import os
+import queue
+import sys
+import threading
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from types import CodeType, FrameType
 from typing import Optional, Tuple
 
 from constant import (
     LOG_FILE_MAX_SIZE,
     LOG_FILE_NAME,
     LOG_METHOD_NAME_WIDTH,
+    LOG_QUEUE_SIZE,
+    LOG_RETENTION_COUNT,
+    LOG_RETENTION_SIZE,
     PAST_LOG_FILE_FORMAT
 )
 
+ARCHIVE_SUFFIX = ".zip"
+
 
 class Logger:
     _instance: Logger | None = None
     _initialized: bool = False
+    _caller_names: dict[CodeType, str] = {}
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
@@ -28,6 +40,13 @@ class Logger:
             return
 
         self._setup_log_env(log_dir)
+        self._queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+        self._log_size: int = 0
+        self.retention_count: int = LOG_RETENTION_COUNT
+        self.retention_size: int = LOG_RETENTION_SIZE
+        self._archiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-archive")
+        self._archived: Optional[Future] = None
         self._initialized = True
 
     def _setup_log_env(self, log_dir):
@@ -51,32 +70,126 @@ class Logger:
 
     def _rollover_if_needed(self) -> None:
         if os.path.getsize(self.latest_log) > LOG_FILE_MAX_SIZE:
-            _, now = self._get_timestamp()
-            new_name = now.strftime(PAST_LOG_FILE_FORMAT)
-            new_path = os.path.join(self.log_dir, new_name)
-            os.rename(self.latest_log, new_path)
-            with open(self.latest_log, "w"):
-                pass
+            self._rollover()
 
-            self._rename_log_files([new_name, LOG_FILE_NAME])
+    def _rollover(self) -> None:
+        """Move latest.log aside and leave compressing it to the archive thread."""
+        _, now = self._get_timestamp()
+        new_name = now.strftime(PAST_LOG_FILE_FORMAT)
+        new_path = os.path.join(self.log_dir, new_name)
+        os.rename(self.latest_log, new_path)
+        with open(self.latest_log, "w"):
+            pass
 
-    def _rename_log_files(self, exclude_files):
-        log_files = glob.glob(os.path.join(self.log_dir, "*.log"))
-        exclude_files_set = set(exclude_files)
-        for log_file in log_files:
-            if os.path.basename(log_file) not in exclude_files_set:
-                new_name = log_file.replace(".log", ".zip")
-                os.rename(log_file, new_name)
+        try:
+            self._archived = self._archiver.submit(self._archive_log, new_path)
+        except RuntimeError:
+            # The executor takes no new work once the interpreter is shutting down, which is
+            # when disable_async() drains the queue; compress in the writer thread instead.
+            self._archive_log(new_path)
+
+    def _archive_log(self, path: str) -> None:
+        """Compress a rotated log into a zip next to it, then apply the retention limits."""
+        if not os.path.exists(path):
+            return
+        archive_path = os.path.splitext(path)[0] + ARCHIVE_SUFFIX
+        tmp_path = f"{archive_path}.tmp"
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(path, arcname=os.path.basename(path))
+        os.replace(tmp_path, archive_path)
+        os.remove(path)
+        self._apply_retention()
+
+    def _apply_retention(self) -> None:
+        """Delete the oldest archives beyond retention_count or retention_size bytes in total."""
+        # Archive names carry the rollover time, so name order is age order.
+        archives = sorted(glob.glob(os.path.join(self.log_dir, f"*{ARCHIVE_SUFFIX}")))
+        total_size = sum(os.path.getsize(archive) for archive in archives)
+        while archives and (len(archives) > self.retention_count or total_size > self.retention_size):
+            oldest = archives.pop(0)
+            total_size -= os.path.getsize(oldest)
+            os.remove(oldest)
 
     def print(self, message: str, fn_name: Optional[str] = None) -> None:
-        self._rollover_if_needed()
+        if self._queue is None:
+            self._rollover_if_needed()
         if fn_name is None:
-            frame = inspect.currentframe().f_back
-            instance = frame.f_locals.get("self") or frame.f_locals.get("cls")
-            class_name = instance.__name__ if instance else None
-            method_name = frame.f_code.co_name
-            fn_name = f"{class_name}.{method_name}()"
+            fn_name = self._caller_name(sys._getframe(1))
 
         log_line = self._format_log(fn_name, message)
+        if self._queue is not None:
+            self._queue.put(log_line)
+            return
         with open(self.latest_log, "a", encoding="utf-8") as f:
             f.write(log_line)
+
+    @classmethod
+    def _caller_name(cls, frame: FrameType) -> str:
+        """"Class.method()" for the function running in `frame`, worked out once per function."""
+        code = frame.f_code
+        name = cls._caller_names.get(code)
+        if name is None:
+            owner = frame.f_locals.get("self") or frame.f_locals.get("cls")
+            if owner is None:
+                name = f"{code.co_name}()"
+            else:
+                owner_class = owner if isinstance(owner, type) else type(owner)
+                name = f"{owner_class.__name__}.{code.co_name}()"
+            cls._caller_names[code] = name
+        return name
+
+    def enable_async(self, max_queue: int = LOG_QUEUE_SIZE) -> None:
+        """Hand log lines to a background writer instead of writing them in print().
+
+        The queue is bounded, so a caller only blocks if the writer falls that far
+        behind. The writer appends whatever has queued up in one write, tracks the file
+        size itself instead of stat'ing it, and is drained at interpreter exit.
+        """
+        if self._queue is not None:
+            return
+        self._log_size = os.path.getsize(self.latest_log)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = threading.Thread(target=self._write_queued, name="logger", daemon=True)
+        self._writer.start()
+        atexit.register(self.disable_async)
+
+    def flush(self) -> None:
+        """Wait until every queued line has been written and the last rotated log archived."""
+        if self._queue is not None:
+            self._queue.join()
+        if self._archived is not None:
+            self._archived.result()
+
+    def disable_async(self) -> None:
+        """Write out the queue, stop the writer and go back to writing in print()."""
+        if self._queue is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._queue, self._writer = None, None
+
+    def _write_queued(self) -> None:
+        running = True
+        while running:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            running = None not in items
+
+            data = "".join(item for item in items if item is not None)
+            try:
+                if data:
+                    with open(self.latest_log, "a", encoding="utf-8") as f:
+                        f.write(data)
+                    self._log_size += len(data.encode("utf-8"))
+                if self._log_size > LOG_FILE_MAX_SIZE:
+                    self._rollover()
+                    self._log_size = 0
+            except OSError:
+                pass
+            finally:
+                for _ in items:
+                    self._queue.task_done()
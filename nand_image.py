@@ -0,0 +1,213 @@
+import binascii
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable
+
+from constant import FILENAME, FILENAME_IMAGE, FILENAME_SPARSE, SIZE_LBA
+from sparse_nand import read_sparse_capacity
+from trim import TRIM_SUFFIX, TrimExtents
+
+IMAGE_MAGIC = b"SSDNAND1"
+IMAGE_HEADER = struct.Struct("<8sI4x")
+IMAGE_WORD = struct.Struct("<I")
+FORMATTED_WIDTH = len("0x00000000 ")
+CAPACITY_SUFFIX = ".capacity"
+
+
+def format_value(value: int) -> str:
+    return f"0x{value:08X}"
+
+
+def zero_joined_extents(joined: bytearray, start: int, extents: Iterable[tuple[int, int]]) -> None:
+    """Overwrite the words of the [s, e) extents in a joined range read from `start` with zeros."""
+    for s, e in extents:
+        offset = (s - start) * FORMATTED_WIDTH
+        zeros = f"{format_value(0)} ".encode() * (e - s)
+        joined[offset:offset + len(zeros) - 1] = zeros[:-1]
+
+
+def patch_joined(joined: bytearray, start: int, values: dict[int, str]) -> None:
+    """Overwrite single words of a joined range read from `start`."""
+    for lba, value in values.items():
+        offset = (lba - start) * FORMATTED_WIDTH
+        joined[offset:offset + len(value)] = value.encode()
+
+
+def parse_value(data: str) -> int:
+    return int(data[2:], 16)
+
+
+def canonical_value(data: str) -> str:
+    """A validated hex value as every backend reads it back: "0x" and eight uppercase digits."""
+    return format_value(parse_value(data))
+
+
+class NandImage:
+    """Fixed-width NAND image: a small header followed by one little-endian word per LBA.
+
+    The file is mmap'd, so reading or patching an LBA touches only its 4 bytes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        if self._mmap[:len(IMAGE_MAGIC)] != IMAGE_MAGIC or len(self._mmap) < IMAGE_HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a NAND image")
+        _, self.capacity = IMAGE_HEADER.unpack_from(self._mmap, 0)
+
+    @classmethod
+    def create(cls, path: str, capacity: int = SIZE_LBA) -> "NandImage":
+        with open(path, "wb") as f:
+            f.write(IMAGE_HEADER.pack(IMAGE_MAGIC, capacity))
+            f.truncate(IMAGE_HEADER.size + capacity * IMAGE_WORD.size)
+        return cls(path)
+
+    def _offset(self, lba: int) -> int:
+        return IMAGE_HEADER.size + lba * IMAGE_WORD.size
+
+    def contains(self, lba: int, size: int = 1) -> bool:
+        return 0 <= lba and size >= 0 and lba + size <= self.capacity
+
+    def read(self, lba: int) -> int:
+        return IMAGE_WORD.unpack_from(self._mmap, self._offset(lba))[0]
+
+    def write(self, lba: int, value: int) -> None:
+        IMAGE_WORD.pack_into(self._mmap, self._offset(lba), value)
+
+    def read_range(self, start: int, end: int) -> list[int]:
+        view = self._mmap[self._offset(start):self._offset(end)]
+        return [value for (value,) in IMAGE_WORD.iter_unpack(view)]
+
+    def read_joined_range(self, start: int, end: int) -> bytearray:
+        """read_range() formatted as space separated "0x%08X" words, built with strided copies.
+
+        Every word takes exactly FORMATTED_WIDTH bytes, so callers can patch one in place.
+        """
+        words = array("I", self._mmap[self._offset(start):self._offset(end)])
+        if sys.byteorder == "little":
+            words.byteswap()
+        digits = binascii.hexlify(words).upper()
+        joined = bytearray(b"0x00000000 ") * (end - start)
+        for i in range(8):
+            joined[2 + i::FORMATTED_WIDTH] = digits[i::8]
+        del joined[-1:]
+        return joined
+
+    def write_range(self, start: int, values: list[int]) -> None:
+        data = struct.pack(f"<{len(values)}I", *values)
+        self._mmap[self._offset(start):self._offset(start) + len(data)] = data
+
+    def fill_range(self, start: int, end: int, pattern: list[int]) -> None:
+        """Repeat `pattern` over [start, end) by copying packed bytes, not one word at a time."""
+        packed = struct.pack(f"<{len(pattern)}I", *pattern)
+        size = (end - start) * IMAGE_WORD.size
+        data = packed * (size // len(packed)) + packed[:size % len(packed)]
+        self._mmap[self._offset(start):self._offset(end)] = data
+
+    def erase(self, lba: int, size: int) -> None:
+        start = self._offset(lba)
+        self._mmap[start:start + size * IMAGE_WORD.size] = bytes(size * IMAGE_WORD.size)
+
+    def flush(self) -> None:
+        self._mmap.flush()
+
+    def close(self) -> None:
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+
+def read_capacity(path: str) -> int:
+    """Capacity recorded in an image header, without mapping the image."""
+    with open(path, "rb") as f:
+        header = f.read(IMAGE_HEADER.size)
+    if len(header) < IMAGE_HEADER.size or not header.startswith(IMAGE_MAGIC):
+        raise ValueError(f"{path} is not a NAND image")
+    return IMAGE_HEADER.unpack(header)[1]
+
+
+def save_text_capacity(path: str, capacity: int, size: int) -> None:
+    """Remember that the text NAND at `path` has `capacity` LBA lines while it is `size` bytes long.
+
+    Writers save it before swapping a new NAND in. It is only a shortcut for
+    text_capacity(), so a torn or outdated one just means counting the lines again.
+    """
+    with open(f"{path}{CAPACITY_SUFFIX}", "w") as f:
+        f.write(f"{size} {capacity}\n")
+
+
+def text_capacity(path: str) -> int:
+    """Number of LBA lines of a text NAND, counted only when its size no longer matches the saved one."""
+    size = os.path.getsize(path)
+    try:
+        with open(f"{path}{CAPACITY_SUFFIX}", "r") as f:
+            saved_size, capacity = f.read().split()
+        if int(saved_size) == size:
+            return int(capacity)
+    except (OSError, ValueError):
+        pass
+
+    with open(path, "r") as f:
+        capacity = sum(1 for line in f if line.strip())
+    save_text_capacity(path, capacity, size)
+    return capacity
+
+
+def device_capacity(
+        image_path: str = FILENAME_IMAGE,
+        text_path: str = FILENAME,
+        sparse_path: str = FILENAME_SPARSE,
+) -> int:
+    """Capacity of the device ssd.py would open here: an image or sparse header, else the text line count."""
+    if os.path.exists(image_path):
+        return read_capacity(image_path)
+    if os.path.exists(sparse_path):
+        return read_sparse_capacity(sparse_path)
+    try:
+        num_lines = text_capacity(text_path)
+    except FileNotFoundError:
+        num_lines = 0
+    # ssd.py formats a missing text NAND with the default capacity on first use.
+    return num_lines or SIZE_LBA
+
+
+def convert_text_to_image(text_path: str, image_path: str) -> None:
+    trimmed = TrimExtents(f"{text_path}{TRIM_SUFFIX}")
+    values = {}
+    with open(text_path, "r") as f:
+        for line in f:
+            parts = line.strip().split("\t")
+            if len(parts) != 2:
+                continue
+            lba = int(parts[0])
+            values[lba] = 0 if trimmed.contains(lba) else parse_value(parts[1])
+
+    image = NandImage.create(image_path, capacity=max(values, default=-1) + 1)
+    for lba, value in values.items():
+        image.write(lba, value)
+    image.flush()
+    image.close()
+
+
+def convert_image_to_text(image_path: str, text_path: str) -> None:
+    image = NandImage(image_path)
+    trimmed = TrimExtents(f"{image_path}{TRIM_SUFFIX}")
+    tmp_path = f"{text_path}.tmp"
+    with open(tmp_path, "w") as f:
+        for lba in range(image.capacity):
+            f.write(f"{lba}\t{format_value(0 if trimmed.contains(lba) else image.read(lba))}\n")
+    image.close()
+    os.replace(tmp_path, text_path)
+
+
+if __name__ == "__main__":
+    converters = {"to-image": convert_text_to_image, "to-text": convert_image_to_text}
+    if len(sys.argv) != 4 or sys.argv[1] not in converters:
+        print("usage: nand_image.py {to-image|to-text} <src> <dst>")
+        sys.exit(1)
+    converters[sys.argv[1]](sys.argv[2], sys.argv[3])
@@ -0,0 +1,171 @@
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+READ_CACHE_SIZE_ENV = "SSD_READ_CACHE"
+READ_CACHE_POLICY_ENV = "SSD_READ_CACHE_POLICY"
+READ_CACHE_SIZE = 1024
+POLICY_LRU = "lru"
+POLICY_CLOCK = "clock"
+
+
+class ReadCache(ABC):
+    """Bounded LBA -> value cache for single-LBA NAND reads, counting hits and misses."""
+
+    def __init__(self, size: int) -> None:
+        if size < 1:
+            raise ValueError("read cache size should be at least 1")
+        self.size = size
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, lba: int) -> Optional[str]:
+        value = self._lookup(lba)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def discard_range(self, start: int, end: int) -> None:
+        """Drop [start, end), looping over whichever is smaller: the range or the cache."""
+        if end - start <= len(self):
+            for lba in range(start, end):
+                self.discard(lba)
+        else:
+            for lba in [lba for lba in self._lbas() if start <= lba < end]:
+                self.discard(lba)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @abstractmethod
+    def _lookup(self, lba: int) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def _lbas(self) -> Iterable[int]:
+        pass
+
+    @abstractmethod
+    def put(self, lba: int, value: str) -> None:
+        pass
+
+    @abstractmethod
+    def discard(self, lba: int) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+
+class LRUCache(ReadCache):
+    """Evicts the least recently read or written LBA."""
+
+    def __init__(self, size: int) -> None:
+        super().__init__(size)
+        self._values: OrderedDict[int, str] = OrderedDict()
+
+    def _lookup(self, lba: int) -> Optional[str]:
+        value = self._values.get(lba)
+        if value is not None:
+            self._values.move_to_end(lba)
+        return value
+
+    def _lbas(self) -> Iterable[int]:
+        return self._values.keys()
+
+    def put(self, lba: int, value: str) -> None:
+        self._values[lba] = value
+        self._values.move_to_end(lba)
+        if len(self._values) > self.size:
+            self._values.popitem(last=False)
+
+    def discard(self, lba: int) -> None:
+        self._values.pop(lba, None)
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class ClockCache(ReadCache):
+    """Second-chance approximation of LRU: a hit only sets a reference bit.
+
+    The hand sweeps a fixed ring of slots, clearing reference bits until it finds an
+    unreferenced slot to reuse, so a hit never reorders anything.
+    """
+
+    def __init__(self, size: int) -> None:
+        super().__init__(size)
+        self._slots: dict[int, int] = {}
+        self._lbas_by_slot: list[Optional[int]] = [None] * size
+        self._values: list[Optional[str]] = [None] * size
+        self._referenced: list[bool] = [False] * size
+        self._hand: int = 0
+
+    def _lookup(self, lba: int) -> Optional[str]:
+        slot = self._slots.get(lba)
+        if slot is None:
+            return None
+        self._referenced[slot] = True
+        return self._values[slot]
+
+    def _lbas(self) -> Iterable[int]:
+        return self._slots.keys()
+
+    def put(self, lba: int, value: str) -> None:
+        slot = self._slots.get(lba)
+        if slot is None:
+            slot = self._free_slot()
+            self._slots[lba] = slot
+            self._lbas_by_slot[slot] = lba
+        self._values[slot] = value
+        self._referenced[slot] = True
+
+    def _free_slot(self) -> int:
+        while True:
+            slot = self._hand
+            self._hand = (self._hand + 1) % self.size
+            if self._lbas_by_slot[slot] is None:
+                return slot
+            if not self._referenced[slot]:
+                del self._slots[self._lbas_by_slot[slot]]
+                return slot
+            self._referenced[slot] = False
+
+    def discard(self, lba: int) -> None:
+        slot = self._slots.pop(lba, None)
+        if slot is not None:
+            self._lbas_by_slot[slot] = None
+            self._values[slot] = None
+            self._referenced[slot] = False
+
+    def clear(self) -> None:
+        for lba in list(self._slots):
+            self.discard(lba)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+READ_CACHE_POLICIES = {POLICY_LRU: LRUCache, POLICY_CLOCK: ClockCache}
+
+
+def create_read_cache(size: Optional[int] = None, policy: Optional[str] = None) -> Optional[ReadCache]:
+    """Read cache sized by $SSD_READ_CACHE (0 disables it) with the $SSD_READ_CACHE_POLICY policy."""
+    size = size if size is not None else int(os.environ.get(READ_CACHE_SIZE_ENV, READ_CACHE_SIZE))
+    policy = policy or os.environ.get(READ_CACHE_POLICY_ENV, POLICY_LRU)
+    if policy not in READ_CACHE_POLICIES:
+        raise ValueError(f"{READ_CACHE_POLICY_ENV} should be one of {tuple(READ_CACHE_POLICIES)}")
+    return READ_CACHE_POLICIES[policy](size) if size > 0 else None
@@ -0,0 +1,161 @@
+"""Run many shell test scripts at once, each against its own device.
+
+    python script_farm.py [script ...] [--seeds N] [--workers N] [--backend inprocess|process]
+                          [--storage text|image|sparse] [--keep-failed] [--json report.json]
+
+Scripts are named like in a shell script file ("1_FullWriteAndReadCompare", or any
+prefix such as "1_"); a path to a script file runs every script listed in it. Every
+(script, seed) job runs in a process pool worker, in a fresh temporary directory holding
+its own NAND, buffer journal and log, with the random values seeded from the job's seed.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+from commands import InProcessExecutor
+from constant import FILENAME_MAIN_SSD, MESSAGE_PASS, SIZE_LBA, ShellCommandEnum
+from logger import Logger
+from shell import InProcessSSDController, ScriptExecutor, Shell, SSDController
+
+SCRIPT_COMMANDS = {
+    ShellCommandEnum.SCRIPT_1: "script_1",
+    ShellCommandEnum.SCRIPT_2: "script_2",
+    ShellCommandEnum.SCRIPT_3: "script_3",
+    ShellCommandEnum.SCRIPT_4: "script_4",
+}
+BACKENDS = ("inprocess", "process")
+STORAGES = ("text", "image", "sparse")
+
+
+def resolve_scripts(names: list[str]) -> list[ShellCommandEnum]:
+    """Script commands named on the command line, expanding script files."""
+    scripts = []
+    for name in names:
+        if os.path.isfile(name):
+            with open(name, "r") as f:
+                scripts += resolve_scripts([line.strip() for line in f if line.strip()])
+            continue
+        cmd = Shell.shell_parser.find_command(name)
+        if cmd not in SCRIPT_COMMANDS:
+            raise ValueError(f"{name} is not a test script")
+        scripts.append(cmd)
+    return scripts
+
+
+def _controller(backend: str) -> type[SSDController]:
+    if backend == "process":
+        # ProcessExecutor runs "python ssd.py" in the current directory.
+        os.symlink(os.path.join(os.path.dirname(os.path.abspath(__file__)), FILENAME_MAIN_SSD), FILENAME_MAIN_SSD)
+        return SSDController
+    return type("FarmSSDController", (InProcessSSDController,), {
+        "executor": InProcessExecutor(),
+        "_capacity": None,
+    })
+
+
+def run_job(script: str, seed: int, backend: str = "inprocess", storage: str = "text",
+            keep_failed: bool = False) -> dict:
+    """Run one script on a fresh device in a temporary directory and report how it went."""
+    cmd = ShellCommandEnum(script)
+    workdir = tempfile.mkdtemp(prefix=f"farm_{script.split('_')[0]}_{seed}_")
+    cwd = os.getcwd()
+    result = {"script": script, "seed": seed, "passed": False, "seconds": 0.0, "workdir": None, "error": None}
+    try:
+        os.chdir(workdir)
+        # The shell logger keeps the log path it was created with, usually a relative one.
+        os.makedirs(Logger().log_dir, exist_ok=True)
+        open(Logger().latest_log, "a").close()
+        if storage != "text":
+            # Importing ssd creates the NAND and buffer files in the current directory.
+            from ssd import format_device
+            format_device(SIZE_LBA, storage)
+
+        random.seed(seed)
+        script_executor = ScriptExecutor.using(_controller(backend))
+        begin = time.perf_counter()
+        result["passed"] = getattr(script_executor, SCRIPT_COMMANDS[cmd])() == MESSAGE_PASS
+        result["seconds"] = time.perf_counter() - begin
+    except Exception:
+        result["error"] = traceback.format_exc()
+    finally:
+        os.chdir(cwd)
+        if keep_failed and not result["passed"]:
+            result["workdir"] = workdir
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def run_farm(scripts: list[ShellCommandEnum], seeds: int = 1, workers: Optional[int] = None,
+             backend: str = "inprocess", storage: str = "text", keep_failed: bool = False) -> dict:
+    """Run every script with seeds 0..seeds-1 on a process pool; results keep the job order."""
+    jobs = [(cmd.value, seed) for cmd in scripts for seed in range(seeds)]
+    results: list[Optional[dict]] = [None] * len(jobs)
+    begin = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_job, script, seed, backend, storage, keep_failed): idx
+            for idx, (script, seed) in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    return {
+        "backend": backend,
+        "storage": storage,
+        "passed": sum(result["passed"] for result in results),
+        "failed": sum(not result["passed"] for result in results),
+        "wall_seconds": time.perf_counter() - begin,
+        "job_seconds": sum(result["seconds"] for result in results),
+        "results": results,
+    }
+
+
+def print_report(report: dict) -> None:
+    for result in report["results"]:
+        status = "Pass" if result["passed"] else "FAIL!"
+        print(f"{result['script']:<28}seed {result['seed']:<5}{result['seconds']:>8.2f}s   {status}")
+        if result["workdir"]:
+            print(f"{'':>28}kept {result['workdir']}")
+        if result["error"]:
+            print(result["error"], file=sys.stderr)
+    print(f"{report['passed']} passed, {report['failed']} failed in {report['wall_seconds']:.2f}s "
+          f"({report['job_seconds']:.2f}s of script time)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scripts", nargs="*", default=[cmd.value for cmd in SCRIPT_COMMANDS])
+    parser.add_argument("--seeds", type=int, default=1, help="run every script with seeds 0..N-1")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPUs")
+    parser.add_argument("--backend", choices=BACKENDS, default="inprocess")
+    parser.add_argument("--storage", choices=STORAGES, default="text")
+    parser.add_argument("--keep-failed", action="store_true", help="keep the device directory of failed jobs")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    try:
+        scripts = resolve_scripts(args.scripts)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = run_farm(scripts, args.seeds, args.workers, args.backend, args.storage, args.keep_failed)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report["failed"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-import sys  # noqa
+import argparse
 from typing import Callable, Optional
 
 import utils
-from commands import EraseShellCommand, FlushShellCommand, ReadShellCommand, WriteShellCommand
+from commands import (
+    DeviceError,
+    EraseShellCommand,
+    FlushShellCommand,
+    InfoShellCommand,
+    InProcessExecutor,
+    ProcessExecutor,
+    ReadRangeShellCommand,
+    ReadShellCommand,
+    SocketExecutor,
+    WriteRangeShellCommand,
+    WriteShellCommand
+)
 from constant import (
     FILENAME_MAIN_SSD,
     FILENAME_OUT,
@@ -15,10 +27,11 @@ from constant import (
     MESSAGE_HELP,
     MESSAGE_INVALID_SHELL_CMD,
     MESSAGE_PASS,
-    SIZE_LBA,
     ShellCommandEnum
 )
 from logger import Logger
+from nand_image import device_capacity
+from tracing import traced
 
 TWO_ARGS_REQUIRE_COMMANDS = [
     ShellCommandEnum.WRITE,
@@ -32,8 +45,10 @@ ONE_ARGS_REQUIRE_COMMANDS = [
 
 
 class SSDController:
+    executor = ProcessExecutor()
 
     @classmethod
+    @traced
     def _cache_inout(cls) -> str:
         try:
             with open(FILENAME_OUT, "r") as f:
@@ -47,8 +62,9 @@ class SSDController:
             return MESSAGE_ERROR
 
     @classmethod
+    @traced
     def read(cls, lba: int) -> str:
-        cmd = ReadShellCommand(FILENAME_MAIN_SSD, lba)
+        cmd = ReadShellCommand(FILENAME_MAIN_SSD, lba, executor=cls.executor)
         is_ssd_run = cmd.execute()
         if not is_ssd_run:
             return MESSAGE_ERROR
@@ -56,8 +72,9 @@ class SSDController:
         return cls._cache_inout()
 
     @classmethod
+    @traced
     def write(cls, lba: int, value: str) -> str:
-        cmd = WriteShellCommand(FILENAME_MAIN_SSD, lba, value)
+        cmd = WriteShellCommand(FILENAME_MAIN_SSD, lba, value, executor=cls.executor)
         is_ssd_run = cmd.execute()
         if not is_ssd_run:
             return MESSAGE_ERROR
@@ -69,8 +86,33 @@ class SSDController:
         return MESSAGE_ERROR
 
     @classmethod
+    @traced
+    def read_range(cls, start: int, end: int) -> str:
+        cmd = ReadRangeShellCommand(FILENAME_MAIN_SSD, start, end, executor=cls.executor)
+        is_ssd_run = cmd.execute()
+        if not is_ssd_run:
+            return MESSAGE_ERROR
+
+        return cls._cache_inout()
+
+    @classmethod
+    @traced
+    def write_range(cls, start: int, end: int, value: str) -> str:
+        cmd = WriteRangeShellCommand(FILENAME_MAIN_SSD, start, end, value, executor=cls.executor)
+        is_ssd_run = cmd.execute()
+        if not is_ssd_run:
+            return MESSAGE_ERROR
+
+        res = cls._cache_inout()
+        if res == "":
+            return MESSAGE_DONE
+
+        return MESSAGE_ERROR
+
+    @classmethod
+    @traced
     def erase(cls, lba: int, size: int) -> str:
-        cmd = EraseShellCommand(FILENAME_MAIN_SSD, lba, size)
+        cmd = EraseShellCommand(FILENAME_MAIN_SSD, lba, size, executor=cls.executor)
         is_ssd_run = cmd.execute()
         if not is_ssd_run:
             return MESSAGE_ERROR
@@ -82,8 +124,15 @@ class SSDController:
         return MESSAGE_ERROR
 
     @classmethod
+    def capacity(cls) -> int:
+        # ssd.py runs in this directory, so its NAND can be inspected directly: a header,
+        # or the text NAND's saved line count.
+        return device_capacity()
+
+    @classmethod
+    @traced
     def flush(cls):
-        cmd = FlushShellCommand(FILENAME_MAIN_SSD)
+        cmd = FlushShellCommand(FILENAME_MAIN_SSD, executor=cls.executor)
         is_ssd_run = cmd.execute()
         if not is_ssd_run:
             return MESSAGE_ERROR
@@ -95,6 +144,45 @@ class SSDController:
         return MESSAGE_ERROR
 
 
+class InlineSSDController(SSDController):
+    """Base for transports that hand the result back directly instead of via ssd_output.txt."""
+    _capacity: Optional[int] = None
+    _local_capacity: Optional[int] = None
+
+    @classmethod
+    @traced
+    def _cache_inout(cls) -> str:
+        if cls.executor.output is None:
+            return MESSAGE_ERROR
+        return cls.executor.output
+
+    @classmethod
+    def capacity(cls) -> int:
+        """Ask the device once, and again after the device here has been formatted to another capacity.
+
+        The device may live elsewhere (a daemon's device directory), so its own answer is
+        kept; the local capacity only tells when to ask again. Raises DeviceError when the
+        device does not answer.
+        """
+        local_capacity = device_capacity()
+        if cls._capacity is None or local_capacity != cls._local_capacity:
+            cmd = InfoShellCommand(FILENAME_MAIN_SSD, executor=cls.executor)
+            if not cmd.execute() or not cls._cache_inout().isdigit():
+                raise DeviceError("the device did not report its capacity")
+            cls._capacity, cls._local_capacity = int(cls._cache_inout()), local_capacity
+        return cls._capacity
+
+
+class SocketSSDController(InlineSSDController):
+    """Talks to a long-lived `ssd.py --serve` daemon."""
+    executor = SocketExecutor()
+
+
+class InProcessSSDController(InlineSSDController):
+    """Runs ssd.SSD in the shell's own process against the real buffer and NAND files."""
+    executor = InProcessExecutor()
+
+
 class ShellParser:
 
     @classmethod
@@ -137,6 +225,7 @@ class CommandExecutor:
     logging: Callable = Logger().print
 
     @classmethod
+    @traced
     def read(cls, lba: int) -> str:
         lba = utils.safe_int(lba)
         ret = cls.ssd_controller.read(lba)
@@ -147,6 +236,7 @@ class CommandExecutor:
         return f"[Read] LBA {lba:02d} : {ret}"
 
     @classmethod
+    @traced
     def write(cls, lba: int, value: str) -> str:
         lba = utils.safe_int(lba)
         ret = cls.ssd_controller.write(lba, value)
@@ -157,52 +247,52 @@ class CommandExecutor:
         return "[Write] Done"
 
     @classmethod
+    @traced
     def full_write(cls, value: str):
-        for lba in range(SIZE_LBA):
-            ret = cls.ssd_controller.write(lba, value)
-            if ret == MESSAGE_ERROR:
-                return f"[Full Write] ERROR in LBA[{lba:02d}]"
+        ret = cls.ssd_controller.write_range(0, cls.ssd_controller.capacity(), value)
+        if ret == MESSAGE_ERROR:
+            return "[Full Write] ERROR"
 
         cls.logging("... COMPLETE")
         return "[Full Write] Done"
 
     @classmethod
-    def full_read(cls, num_iter: int = SIZE_LBA) -> str:
+    @traced
+    def full_read(cls, num_iter: Optional[int] = None) -> str:
         header = "[Full Read]"
+        num_iter = num_iter or cls.ssd_controller.capacity()
+        values = cls.ssd_controller.read_range(0, num_iter).split()
+        if len(values) != num_iter:
+            return f"{header} ERROR"
+
         results = [header]
-        results += [
-            f"LBA {i:0>2} : {cls.ssd_controller.read(lba=i)}"
-            for i in range(num_iter)
-        ]
+        results += [f"LBA {i:0>2} : {value}" for i, value in enumerate(values)]
         cls.logging("... COMPLETE")
         return "\n".join(results)
 
     @classmethod
+    @traced
     def erase(cls, lba: int, size: int) -> str:
         lba = utils.safe_int(lba)
         size = utils.safe_int(size)
 
-        if not utils.validate_erase_args(lba, size):
+        if not utils.validate_erase_args(lba, size, cls.ssd_controller.capacity()):
             return "[Erase] ERROR"
 
-        step = 10
-        start, end = (lba, lba + size)
-        for i in range(start, end, step):
-            _start, _end = (i, min(i + step, end))
-            _size = _end - _start
-            ret = cls.ssd_controller.erase(lba=_start, size=_size)
-            if ret == MESSAGE_ERROR:
-                return "[Erase] ERROR"
+        ret = cls.ssd_controller.erase(lba=lba, size=size)
+        if ret == MESSAGE_ERROR:
+            return "[Erase] ERROR"
 
         cls.logging("... COMPLETE")
         return "[Erase] Done"
 
     @classmethod
+    @traced
     def erase_range(cls, start_lba: int, end_lba: int) -> str:
         start_lba = utils.safe_int(start_lba)
         end_lba = utils.safe_int(end_lba)
 
-        if not utils.validate_erase_range_args(start_lba, end_lba):
+        if not utils.validate_erase_range_args(start_lba, end_lba, cls.ssd_controller.capacity()):
             return "[Erase Range] ERROR"
 
         erasing_size = end_lba - start_lba + 1
@@ -214,6 +304,7 @@ class CommandExecutor:
         return "[Erase Range] Done"
 
     @classmethod
+    @traced
     def flush(cls):
         ret = cls.ssd_controller.flush()
         if ret == MESSAGE_ERROR:
@@ -229,6 +320,18 @@ class ScriptExecutor:
     logging: Callable = Logger().print
 
     @classmethod
+    def using(cls, ssd_controller: type[SSDController]) -> type[ScriptExecutor]:
+        """Subclass running the scripts, and its command executor, on another controller."""
+        command_executor = type(cls.command_executor.__name__, (cls.command_executor,), {
+            "ssd_controller": ssd_controller,
+        })
+        return type(cls.__name__, (cls,), {
+            "ssd_controller": ssd_controller,
+            "command_executor": command_executor,
+        })
+
+    @classmethod
+    @traced
     def script_1(cls, num_iter: int = 20) -> str:
         for n in range(num_iter):
             start_idx = n * 5
@@ -244,6 +347,7 @@ class ScriptExecutor:
         return MESSAGE_PASS
 
     @classmethod
+    @traced
     def script_2(cls, num_iter: int = 30) -> str:
         lba_values: list[int] = [4, 0, 3, 1, 2]
         for _ in range(num_iter):
@@ -264,8 +368,9 @@ class ScriptExecutor:
         return MESSAGE_PASS
 
     @classmethod
+    @traced
     def script_3(cls, num_iter: int = 200) -> str:
-        lba_1, lba_2 = (0, SIZE_LBA - 1)
+        lba_1, lba_2 = (0, cls.ssd_controller.capacity() - 1)
         for _ in range(num_iter):
             value = utils.get_random_value()
             cls.ssd_controller.write(lba=lba_1, value=value)
@@ -277,13 +382,15 @@ class ScriptExecutor:
         return MESSAGE_PASS
 
     @classmethod
+    @traced
     def script_4(cls, num_iter: int = 30) -> str:
         ret = cls.command_executor.erase_range(0, 2)
         if MESSAGE_ERROR in ret:
             return MESSAGE_FAIL
 
+        capacity = cls.ssd_controller.capacity()
         for _ in range(num_iter):
-            for start_lba in range(2, SIZE_LBA - 1, 2):
+            for start_lba in range(2, capacity - 1, 2):
                 two_diff_values = utils.get_two_diff_random_value()
 
                 for val in two_diff_values:
@@ -291,7 +398,7 @@ class ScriptExecutor:
                     if ret == MESSAGE_ERROR:
                         return MESSAGE_FAIL
 
-                end_lba = min(start_lba + 2, SIZE_LBA - 1)
+                end_lba = min(start_lba + 2, capacity - 1)
                 ret = cls.command_executor.erase_range(start_lba, end_lba)
                 if MESSAGE_ERROR in ret:
                     return MESSAGE_FAIL
@@ -307,6 +414,11 @@ class Shell:
     script_executor = ScriptExecutor
     _command_mapping_dict = None
 
+    @classmethod
+    def use_ssd_controller(cls, ssd_controller: type[SSDController]) -> None:
+        cls.command_executor.ssd_controller = ssd_controller
+        cls.script_executor.ssd_controller = ssd_controller
+
     @classmethod
     def _command_mapper(cls, cmd: ShellCommandEnum) -> Callable:
         if cls._command_mapping_dict is not None:
@@ -330,9 +442,13 @@ class Shell:
         return cls._command_mapping_dict[cmd]
 
     @classmethod
+    @traced
     def execute_command(cls, cmd: ShellCommandEnum, args: list) -> Optional[str]:
         func = cls._command_mapper(cmd)
-        return func(*args)
+        try:
+            return func(*args)
+        except DeviceError:
+            return MESSAGE_ERROR
 
     @classmethod
     def run(cls) -> None:
@@ -375,9 +491,25 @@ class Shell:
                 break
 
 
+SSD_CONTROLLERS = {
+    "process": SSDController,
+    "socket": SocketSSDController,
+    "inprocess": InProcessSSDController,
+}
+
+
 if __name__ == "__main__":
-    if len(sys.argv) == 2:
-        cmd_file = sys.argv[1]
-        Shell.run_script(script=cmd_file)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("script", nargs="?")
+    parser.add_argument("--backend", choices=SSD_CONTROLLERS, default="process")
+    parser.add_argument("--device", help="device of an `ssd.py --serve-devices` daemon (socket backend)")
+    parsed = parser.parse_args()
+
+    if parsed.device:
+        SocketSSDController.executor = SocketExecutor(device=parsed.device)
+    Shell.use_ssd_controller(SSD_CONTROLLERS[parsed.backend])
+    Logger().enable_async()
+    if parsed.script:
+        Shell.run_script(script=parsed.script)
     else:
         Shell.run()
@@ -0,0 +1,65 @@
+from constant import SIZE_LBA
+from wal import replace_durably
+
+SPARSE_MAGIC = "SSDSPARSE1"
+ERASED_VALUE = "0x00000000"
+
+
+class SparseNand:
+    """NAND file holding only the LBAs that are not 0x00000000.
+
+    A "SSDSPARSE1 <capacity>" header is followed by one "lba\\tvalue" line per live LBA,
+    in LBA order. Every other LBA reads as 0x00000000, so the file size and the cost of
+    rewriting it follow the live data rather than the capacity.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.capacity = read_sparse_capacity(path)
+
+    @classmethod
+    def create(cls, path: str, capacity: int = SIZE_LBA) -> "SparseNand":
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{SPARSE_MAGIC} {capacity}\n")
+        replace_durably(tmp_path, path)
+        return cls(path)
+
+    def contains(self, lba: int, size: int = 1) -> bool:
+        return 0 <= lba and size >= 0 and lba + size <= self.capacity
+
+    def load(self) -> dict[int, str]:
+        live = {}
+        with open(self.path, "r") as f:
+            next(f)
+            for line in f:
+                parts = line.strip().split("\t")
+                if len(parts) == 2:
+                    live[int(parts[0])] = parts[1]
+        return live
+
+    def save(self, live: dict[int, str]) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{SPARSE_MAGIC} {self.capacity}\n")
+            f.writelines(f"{lba}\t{live[lba]}\n" for lba in sorted(live))
+        replace_durably(tmp_path, self.path)
+
+
+def read_sparse_capacity(path: str) -> int:
+    with open(path, "r") as f:
+        magic, _, capacity = f.readline().strip().partition(" ")
+    if magic != SPARSE_MAGIC or not capacity.isdigit():
+        raise ValueError(f"{path} is not a sparse NAND")
+    return int(capacity)
+
+
+def drop_range(live: dict[int, str], start: int, end: int) -> None:
+    """Erase [start, end) by dropping entries, visiting whichever is smaller: the range or the live set."""
+    if end - start <= len(live):
+        for lba in range(start, end):
+            live.pop(lba, None)
+    else:
+        for lba in [lba for lba in live if start <= lba < end]:
+            del live[lba]
+
@@ -1,30 +1,90 @@
+import json
 import os
 import sys
-from typing import Any
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, Optional
 
 import utils
-from buffer_manager import Buffer, BufferManager
-from constant import FILENAME, FILENAME_OUT, SIZE_LBA
+from buffer_manager import BUFFER_JOURNAL, Buffer, BufferManager
+from constant import (
+    FILENAME,
+    FILENAME_IMAGE,
+    FILENAME_MAIN_SSD,
+    FILENAME_OUT,
+    FILENAME_SPARSE,
+    SIZE_LBA
+)
+from ftl import FTL_ENV, FTL_SUFFIX, FlashTranslationLayer, ftl_policy, saved_stats
+from nand_image import (
+    NandImage,
+    canonical_value,
+    format_value,
+    parse_value,
+    patch_joined,
+    save_text_capacity,
+    text_capacity,
+    zero_joined_extents
+)
+from read_cache import ReadCache
+from sparse_nand import ERASED_VALUE, SparseNand, drop_range
+from tracing import traced
+from trim import TRIM_COMPACT_EXTENTS, TRIM_SUFFIX, TrimExtents
+from wal import replace_durably
 
 
 class FileManager:
+    """Text NAND, one "<lba>\t<value>" line per LBA, parsed for each access.
 
-    def __init__(self) -> None:
+    An erase only records a trimmed extent beside the NAND. The zeros are written when the
+    NAND file is next rewritten anyway, by a write or a flush, and the extents are dropped.
+
+    The extents are reloaded whenever another process has saved them, before each access.
+
+    An optional read cache keeps recently read LBA values across calls. Writes and erases
+    made through this manager update it; a NAND or trim file replaced by another process,
+    noticed from their inode, size and mtime, empties it.
+    """
+
+    def __init__(
+            self,
+            capacity: int = SIZE_LBA,
+            path: str = FILENAME,
+            read_cache: Optional[ReadCache] = None,
+    ) -> None:
+        self.path = path
+        self.trim = TrimExtents(f"{path}{TRIM_SUFFIX}")
+        self.read_cache = read_cache
+        self._cache_stamp: Optional[tuple] = None
+        self._cached_nand: Optional[dict[int, str]] = None
+        self._is_dirty: bool = False
+        self._capacity: int = capacity
         self.init_nand()
 
-    @classmethod
-    def init_nand(cls) -> None:
-        if os.path.exists(FILENAME):
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def init_nand(self) -> None:
+        if os.path.exists(self.path):
+            # The text NAND has no header; its capacity is its number of LBA lines.
+            self._capacity = text_capacity(self.path)
             return
 
-        with open(FILENAME, "w") as f:
-            for i in range(SIZE_LBA):
-                f.write(f"{i}\t0x00000000\n")
+        size = 0
+        with open(self.path, "w") as f:
+            for i in range(self._capacity):
+                line = f"{i}\t0x00000000\n"
+                f.write(line)
+                size += len(line)
+        save_text_capacity(self.path, self._capacity, size)
+
+    @traced
+    def _read_whole_lines(self) -> dict[int, str]:
+        if self._cached_nand is not None:
+            return self._cached_nand
 
-    @classmethod
-    def _read_whole_lines(cls) -> dict[int, str]:
         result = {}
-        with open(FILENAME, "r") as f:
+        with open(self.path, "r") as f:
             for line in f:
                 line = line.strip()
                 if not line:
@@ -35,105 +95,573 @@ class FileManager:
                 result[int(parts[0])] = parts[1]
         return result
 
-    @classmethod
-    def _save_to_nand(cls, data) -> None:
-        with open(FILENAME, "w") as f:
+    @traced
+    def _save_to_nand(self, data) -> None:
+        if self._cached_nand is not None:
+            self._cached_nand = data
+            self._is_dirty = True
+            return
+        self._persist(data)
+
+    def _persist(self, data) -> None:
+        unchanged = self._cache_is_current()
+        self.trim.refresh()
+        # Writes may have split or removed extents; save them first so a crash never re-trims a write.
+        if self.trim.dirty:
+            self.trim.save()
+        for start, end in self.trim:
+            data.update(dict.fromkeys(range(start, end), ERASED_VALUE))
+        self._write_nand_file(data)
+        if len(self.trim):
+            self.trim.clear()
+            self.trim.save()
+        self._restamp_read_cache(unchanged)
+
+    def _save_trim(self) -> None:
+        unchanged = self._cache_is_current()
+        self.trim.save()
+        self._restamp_read_cache(unchanged)
+
+    def _nand_stamp(self) -> tuple:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None, self.trim.stamp()
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns), self.trim.stamp()
+
+    def _cache_is_current(self) -> bool:
+        return self.read_cache is None or self._nand_stamp() == self._cache_stamp
+
+    def _restamp_read_cache(self, unchanged: bool) -> None:
+        """Adopt the stamp of files this manager just saved, emptying the cache if others changed them first."""
+        if self.read_cache is not None:
+            if not unchanged:
+                self.read_cache.clear()
+            self._cache_stamp = self._nand_stamp()
+
+    def _validate_read_cache(self) -> None:
+        stamp = self._nand_stamp()
+        if stamp != self._cache_stamp:
+            self.read_cache.clear()
+            self._cache_stamp = stamp
+
+    def _update_read_cache(self, start: int, end: int, value: Optional[str] = None) -> None:
+        """Keep a single written value cached; forget the LBAs of a larger write or erase."""
+        if self.read_cache is None:
+            return
+        if value is not None and end - start == 1:
+            self.read_cache.put(start, value)
+        else:
+            self.read_cache.discard_range(start, end)
+
+    @traced
+    def _write_nand_file(self, data) -> None:
+        """Write the whole NAND to a temporary file and swap it in, so a crash never truncates it."""
+        size = sum(len(str(key)) + len(value) + 2 for key, value in data.items())
+        save_text_capacity(self.path, len(data), size)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
             for key, value in data.items():
                 f.write(f"{key}\t{value}\n")
+        replace_durably(tmp_path, self.path)
 
-    @classmethod
-    def read_nand(cls, lba):
-        data_list = cls._read_whole_lines()
-        return data_list.get(lba, "")
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        """Parse the NAND file once and write it back once, on commit() or exit."""
+        if self._cached_nand is not None:
+            yield
+            return
 
-    @classmethod
-    def write_nand(cls, lba, change_data) -> bool:
-        nand_datas = cls._read_whole_lines()
+        self.trim.refresh()
+        self._cached_nand = self._read_whole_lines()
+        try:
+            yield
+        finally:
+            self.commit()
+            self._cached_nand = None
+
+    def commit(self) -> None:
+        if self._is_dirty:
+            self._persist(self._cached_nand)
+            self._is_dirty = False
+        elif self.trim.dirty:
+            self.trim.save()
+
+    def read_nand(self, lba):
+        self.trim.refresh()
+        if self.read_cache is None:
+            return self._load_lba(lba)
+        self._validate_read_cache()
+        value = self.read_cache.get(lba)
+        if value is None:
+            value = self._load_lba(lba)
+            if value:
+                self.read_cache.put(lba, value)
+        return value
+
+    def _load_lba(self, lba) -> str:
+        if self.trim.contains(lba):
+            return ERASED_VALUE
+        return self._read_whole_lines().get(lba, "")
+
+    def read_nand_range(self, start, end) -> list[str]:
+        self.trim.refresh()
+        data_list = self._read_whole_lines()
+        values = [data_list.get(lba, "") for lba in range(start, end)]
+        for s, e in self.trim.overlapping(start, end):
+            values[s - start:e - start] = [ERASED_VALUE] * (e - s)
+        return values
+
+    def read_nand_joined(self, start, end, erased: list[tuple[int, int]], writes: dict[int, str]) -> str:
+        """Space separated values of [start, end) with the `erased` extents, then `writes`, laid over them.
+
+        Returns "" if the range is out of the NAND.
+        """
+        values = self.read_nand_range(start, end)
+        for s, e in erased:
+            values[s - start:e - start] = [ERASED_VALUE] * (e - s)
+        for lba, value in writes.items():
+            values[lba - start] = value
+        return "" if "" in values else " ".join(values)
+
+    def write_nand(self, lba, change_data) -> bool:
+        nand_datas = self._read_whole_lines()
         current_data = nand_datas.get(lba, "")
         if current_data == "":
             return False
         nand_datas[lba] = change_data
-        cls._save_to_nand(nand_datas)
+        self.trim.refresh()
+        self.trim.remove(lba, lba + 1)
+        self._save_to_nand(nand_datas)
+        self._update_read_cache(lba, lba + 1, change_data)
         return True
 
-    @classmethod
-    def erase_nand(cls, lba, size) -> bool:
-        lines = cls._read_whole_lines()
-        current_data = lines.get(lba, "")
-        if current_data == "":
+    def write_nand_range(self, start, values: list[str]) -> bool:
+        nand_datas = self._read_whole_lines()
+        if start not in nand_datas or start + len(values) - 1 not in nand_datas:
             return False
-        for each_lba in range(lba, lba + size):
-            lines[each_lba] = "0x00000000"
-        cls._save_to_nand(lines)
+        for offset, value in enumerate(values):
+            nand_datas[start + offset] = value
+        self.trim.refresh()
+        self.trim.remove(start, start + len(values))
+        self._save_to_nand(nand_datas)
+        self._update_read_cache(start, start + len(values))
         return True
 
-    @classmethod
-    def write_output(cls, contents: str):
+    def fill_nand_range(self, start, end, pattern: list[str]) -> bool:
+        return self.write_nand_range(start, [pattern[i % len(pattern)] for i in range(end - start)])
+
+    def erase_nand(self, lba, size) -> bool:
+        if not (0 <= lba and size >= 0 and lba + size <= self.capacity):
+            return False
+        self.trim.refresh()
+        self.trim.add(lba, lba + size)
+        if self._cached_nand is None:
+            self._save_trim()
+        self._update_read_cache(lba, lba + size)
+        return True
+
+    def write_output(self, contents: str):
         with open(FILENAME_OUT, "w") as f:
             f.write(contents)
 
 
+class ImageFileManager(FileManager):
+    """FileManager over the fixed-width binary image, patching single LBAs in place.
+
+    Erases are trimmed extents. Writes cut their LBAs out of the extents, and once there
+    are more than TRIM_COMPACT_EXTENTS extents they are zeroed in the image and dropped.
+    Changed extents are saved after each write or erase, or on commit() when deferred.
+    """
+
+    def __init__(self, path: str = FILENAME_IMAGE, capacity: int = SIZE_LBA) -> None:
+        self._deferred: bool = False
+        super().__init__(capacity, path)
+
+    @property
+    def capacity(self) -> int:
+        return self.image.capacity
+
+    def init_nand(self) -> None:
+        if os.path.exists(self.path):
+            self.image = NandImage(self.path)
+        else:
+            self.image = NandImage.create(self.path, self._capacity)
+
+    def read_nand(self, lba):
+        if not self.image.contains(lba):
+            return ""
+        self.trim.refresh()
+        if self.trim.contains(lba):
+            return ERASED_VALUE
+        return format_value(self.image.read(lba))
+
+    def read_nand_range(self, start, end) -> list[str]:
+        if not self.image.contains(start, end - start):
+            return [""] * (end - start)
+        values = [format_value(value) for value in self.image.read_range(start, end)]
+        self.trim.refresh()
+        for s, e in self.trim.overlapping(start, end):
+            values[s - start:e - start] = [ERASED_VALUE] * (e - s)
+        return values
+
+    def read_nand_joined(self, start, end, erased: list[tuple[int, int]], writes: dict[int, str]) -> str:
+        if not self.image.contains(start, end - start):
+            return ""
+        joined = self.image.read_joined_range(start, end)
+        self.trim.refresh()
+        zero_joined_extents(joined, start, self.trim.overlapping(start, end) + erased)
+        patch_joined(joined, start, writes)
+        return joined.decode()
+
+    def write_nand(self, lba, change_data) -> bool:
+        if not self.image.contains(lba):
+            return False
+        self.image.write(lba, parse_value(change_data))
+        self.trim.refresh()
+        self.trim.remove(lba, lba + 1)
+        self._save_trim()
+        return True
+
+    def write_nand_range(self, start, values: list[str]) -> bool:
+        if not self.image.contains(start, len(values)):
+            return False
+        self.image.write_range(start, [parse_value(value) for value in values])
+        self.trim.refresh()
+        self.trim.remove(start, start + len(values))
+        self._save_trim()
+        return True
+
+    def fill_nand_range(self, start, end, pattern: list[str]) -> bool:
+        if not self.image.contains(start, end - start):
+            return False
+        self.image.fill_range(start, end, [parse_value(value) for value in pattern])
+        self.trim.refresh()
+        self.trim.remove(start, end)
+        self._save_trim()
+        return True
+
+    def erase_nand(self, lba, size) -> bool:
+        if not self.image.contains(lba, size):
+            return False
+        self.trim.refresh()
+        self.trim.add(lba, lba + size)
+        self._save_trim()
+        return True
+
+    def _save_trim(self) -> None:
+        if not self._deferred and self.trim.dirty:
+            self.trim.save()
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        # Writes already patch the mapped image in place; only sync once at the end.
+        if self._deferred:
+            yield
+            return
+
+        self.trim.refresh()
+        self._deferred = True
+        try:
+            yield
+        finally:
+            self._deferred = False
+            self.commit()
+
+    @traced
+    def commit(self) -> None:
+        if len(self.trim) > TRIM_COMPACT_EXTENTS:
+            for start, end in self.trim:
+                self.image.erase(start, end - start)
+            self.trim.clear()
+        self.image.flush()
+        if self.trim.dirty:
+            self.trim.save()
+
+
+class SparseFileManager(FileManager):
+    """FileManager over the sparse NAND: loads and rewrites only the live (non-zero) LBAs.
+
+    Like the text NAND it is loaded for each access, or once per deferred() block.
+    """
+
+    def __init__(
+            self,
+            path: str = FILENAME_SPARSE,
+            capacity: int = SIZE_LBA,
+            read_cache: Optional[ReadCache] = None,
+    ) -> None:
+        super().__init__(capacity, path, read_cache)
+
+    @property
+    def capacity(self) -> int:
+        return self.sparse.capacity
+
+    def init_nand(self) -> None:
+        if os.path.exists(self.path):
+            self.sparse = SparseNand(self.path)
+        else:
+            self.sparse = SparseNand.create(self.path, self._capacity)
+
+    @traced
+    def _read_whole_lines(self) -> dict[int, str]:
+        if self._cached_nand is not None:
+            return self._cached_nand
+        return self.sparse.load()
+
+    @traced
+    def _write_nand_file(self, data) -> None:
+        self.sparse.save(data)
+
+    def _load_lba(self, lba) -> str:
+        if not self.sparse.contains(lba):
+            return ""
+        return self._read_whole_lines().get(lba, ERASED_VALUE)
+
+    def read_nand_range(self, start, end) -> list[str]:
+        if not self.sparse.contains(start, end - start):
+            return [""] * (end - start)
+        live = self._read_whole_lines()
+        return [live.get(lba, ERASED_VALUE) for lba in range(start, end)]
+
+    def read_nand_joined(self, start, end, erased: list[tuple[int, int]], writes: dict[int, str]) -> str:
+        if not self.sparse.contains(start, end - start):
+            return ""
+        # Start from all zeros and patch in the live values, then the pending ones.
+        joined = bytearray(f"{ERASED_VALUE} ".encode()) * (end - start)
+        del joined[-1:]
+        live = {lba: value for lba, value in self._read_whole_lines().items() if start <= lba < end}
+        patch_joined(joined, start, live)
+        zero_joined_extents(joined, start, erased)
+        patch_joined(joined, start, writes)
+        return joined.decode()
+
+    def write_nand_range(self, start, values: list[str]) -> bool:
+        if not self.sparse.contains(start, len(values)):
+            return False
+        live = self._read_whole_lines()
+        for offset, value in enumerate(values):
+            if value == ERASED_VALUE:
+                live.pop(start + offset, None)
+            else:
+                live[start + offset] = value
+        self._save_to_nand(live)
+        self._update_read_cache(start, start + len(values), values[0] if len(values) == 1 else None)
+        return True
+
+    def write_nand(self, lba, change_data) -> bool:
+        return self.write_nand_range(lba, [change_data])
+
+    def erase_nand(self, lba, size) -> bool:
+        if not self.sparse.contains(lba, size):
+            return False
+        live = self._read_whole_lines()
+        drop_range(live, lba, lba + size)
+        self._save_to_nand(live)
+        self._update_read_cache(lba, lba + size)
+        return True
+
+
+class FTLFileManager:
+    """Any FileManager with its accepted writes and erases replayed on a simulated FTL.
+
+    Reads and everything else go straight to the wrapped manager. The FTL state is saved
+    beside the NAND after every command, or once per deferred() block.
+    """
+
+    def __init__(self, file_manager: FileManager, policy: str) -> None:
+        self.file_manager = file_manager
+        self.ftl_path = f"{file_manager.path}{FTL_SUFFIX}"
+        self.ftl = FlashTranslationLayer.load(self.ftl_path, file_manager.capacity, policy)
+        self._deferred: bool = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.file_manager, name)
+
+    def _record(self, applied: bool, replay: Callable[[int, int], None], start: int, end: int) -> bool:
+        if applied:
+            replay(start, end)
+            if not self._deferred:
+                self.ftl.save(self.ftl_path)
+        return applied
+
+    def write_nand(self, lba, change_data) -> bool:
+        return self._record(self.file_manager.write_nand(lba, change_data), self.ftl.write, lba, lba + 1)
+
+    def write_nand_range(self, start, values: list[str]) -> bool:
+        applied = self.file_manager.write_nand_range(start, values)
+        return self._record(applied, self.ftl.write, start, start + len(values))
+
+    def fill_nand_range(self, start, end, pattern: list[str]) -> bool:
+        return self._record(self.file_manager.fill_nand_range(start, end, pattern), self.ftl.write, start, end)
+
+    def erase_nand(self, lba, size) -> bool:
+        return self._record(self.file_manager.erase_nand(lba, size), self.ftl.trim, lba, lba + size)
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        if self._deferred:
+            yield
+            return
+
+        self._deferred = True
+        try:
+            with self.file_manager.deferred():
+                yield
+        finally:
+            self._deferred = False
+            self.ftl.save(self.ftl_path)
+
+    def commit(self) -> None:
+        self.file_manager.commit()
+        self.ftl.save(self.ftl_path)
+
+
+def create_file_manager(directory: str = "", read_cache: Optional[ReadCache] = None) -> FileManager:
+    """Use the binary image or the sparse NAND when one has been formatted, otherwise the text NAND.
+
+    The device files are looked up in `directory`, the current directory by default. The
+    image reads single words from its mmap and does not use `read_cache`. With $SSD_FTL set
+    the manager is wrapped in an FTLFileManager using that garbage collection policy.
+    """
+    image_path = os.path.join(directory, FILENAME_IMAGE)
+    sparse_path = os.path.join(directory, FILENAME_SPARSE)
+    if os.path.exists(image_path):
+        file_manager = ImageFileManager(image_path)
+    elif os.path.exists(sparse_path):
+        file_manager = SparseFileManager(sparse_path, read_cache=read_cache)
+    else:
+        file_manager = FileManager(path=os.path.join(directory, FILENAME), read_cache=read_cache)
+
+    policy = ftl_policy()
+    if policy is not None:
+        return FTLFileManager(file_manager, policy)
+    return file_manager
+
+
+def ftl_stats(directory: str = "") -> Optional[dict]:
+    """Statistics of the FTL saved beside the device in `directory`, or None if it has none."""
+    for filename in (FILENAME_IMAGE, FILENAME_SPARSE, FILENAME):
+        path = os.path.join(directory, f"{filename}{FTL_SUFFIX}")
+        if os.path.exists(path):
+            return saved_stats(path)
+    return None
+
+
 class SSD:
 
     def __init__(
             self,
             file_manager: FileManager = FileManager(),
             buffer_manager: BufferManager = BufferManager(),
+            write_output_file: bool = True,
     ) -> None:
         self.file_manager = file_manager
         self.buffer_manager = buffer_manager
+        self.write_output_file = write_output_file
+        self.output: str = ""
+
+    def _write_output(self, contents: str) -> None:
+        """Keep the latest result and mirror it to ssd_output.txt unless disabled."""
+        self.output = contents
+        if self.write_output_file:
+            self.file_manager.write_output(contents)
 
     def read(self, lba: int) -> None:
         read_value = self.file_manager.read_nand(lba)
         if read_value == "":
-            self.file_manager.write_output("ERROR")
+            self._write_output("ERROR")
         else:
-            self.file_manager.write_output(read_value)
+            self._write_output(read_value)
 
     def write(self, lba: int, data: str) -> None:
         if not self.file_manager.write_nand(lba, data):
-            self.file_manager.write_output("ERROR")
-        self.file_manager.write_output("")
+            self._write_output("ERROR")
+        self._write_output("")
+
+    def write_range(self, start: int, end: int, pattern: str) -> None:
+        """Fill [start, end) with a value, or repeat a comma separated pattern of values."""
+        if not self.file_manager.fill_nand_range(start, end, pattern.split(",")):
+            self._write_output("ERROR")
+            return
+        self._write_output("")
 
     def erase(self, lba: int, size: int) -> None:
         if not self.file_manager.erase_nand(lba, size):
-            self.file_manager.write_output("ERROR")
-        self.file_manager.write_output("")
+            self._write_output("ERROR")
+        self._write_output("")
 
+    @traced
     def flush(self, buffers: list[Buffer]) -> None:
-        for buffer in buffers:
-            if buffer.command == "W":
-                self.write(buffer.lba, buffer.data)
-            elif buffer.command == "E":
-                self.erase(buffer.lba, buffer.range)
-            else:
-                self.file_manager.write_output("ERROR")
-                print("Invalid command")
-                break
+        """Apply every pending command to one loaded copy of the NAND and persist it once.
+
+        The F record logged first lets a crash during the flush be finished on restart;
+        emptying the buffer afterwards is the checkpoint.
+        """
+        if buffers:
+            self.buffer_manager.begin_flush()
+        with self.file_manager.deferred():
+            for buffer in buffers:
+                if buffer.command == "W":
+                    applied = self.file_manager.write_nand(buffer.lba, buffer.data)
+                elif buffer.command == "E":
+                    applied = self.file_manager.erase_nand(buffer.lba, buffer.range)
+                else:
+                    self._write_output("ERROR")
+                    print("Invalid command", file=sys.stderr)
+                    break
+                if not applied:
+                    self._write_output("ERROR")
         self.buffer_manager.set_buffer([])
 
-    def run(self, args) -> None:
+    @traced
+    def run(self, args) -> str:
+        """Run one command. Written values are stored in canonical form, so all backends read them back alike."""
+        self.output = ""
         if not self._validate_command(args):
-            return
+            return self.output
 
         mode = args[1]
         kwargs: dict[str, Any] = {"mode": mode}
         if mode == "R":
             kwargs.update({"lba": int(args[2])})
         elif mode == "W":
-            kwargs.update({"lba": int(args[2]), "data": args[3]})
+            kwargs.update({"lba": int(args[2]), "data": canonical_value(args[3])})
         elif mode == "E":
             kwargs.update({"lba": int(args[2]), "erase_size": utils.parse_integer(args[3])})
+        elif mode == "RR":
+            kwargs.update({"lba": int(args[2]), "end": int(args[3])})
+        elif mode == "RW":
+            pattern = ",".join(canonical_value(value) for value in args[4].split(","))
+            kwargs.update({"lba": int(args[2]), "end": int(args[3]), "data": pattern})
         else:
             pass
 
         self._execute_command(**kwargs)
+        return self.output
+
+    def run_batch(self, lines: Iterable[str]) -> Iterator[str]:
+        """Run one command per line ("W 3 0x00000001"), yielding one result per command.
 
+        Buffer and NAND state are loaded once and persisted at each F and at the end.
+        """
+        with self.file_manager.deferred(), self.buffer_manager.deferred():
+            for line in lines:
+                args = line.split()
+                if not args:
+                    continue
+                output = self.run([FILENAME_MAIN_SSD] + args)
+                if args[0] == "F":
+                    self.file_manager.commit()
+                    self.buffer_manager.commit()
+                yield output
+
+    @traced
     def _validate_command(self, args):
 
         def check_error(msg: str) -> None:
-            print(msg)
-            self.file_manager.write_output("ERROR")
+            print(msg, file=sys.stderr)
+            self._write_output("ERROR")
 
         length = len(args)
         if length < 2:
@@ -141,7 +669,7 @@ class SSD:
             return False
 
         mode = args[1]
-        valid_modes = {"W", "R", "E", "F"}
+        valid_modes = {"W", "R", "E", "F", "RR", "RW", "I"}
         if mode not in valid_modes:
             check_error(f"Invalid mode not in {valid_modes}")
             return False
@@ -151,18 +679,32 @@ class SSD:
             "R": (3, "Mode R need lba"),
             "E": (4, "Mode E need lba and size"),
             "F": (2, "Mode F need only command"),
+            "I": (2, "Mode I need only command"),
+            "RR": (4, "Mode RR need start and end lba"),
+            "RW": (5, "Mode RW need start and end lba and value"),
         }
         expected_len, error_msg = expected_args[mode]
         if length != expected_len:
             check_error(error_msg)
             return False
 
-        if mode == "F":
+        if mode in ("F", "I"):
+            return True
+
+        capacity = self.file_manager.capacity
+        if mode in ("RR", "RW"):
+            start, end = utils.parse_integer(args[2]), utils.parse_integer(args[3])
+            if not utils.validate_range_args(start, end, capacity):
+                check_error(f"The range should satisfy 0 <= start < end <= {capacity}")
+                return False
+            if mode == "RW" and not all(utils.validate_hexadecimal(value) for value in args[4].split(",")):
+                check_error("Value should to be hex string or comma separated hex strings")
+                return False
             return True
 
         lba = utils.parse_integer(args[2])
-        if lba == "" or not utils.validate_index(args[2], valid_size=SIZE_LBA):
-            check_error("The index should be an integer among 0 ~ 99")
+        if lba == "" or not utils.validate_index(args[2], valid_size=capacity):
+            check_error(f"The index should be an integer among 0 ~ {capacity - 1}")
             return False
 
         if mode == "W" and not utils.validate_hexadecimal(args[3]):
@@ -171,182 +713,134 @@ class SSD:
 
         if mode == "E":
             size = utils.parse_integer(args[3])
-            if size == "" or size < 1 or size > 10 or lba + size > SIZE_LBA:
-                check_error("Size should be integer among 1 ~ 10 and lba + size must be smaller than 101")
+            if size == "" or size < 1 or lba + size > capacity:
+                check_error(f"Size should be a positive integer and lba + size must be smaller than {capacity + 1}")
                 return False
 
         return True
 
-    def _execute_command(self, mode, lba=None, data='', erase_size=0):
-        buffers = self.buffer_manager.get_buffer()
+    @traced
+    def _execute_command(self, mode, lba=None, data='', erase_size=0, end=None):
+        if mode == "I":
+            self._write_output(str(self.file_manager.capacity))
+            return
+
+        self.buffer_manager.refresh()
 
-        if len(buffers) == 5 or mode == "F":
-            self.flush(buffers)
-            buffers = self.buffer_manager.get_buffer()
+        if mode in ("F", "RW") or self.buffer_manager.flush_pending:
+            self.flush(self.buffer_manager.get_buffer())
 
         if mode == "F":
-            self.file_manager.write_output("")
+            self._write_output("")
+            return
+
+        if mode == "RW":
+            self.write_range(lba, end, data)
             return
 
         if mode == "R":
-            self._process_read(buffers, lba)
+            self._process_read(lba)
+            return
+
+        if mode == "RR":
+            self._process_read_range(lba, end)
             return
 
-        new_buffer = Buffer(mode, lba, data, erase_size)
         if mode == "W":
-            new_buffers = self._process_write(buffers, lba, new_buffer)
+            self.buffer_manager.write(lba, data)
         elif mode == "E":
-            new_buffers = self._process_erase(buffers, erase_size, lba, new_buffer)
+            self.buffer_manager.erase(lba, erase_size)
         else:
             return
 
-        new_buffers = self.buffer_manager.merge_overall(new_buffers)
-        self.buffer_manager.set_buffer(new_buffers)
-        self.file_manager.write_output("")
-
-    def _process_read(self, buffers: list[Buffer], lba: int) -> None:
-        """Conditionally read from the first buffer."""
-        from_first_buffer: bool = False
-        for _, buffer in reversed(list(enumerate(buffers))):
-            if buffer.command == "W" and buffer.lba == lba:
-                self.file_manager.write_output(buffer.data)
-                from_first_buffer = True
-                break
-
-            if buffer.command == "E" and buffer.lba <= lba < buffer.lba + buffer.range:
-                self.file_manager.write_output("0x00000000")
-                from_first_buffer = True
-                break
-
-        if not from_first_buffer:
-            self.read(lba)
-
-    def _process_write(self, buffers: list[Buffer], lba: int, new_buffer: Buffer) -> list[Buffer]:
-
-        def _handle_write(buffers, each_buffer, i, is_need_to_append, lba, new_buffer, new_buffers):
-            if each_buffer.lba != lba:
-                new_buffers.append(each_buffer)
-            else:
-                is_need_to_append, new_buffers = self.buffer_manager.update(buffers, i, new_buffer, new_buffers)
-            return is_need_to_append, new_buffers
-
-        def _handle_erase(buffers, each_buffer, i, is_need_to_append, lba, new_buffer, new_buffers):
-            if each_buffer.lba == lba:
-                if each_buffer.range == 1:
-                    is_need_to_append, new_buffers = self.buffer_manager.update(buffers, i, new_buffer, new_buffers)
-                if is_need_to_append:
-                    each_buffer.lba += 1
-                    each_buffer.range -= 1
-            elif (each_buffer.lba + each_buffer.range - 1) == lba:
-                each_buffer.range -= 1
-            if is_need_to_append:
-                new_buffers.append(each_buffer)
-            return is_need_to_append, new_buffers
-
-        new_buffers = []
-        is_need_to_append = True
-        for i, buffer in enumerate(buffers):
-            if buffer.command == "W":
-                is_need_to_append, new_buffers = _handle_write(
-                    buffers,
-                    buffer,
-                    i,
-                    is_need_to_append,
-                    lba,
-                    new_buffer,
-                    new_buffers,
-                )
-            elif buffer.command == "E":
-                is_need_to_append, new_buffers = _handle_erase(
-                    buffers,
-                    buffer,
-                    i,
-                    is_need_to_append,
-                    lba,
-                    new_buffer,
-                    new_buffers,
-                )
-            if is_need_to_append == False:
-                break
-
-        if is_need_to_append:
-            new_buffers.append(new_buffer)
-
-        return new_buffers
-
-    def _process_erase(self, buffers: list[Buffer], erase_size: int, lba: int, new_buffer: Buffer) -> list[Buffer]:
-
-        def _is_erase_range_same(each_buffer, erase_size, lba):
-            return each_buffer.lba == lba and each_buffer.lba + each_buffer.range == lba + erase_size
-
-        def _is_erase_range_overlap(each_buffer, erase_size, lba):
-            return ((each_buffer.lba <= lba <= each_buffer.lba + each_buffer.range) or
-                    (lba <= each_buffer.lba < lba + erase_size))
-
-        def _check_merge_range_is_bigger_than_10(each_buffer, erase_size, lba):
-            min_lba = min(lba, each_buffer.lba)
-            max_range = lba + erase_size
-            if max_range < each_buffer.lba + each_buffer.range:
-                max_range = each_buffer.lba + each_buffer.range
-            if max_range - min_lba > 10:
-                return True
-            else:
-                return False
-
-        def _continue_to_check_overlap(each_buffer, erase_size, lba, new_buffers):
-            if _check_merge_range_is_bigger_than_10(each_buffer, erase_size, lba):
-                new_buffers.append(each_buffer)
-                return True
-            if each_buffer.lba <= lba:
-                # b.lba + b.range > 100 또는 lba + erase_size > 100  넘는 경우에도 추가하면 안돼!
-                if lba + erase_size > SIZE_LBA or each_buffer.lba + each_buffer.range > SIZE_LBA:
-                    new_buffers.append(each_buffer)
-                    return True
-            else:
-                # lba + range  > 100 or b.lba + b.range > 100 넘는 경우에도 추가하면 안돼
-                if lba + erase_size > SIZE_LBA or each_buffer.lba + each_buffer.range > SIZE_LBA:
-                    new_buffers.append(each_buffer)
-                    return True
-            return False
-
-        new_buffers = []
-        is_need_to_append = True
-        for i, buffer in enumerate(buffers):
-            if buffer.command == "W" and (lba > buffer.lba or buffer.lba >= lba + erase_size):
-                new_buffers.append(buffer)
-
-            elif buffer.command == "E" and _is_erase_range_same(buffer, erase_size, lba):
-                is_need_to_append, new_buffers = self.buffer_manager.update(buffers, i, new_buffer, new_buffers)
-                break
-
-            elif buffer.command == "E" and _is_erase_range_overlap(buffer, erase_size, lba):
-                if _continue_to_check_overlap(buffer, erase_size, lba, new_buffers):
-                    continue
-
-                if buffer.lba <= lba:
-                    if buffer.lba + buffer.range > lba + erase_size:
-                        new_buffers += buffers[i:]
-                        is_need_to_append = False
-                        break
-
-                    buffer.range = lba + erase_size - buffer.lba
-                    is_need_to_append, new_buffers = self.buffer_manager.update(buffers, i, buffer, new_buffers)
-                    break
-
-                new_range = buffer.lba + buffer.range - lba
-                if new_range > erase_size:
-                    new_buffer.range = new_range
-            elif buffer.command == "E":
-                new_buffers.append(buffer)
-
-        if is_need_to_append:
-            new_buffers.append(new_buffer)
-        return new_buffers
-
+        if self.buffer_manager.is_overflowing():
+            self.flush(self.buffer_manager.get_buffer())
+        self._write_output("")
 
+    def _process_read(self, lba: int) -> None:
+        """Conditionally read from the buffer."""
+        buffered_value = self.buffer_manager.lookup(lba)
+        if buffered_value is None:
+            self.read(lba)
+        else:
+            self._write_output(buffered_value)
+
+    def _process_read_range(self, start: int, end: int) -> None:
+        """Read [start, end) from the NAND once and overlay the pending buffer values."""
+        joined = self.file_manager.read_nand_joined(start, end, *self.buffer_manager.overlay(start, end))
+        self._write_output(joined or "ERROR")
+
+
+def format_device(capacity: int, backend: str = "image", directory: str = "") -> None:
+    """Create an empty `capacity`-LBA binary image or sparse NAND and drop any pending commands.
+
+    The other formatted backend is removed so create_file_manager() picks the new one.
+    """
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    image_path = os.path.join(directory, FILENAME_IMAGE)
+    sparse_path = os.path.join(directory, FILENAME_SPARSE)
+    for sidecar in (f"{image_path}{TRIM_SUFFIX}", f"{image_path}{FTL_SUFFIX}", f"{sparse_path}{FTL_SUFFIX}"):
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+    if backend == "sparse":
+        if os.path.exists(image_path):
+            os.remove(image_path)
+        SparseNand.create(sparse_path, capacity)
+    else:
+        if os.path.exists(sparse_path):
+            os.remove(sparse_path)
+        NandImage.create(image_path, capacity).close()
+    BufferManager(os.path.join(directory, BUFFER_JOURNAL)).set_buffer([])
+
+
+@traced
 def main() -> None:
-    file_manager = FileManager()
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "--format":
+        capacity = utils.parse_integer(sys.argv[2])
+        backend = sys.argv[3] if len(sys.argv) == 4 else "image"
+        if capacity == "" or capacity < 1 or backend not in ("image", "sparse"):
+            print("usage: ssd.py --format <capacity> [image|sparse]", file=sys.stderr)
+            sys.exit(1)
+        format_device(capacity, backend)
+        return
+
+    if len(sys.argv) == 2 and sys.argv[1] == "--ftl-stats":
+        stats = ftl_stats()
+        if stats is None:
+            print(f"no FTL state; run the device with {FTL_ENV} set", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(stats, indent=2))
+        return
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "--serve":
+        from ssd_server import serve
+        serve(*sys.argv[2:3])
+        return
+
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "--serve-devices":
+        from ssd_server import serve_devices
+        serve_devices(*sys.argv[2:4])
+        return
+
+    file_manager = create_file_manager()
     buffer_manager = BufferManager()
+    if len(sys.argv) == 3 and sys.argv[1] == "B":
+        ssd = SSD(
+            file_manager=file_manager,
+            buffer_manager=buffer_manager,
+            write_output_file=False,
+        )
+        try:
+            source = sys.stdin if sys.argv[2] == "-" else open(sys.argv[2], "r")
+        except OSError as e:
+            print(f"ssd.py B: cannot read {sys.argv[2]}: {e.strerror}", file=sys.stderr)
+            sys.exit(1)
+        with source:
+            for output in ssd.run_batch(source):
+                print(output)
+        return
+
     ssd = SSD(
         file_manager=file_manager,
         buffer_manager=buffer_manager,
@@ -0,0 +1,112 @@
+import os
+import socketserver
+import sys
+import threading
+from typing import Optional
+
+from buffer_manager import BUFFER_JOURNAL, BufferManager
+from constant import FILENAME_MAIN_SSD, MESSAGE_ERROR, SOCKET_PATH
+from read_cache import create_read_cache
+from ssd import SSD, create_file_manager
+
+
+class SSDRequestHandler(socketserver.StreamRequestHandler):
+    """One request per line ("W 3 0x00000001"), one response line per request."""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            args = line.decode().split()
+            if not args:
+                continue
+            output = self.server.execute(args)
+            self.wfile.write(f"{output}\n".encode())
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str) -> None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, SSDRequestHandler)
+        self.socket_path = socket_path
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class SSDServer(_UnixServer):
+
+    def __init__(self, socket_path: str = SOCKET_PATH, ssd: Optional[SSD] = None) -> None:
+        super().__init__(socket_path)
+        self.ssd = ssd or SSD(
+            file_manager=create_file_manager(read_cache=create_read_cache()),
+            buffer_manager=BufferManager(),
+            write_output_file=False,
+        )
+        self._lock = threading.Lock()
+
+    def execute(self, args: list[str]) -> str:
+        with self._lock:
+            return self.ssd.run([FILENAME_MAIN_SSD] + args)
+
+
+class MultiDeviceServer(_UnixServer):
+    """Serves every device directory under `root`, routing by the first word of a request.
+
+    "d3 W 3 0x00000001" runs "W 3 0x00000001" on the device in <root>/d3, which holds its own
+    NAND and buffer journal. Each connection's commands run on its own handler thread: one
+    at a time per device, concurrently across devices.
+    """
+
+    def __init__(self, root: str, socket_path: str = SOCKET_PATH) -> None:
+        super().__init__(socket_path)
+        self.root = root
+        self.devices: dict[str, SSD] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        os.makedirs(root, exist_ok=True)
+        for name in sorted(os.listdir(root)):
+            if os.path.isdir(os.path.join(root, name)):
+                self.mount(name)
+
+    def mount(self, name: str) -> SSD:
+        """Open the device in <root>/<name>, creating an empty text NAND device if it is new."""
+        if not name or os.sep in name or name in (os.curdir, os.pardir):
+            raise ValueError(f"invalid device name: {name!r}")
+        directory = os.path.join(self.root, name)
+        os.makedirs(directory, exist_ok=True)
+        self.devices[name] = SSD(
+            file_manager=create_file_manager(directory, read_cache=create_read_cache()),
+            buffer_manager=BufferManager(os.path.join(directory, BUFFER_JOURNAL)),
+            write_output_file=False,
+        )
+        self._locks[name] = threading.Lock()
+        return self.devices[name]
+
+    def execute(self, args: list[str]) -> str:
+        if len(args) < 2 or args[0] not in self.devices:
+            return MESSAGE_ERROR
+        with self._locks[args[0]]:
+            return self.devices[args[0]].run([FILENAME_MAIN_SSD] + args[1:])
+
+
+def serve(socket_path: str = SOCKET_PATH) -> None:
+    with SSDServer(socket_path) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def serve_devices(root: str, socket_path: str = SOCKET_PATH) -> None:
+    with MultiDeviceServer(root, socket_path) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    serve(*sys.argv[1:2])
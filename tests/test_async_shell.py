@@ -0,0 +1,134 @@
+import asyncio
+import threading
+
+import pytest
+
+from async_shell import AsyncCommandExecutor, AsyncScriptExecutor, AsyncShell, AsyncSSDController
+from commands import AsyncInProcessExecutor, AsyncSocketExecutor
+from constant import MESSAGE_DONE, MESSAGE_ERROR, MESSAGE_PASS
+from ssd_server import SSDServer
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = SSDServer(str(tmp_path / "ssd.sock"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_logging(monkeypatch):
+    for cls in (AsyncCommandExecutor, AsyncScriptExecutor, AsyncShell):
+        monkeypatch.setattr(cls, "logging", lambda *args: None)
+
+
+class RecordingExecutor:
+    """Completes writes slowly and records when each command starts and ends."""
+
+    def __init__(self):
+        self.events = []
+
+    async def run(self, args):
+        self.events.append(("start", " ".join(args[1:])))
+        await asyncio.sleep(0.05 if args[1] == "W" else 0)
+        self.events.append(("end", " ".join(args[1:])))
+        return "" if args[1] == "W" else "0x00000001"
+
+    async def close(self):
+        pass
+
+
+def test_overlapping_commands_keep_submission_order():
+    async def scenario():
+        executor = RecordingExecutor()
+        controller = AsyncSSDController(executor)
+        results = await asyncio.gather(
+            controller.write(1, "0x00000001"),
+            controller.read(1),
+            controller.read(2),
+        )
+        return results, executor.events
+
+    results, events = asyncio.run(scenario())
+    assert results == [MESSAGE_DONE, "0x00000001", "0x00000001"]
+    assert events.index(("end", "W 1 0x00000001")) < events.index(("start", "R 1"))
+    assert events.index(("end", "R 2")) < events.index(("end", "W 1 0x00000001"))
+
+
+def test_flush_waits_for_everything_in_flight():
+    async def scenario():
+        executor = RecordingExecutor()
+        controller = AsyncSSDController(executor)
+        await asyncio.gather(controller.write(1, "0x00000001"), controller.write(50, "0x00000001"),
+                             controller.flush())
+        return executor.events
+
+    events = asyncio.run(scenario())
+    assert events[-2:] == [("start", "F"), ("end", "F")]
+
+
+def test_erase_range_is_one_command():
+    class EraseExecutor(RecordingExecutor):
+        async def run(self, args):
+            self.events.append(" ".join(map(str, args[1:])))
+            return "100" if args[1] == "I" else ""
+
+    executor = EraseExecutor()
+    command_executor = AsyncCommandExecutor(AsyncSSDController(executor))
+    assert asyncio.run(command_executor.erase_range(0, 99)) == "[Erase Range] Done"
+    assert executor.events == ["I", "E 0 100"]
+
+
+def test_pipelined_socket_commands(server):
+    async def scenario():
+        controller = AsyncSSDController(AsyncSocketExecutor(server.socket_path, connections=2))
+        try:
+            writes = [controller.write(lba, f"0x{lba:08X}") for lba in range(20)]
+            reads = [controller.read(lba) for lba in range(20)]
+            return await asyncio.gather(*writes, *reads)
+        finally:
+            await controller.close()
+
+    results = asyncio.run(scenario())
+    assert results[:20] == [MESSAGE_DONE] * 20
+    assert results[20:] == [f"0x{lba:08X}" for lba in range(20)]
+
+
+def test_socket_executor_without_daemon_reports_error(tmp_path):
+    async def scenario():
+        controller = AsyncSSDController(AsyncSocketExecutor(str(tmp_path / "missing.sock")))
+        return await controller.read(0)
+
+    assert asyncio.run(scenario()) == MESSAGE_ERROR
+
+
+def test_shell_lines_run_as_one_pipeline(server):
+    async def scenario():
+        controller = AsyncSSDController(AsyncSocketExecutor(server.socket_path))
+        try:
+            return await AsyncShell(controller).run_lines(
+                ["write 3 0x00000003", "erase 3 1", "read 3", "write 4 0x00000004", "read 4", "flush", "exit", "read 4"]
+            )
+        finally:
+            await controller.close()
+
+    assert asyncio.run(scenario()) == [
+        "[Write] Done", "[Erase] Done", "[Read] LBA 03 : 0x00000000",
+        "[Write] Done", "[Read] LBA 04 : 0x00000004", "[Flush] Done",
+    ]
+
+
+@pytest.mark.parametrize("script", ["script_1", "script_2", "script_4"])
+def test_scripts_pass_in_process(tmp_path, monkeypatch, script):
+    monkeypatch.chdir(tmp_path)
+
+    async def scenario():
+        controller = AsyncSSDController(AsyncInProcessExecutor())
+        shell = AsyncShell(controller)
+        return await getattr(shell.script_executor, script)(num_iter=2)
+
+    assert asyncio.run(scenario()) == MESSAGE_PASS
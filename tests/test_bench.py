@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from bench.suite import run_workload
+
+
+@pytest.mark.parametrize("storage", ["text", "image", "sparse"])
+def test_run_workload_reports_latency_per_command(storage, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = run_workload(storage, "inprocess", "mixed", ops=50, seed=1, mix=(2, 1, 1))
+
+    assert result["ok"]
+    assert result["commands"] == 50
+    assert set(result["latency"]) == {"R", "W", "E"}
+    assert sum(stats["count"] for stats in result["latency"].values()) == 50
+    assert all(stats["p50_us"] <= stats["p99_us"] for stats in result["latency"].values())
+
+
+def test_run_workload_runs_shell_scripts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = run_workload("image", "inprocess", "script_1", ops=0, seed=1)
+    assert result["ok"]
+    assert result["latency"]["W"]["count"] == 100
+
+
+def test_run_workload_reports_ftl_statistics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = run_workload("image", "inprocess", "random_write", ops=500, seed=1, ftl="greedy", buffer_depth=1)
+    assert result["ok"]
+    assert result["ftl"]["policy"] == "greedy"
+    assert result["ftl"]["host_writes"] > 0
+    assert result["ftl"]["write_amplification"] >= 1.0
+    assert "SSD_FTL" not in os.environ
+    assert run_workload("image", "inprocess", "random_write", ops=10, seed=1)["ftl"] is None
+
+
+def test_read_latency_restores_directory_and_caps_fullness(tmp_path, monkeypatch):
+    from bench import read_latency
+    from constant import SIZE_LBA
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SSD_BUFFER_DEPTH", str(SIZE_LBA + 5))
+    monkeypatch.setattr("sys.argv", ["read_latency", "--reads", "2"])
+    read_latency.main()
+    assert os.getcwd() == str(tmp_path)
+    with pytest.raises(ValueError):
+        read_latency.measure(SIZE_LBA, 1)
@@ -1,4 +1,11 @@
-from buffer_manager import Buffer, BufferManager
+import pytest
+
+from buffer_manager import BUFFER_DEPTH_ENV, JOURNAL_COMPACT_RECORDS, Buffer, BufferManager
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return tmp_path / "buffer.journal"
 
 
 def test_buffer_manager_1():
@@ -54,3 +61,137 @@ def test_buffer_erase():
     expected = "2_E_10_4"
     result = str(buffer)
     assert result == expected
+
+
+def test_buffer_journal_appends_one_record_per_command(journal):
+    bm = BufferManager(str(journal))
+    bm.write(1, "0x00000001")
+    bm.erase(3, 2)
+    assert len(journal.read_bytes().splitlines()) == 2
+
+    buffers = BufferManager(str(journal)).get_buffer()
+    assert [(b.command, b.lba, b.data, b.range) for b in buffers] == [("E", 3, "", 2), ("W", 1, "0x00000001", 0)]
+
+
+def test_buffer_picks_up_records_from_another_manager(journal):
+    reader = BufferManager(str(journal))
+    writer = BufferManager(str(journal))
+    writer.write(4, "0x00000004")
+    assert reader.lookup(4) is None
+
+    reader.refresh()
+    assert reader.lookup(4) == "0x00000004"
+
+
+def test_buffer_journal_ignores_torn_tail(journal):
+    bm = BufferManager(str(journal))
+    bm.write(7, "0x00000007")
+    with open(journal, "ab") as f:
+        f.write(b"deadbeef\tW:8:0x000")
+
+    bm = BufferManager(str(journal))
+    assert [b.lba for b in bm.get_buffer()] == [7]
+    bm.write(9, "0x00000009")
+    assert [b.lba for b in BufferManager(str(journal)).get_buffer()] == [7, 9]
+
+
+def test_buffer_journal_compacts_on_flush_and_when_long(journal):
+    bm = BufferManager(str(journal))
+    for i in range(JOURNAL_COMPACT_RECORDS + 1):
+        bm.write(1, f"0x{i:08d}")
+    assert len(journal.read_bytes().splitlines()) == 1
+    assert BufferManager(str(journal)).lookup(1) == f"0x{JOURNAL_COMPACT_RECORDS:08d}"
+
+    bm.set_buffer([])
+    assert journal.read_bytes() == b""
+    assert BufferManager(str(journal)).get_buffer() == []
+
+
+def test_buffer_flush_record_survives_compaction(journal):
+    bm = BufferManager(str(journal))
+    bm.write(2, "0x00000002")
+    bm.begin_flush()
+    assert BufferManager(str(journal)).flush_pending
+
+    bm._compact()
+    assert BufferManager(str(journal)).flush_pending
+    bm.set_buffer([])
+    assert not BufferManager(str(journal)).flush_pending
+
+
+def test_buffer_depth_is_configurable(journal, monkeypatch):
+    bm = BufferManager(str(journal), depth=1000)
+    for lba in range(999):
+        bm.write(lba, "0x00000001")
+    assert not bm.is_full()
+    bm.write(999, "0x00000001")
+    assert bm.is_full()
+
+    monkeypatch.setenv(BUFFER_DEPTH_ENV, "64")
+    assert BufferManager(str(journal)).depth == 64
+
+
+def test_write_inside_erase_keeps_one_extent(journal):
+    bm = BufferManager(str(journal))
+    bm.erase(10, 5)
+    bm.write(12, "0x00000012")
+    assert len(bm) == 2
+    assert [bm.lookup(lba) for lba in (11, 12, 13)] == ["0x00000000", "0x00000012", "0x00000000"]
+
+
+def test_erase_drops_covered_writes_and_merges_neighbors(journal):
+    bm = BufferManager(str(journal))
+    bm.write(21, "0x00000021")
+    bm.erase(16, 4)
+    bm.erase(20, 3)
+    assert [(b.command, b.lba, b.range) for b in bm.get_buffer()] == [("E", 16, 7)]
+    assert bm.lookup(21) == "0x00000000"
+    assert bm.lookup(23) is None
+
+
+def test_erases_merge_into_one_extent_of_any_length(journal):
+    bm = BufferManager(str(journal))
+    bm.erase(0, 10)
+    bm.erase(10, 10)
+    bm.erase(30, 5)
+    bm.erase(18, 15)
+    assert [(b.command, b.lba, b.range) for b in bm.get_buffer()] == [("E", 0, 35)]
+    assert [(b.command, b.lba, b.range) for b in BufferManager(str(journal)).get_buffer()] == [("E", 0, 35)]
+
+
+def test_write_covering_erase_removes_it(journal):
+    bm = BufferManager(str(journal))
+    bm.erase(30, 3)
+    for lba in (31, 30, 32):
+        bm.write(lba, "0x00000030")
+    assert [b.command for b in bm.get_buffer()] == ["W", "W", "W"]
+
+
+def test_lookup_counts_hits_and_misses(journal):
+    bm = BufferManager(str(journal))
+    bm.write(5, "0x00000005")
+    bm.erase(10, 2)
+
+    assert bm.lookup(5) == "0x00000005"
+    assert bm.lookup(11) == "0x00000000"
+    assert bm.lookup(12) is None
+    assert (bm.read_hits, bm.read_misses) == (2, 1)
+    assert bm.hit_rate == 2 / 3
+
+    bm.set_buffer([])
+    assert bm.lookup(5) is None
+
+
+def test_huge_erase_is_one_extent_without_per_lba_state(journal):
+    bm = BufferManager(str(journal))
+    bm.erase(0, 10_000_000)
+    bm.write(5, "0x00000005")
+
+    assert bm.lookup(4) == "0x00000000"
+    assert bm.lookup(5) == "0x00000005"
+    assert bm.lookup(10_000_000) is None
+    assert bm.overlay(3, 7) == ([(3, 7)], {5: "0x00000005"})
+    assert (bm.read_hits, bm.read_misses) == (6, 1)
+
+    reloaded = BufferManager(str(journal))
+    assert [(b.command, b.lba, b.range) for b in reloaded.get_buffer()] == [("E", 0, 10_000_000), ("W", 5, 0)]
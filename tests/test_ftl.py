@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+from buffer_manager import BufferManager
+from ftl import BLOCK_ERASE_US, PAGE_PROGRAM_US, PAGE_READ_US, UNMAPPED, FlashTranslationLayer
+from ssd import SSD, FTLFileManager, create_file_manager, format_device, ftl_stats
+
+
+def assert_consistent(ftl):
+    mapped = [ppa for ppa in ftl.l2p if ppa != UNMAPPED]
+    assert len(set(mapped)) == len(mapped)
+    assert all(ftl.p2l[ppa] == lba for lba, ppa in enumerate(ftl.l2p) if ppa != UNMAPPED)
+    for block in range(ftl.num_blocks):
+        pages = ftl.p2l[block * ftl.pages_per_block:(block + 1) * ftl.pages_per_block]
+        assert ftl.valid[block] == sum(lba != UNMAPPED for lba in pages)
+
+
+def test_sequential_overwrites_need_no_relocation():
+    ftl = FlashTranslationLayer(100)
+    for _ in range(10):
+        ftl.write(0, 100)
+
+    assert ftl.host_writes == ftl.nand_writes == 1000
+    assert ftl.write_amplification == 1.0
+    assert ftl.gc_runs > 0 and ftl.gc_relocations == 0
+    assert ftl.gc_stall_us == ftl.gc_runs * BLOCK_ERASE_US
+    assert_consistent(ftl)
+
+
+@pytest.mark.parametrize("policy", ["greedy", "cost_benefit"])
+def test_random_overwrites_amplify_writes(policy):
+    ftl = FlashTranslationLayer(100, policy)
+    ftl.write(0, 100)
+    rng = random.Random(0)
+    for _ in range(2000):
+        lba = rng.randrange(100)
+        ftl.write(lba, lba + 1)
+
+    stats = ftl.stats()
+    assert stats["write_amplification"] > 1.0
+    assert stats["nand_writes"] == stats["host_writes"] + stats["gc_relocations"]
+    assert stats["gc_stall_us"] == (
+        stats["gc_relocations"] * (PAGE_READ_US + PAGE_PROGRAM_US) + stats["gc_runs"] * BLOCK_ERASE_US
+    )
+    assert sum(stats["erase_counts"]) == stats["gc_runs"]
+    assert_consistent(ftl)
+
+
+def test_trimmed_pages_are_not_relocated():
+    ftl = FlashTranslationLayer(100)
+    ftl.write(0, 100)
+    ftl.trim(0, 100)
+    assert all(ppa == UNMAPPED for ppa in ftl.l2p)
+
+    rng = random.Random(0)
+    for _ in range(500):
+        lba = rng.randrange(10)
+        ftl.write(lba, lba + 1)
+    # Only ten LBAs are live, so every victim is nearly empty.
+    assert ftl.gc_relocations < ftl.gc_runs * ftl.pages_per_block // 2
+    assert_consistent(ftl)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "ssd_nand.txt.ftl")
+    ftl = FlashTranslationLayer(100, "cost_benefit")
+    rng = random.Random(0)
+    for _ in range(500):
+        lba = rng.randrange(100)
+        ftl.write(lba, lba + 1)
+    ftl.save(path)
+
+    loaded = FlashTranslationLayer.load(path, 100, "cost_benefit")
+    assert loaded.stats() == ftl.stats()
+    assert (loaded.l2p, loaded.p2l, loaded.valid) == (ftl.l2p, ftl.p2l, ftl.valid)
+    assert FlashTranslationLayer.load(path, 200, "greedy").host_writes == 0
+
+
+def test_unknown_policy_is_rejected(monkeypatch):
+    with pytest.raises(ValueError):
+        FlashTranslationLayer(100, "fifo")
+    monkeypatch.setenv("SSD_FTL", "fifo")
+    with pytest.raises(ValueError):
+        create_file_manager()
+
+
+@pytest.mark.parametrize("backend", ["text", "image", "sparse"])
+def test_ssd_writes_and_erases_reach_the_ftl(backend, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SSD_FTL", "greedy")
+    if backend != "text":
+        format_device(100, backend)
+    file_manager = create_file_manager()
+    assert isinstance(file_manager, FTLFileManager)
+
+    ssd = SSD(file_manager=file_manager, buffer_manager=BufferManager(), write_output_file=False)
+    assert ssd.run(["ssd.py", "RW", "0", "100", "0x00000001"]) == ""
+    assert ssd.run(["ssd.py", "W", "3", "0x00000002"]) == ""
+    assert ssd.run(["ssd.py", "E", "10", "5"]) == ""
+    assert ssd.run(["ssd.py", "F"]) == ""
+    assert ssd.run(["ssd.py", "R", "3"]) == "0x00000002"
+    assert ssd.run(["ssd.py", "R", "12"]) == "0x00000000"
+    assert ssd.run(["ssd.py", "W", "200", "0x00000002"]) == "ERROR"
+
+    stats = ftl_stats()
+    assert stats["host_writes"] == 101
+    assert sum(ppa != UNMAPPED for ppa in file_manager.ftl.l2p) == 95
+
+    # A new process picks the saved FTL up again.
+    assert create_file_manager().ftl.stats() == stats
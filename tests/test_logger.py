@@ -1,3 +1,9 @@
+import os
+import subprocess
+import sys
+import zipfile
+from datetime import timedelta
+
 import pytest
 from unittest.mock import patch, mock_open
 from logger import Logger
@@ -55,3 +61,135 @@ def test_rollover_not_triggered_below_max_size(logger):
             patch("os.rename") as mock_rename:
         logger._rollover_if_needed()
         mock_rename.assert_not_called()
+
+
+@pytest.fixture
+def fresh_logger(tmp_path, monkeypatch):
+    monkeypatch.setattr(Logger, "_instance", None)
+    return Logger(log_dir=str(tmp_path))
+
+
+@pytest.fixture
+def async_logger(fresh_logger):
+    async_logger = fresh_logger
+    async_logger.enable_async()
+    yield async_logger
+    async_logger.disable_async()
+
+
+def test_async_print_writes_lines_in_order(async_logger):
+    for i in range(100):
+        async_logger.print(f"line {i}", "Shell.run")
+    async_logger.flush()
+
+    with open(async_logger.latest_log) as f:
+        lines = f.readlines()
+    assert [line.split(": ", 1)[1] for line in lines] == [f"line {i}\n" for i in range(100)]
+
+
+def test_async_print_does_not_stat_log(async_logger):
+    with patch("os.path.getsize") as mock_getsize:
+        async_logger.print("hello", "Shell.run")
+        async_logger.flush()
+    mock_getsize.assert_not_called()
+
+
+def test_async_rollover_uses_written_byte_count(async_logger):
+    line = async_logger._format_log("Shell.run", "x" * 100)
+    num_lines = LOG_FILE_MAX_SIZE // len(line) + 1
+    for _ in range(num_lines):
+        async_logger.print("x" * 100, "Shell.run")
+    async_logger.disable_async()
+
+    log_dir = os.path.dirname(async_logger.latest_log)
+    assert len(os.listdir(log_dir)) >= 2
+    assert os.path.getsize(async_logger.latest_log) < LOG_FILE_MAX_SIZE
+
+
+class Caller:
+    @classmethod
+    def from_classmethod(cls, logger):
+        logger.print("hello")
+
+    def from_method(self, logger):
+        logger.print("hello")
+
+
+@pytest.mark.parametrize("method, expected", [
+    (Caller.from_classmethod, "Caller.from_classmethod()"),
+    (Caller().from_method, "Caller.from_method()"),
+])
+def test_print_names_caller(logger, method, expected):
+    with patch.object(Logger, "_format_log") as mock_format, \
+            patch("os.path.getsize", return_value=0), \
+            patch("builtins.open", mock_open()):
+        method(logger)
+        mock_format.assert_called_once_with(expected, "hello")
+
+
+def test_caller_name_is_cached_per_code_object(logger):
+    with patch.object(Logger, "_format_log"), \
+            patch("os.path.getsize", return_value=0), \
+            patch("builtins.open", mock_open()):
+        Caller().from_method(logger)
+        name = Logger._caller_names[Caller.from_method.__code__]
+        Caller().from_method(logger)
+    assert name == "Caller.from_method()"
+    assert Logger._caller_names[Caller.from_method.__code__] is name
+
+
+def roll_over_at(logger, when, content):
+    with open(logger.latest_log, "w") as f:
+        f.write(content)
+    with patch.object(Logger, "_get_timestamp", return_value=(when.strftime("%y.%m.%d %H:%M"), when)):
+        logger._rollover()
+    logger.flush()
+
+
+def test_rollover_compresses_rotated_log(fresh_logger, fixed_datetime):
+    content = "[24.07.16 12:34] Shell.run()                    : hello\n" * 200
+    roll_over_at(fresh_logger, fixed_datetime[1], content)
+
+    log_dir = fresh_logger.log_dir
+    assert sorted(os.listdir(log_dir)) == [LOG_FILE_NAME, "until_240716_12h_34m_56s.zip"]
+    with zipfile.ZipFile(os.path.join(log_dir, "until_240716_12h_34m_56s.zip")) as archive:
+        assert archive.read("until_240716_12h_34m_56s.log").decode() == content
+    assert os.path.getsize(os.path.join(log_dir, "until_240716_12h_34m_56s.zip")) < len(content)
+
+
+def test_retention_keeps_newest_archives(fresh_logger, fixed_datetime):
+    fresh_logger.retention_count = 3
+    for i in range(5):
+        roll_over_at(fresh_logger, fixed_datetime[1] + timedelta(seconds=i), "hello\n")
+
+    archives = sorted(name for name in os.listdir(fresh_logger.log_dir) if name.endswith(".zip"))
+    assert archives == [
+        (fixed_datetime[1] + timedelta(seconds=i)).strftime("until_%y%m%d_%Hh_%Mm_%Ss.zip") for i in range(2, 5)
+    ]
+
+
+def test_retention_caps_total_archive_size(fresh_logger, fixed_datetime):
+    roll_over_at(fresh_logger, fixed_datetime[1], os.urandom(2000).hex())
+    archive_size = os.path.getsize(os.path.join(fresh_logger.log_dir, "until_240716_12h_34m_56s.zip"))
+    fresh_logger.retention_size = archive_size * 3 // 2
+    roll_over_at(fresh_logger, fixed_datetime[1] + timedelta(seconds=1), os.urandom(2000).hex())
+
+    archives = [name for name in os.listdir(fresh_logger.log_dir) if name.endswith(".zip")]
+    assert archives == ["until_240716_12h_34m_57s.zip"]
+
+
+def test_async_rollover_at_exit_still_archives(tmp_path):
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "from logger import Logger\n"
+        f"logger = Logger(log_dir={str(tmp_path)!r})\n"
+        "logger.enable_async()\n"
+        "for _ in range(200):\n"
+        "    logger.print('x' * 100, fn_name='test')\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=repo_dir, capture_output=True, text=True)
+
+    assert result.returncode == 0
+    assert "Traceback" not in result.stderr
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith(".log")) == [LOG_FILE_NAME]
+    assert any(name.endswith(".zip") for name in os.listdir(tmp_path))
@@ -0,0 +1,174 @@
+import os
+
+import pytest
+
+from buffer_manager import BufferManager
+from nand_image import (
+    IMAGE_HEADER,
+    NandImage,
+    convert_image_to_text,
+    convert_text_to_image,
+    device_capacity,
+    read_capacity,
+    text_capacity
+)
+from ssd import SSD, FileManager, ImageFileManager, create_file_manager, format_device
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    return str(tmp_path / "ssd_nand.img")
+
+
+def test_create_image_is_zero_filled(image_path):
+    image = NandImage.create(image_path, capacity=100)
+    assert image.capacity == 100
+    assert os.path.getsize(image_path) == IMAGE_HEADER.size + 100 * 4
+    assert all(image.read(lba) == 0 for lba in range(100))
+    image.close()
+
+
+def test_write_patches_only_the_lba_word(image_path):
+    image = NandImage.create(image_path, capacity=10)
+    image.write(3, 0x12345678)
+    image.close()
+
+    with open(image_path, "rb") as f:
+        raw = f.read()
+    offset = IMAGE_HEADER.size + 3 * 4
+    assert raw[offset:offset + 4] == bytes([0x78, 0x56, 0x34, 0x12])
+    assert raw[IMAGE_HEADER.size:offset] == bytes(12)
+
+
+def test_erase_zeroes_range(image_path):
+    image = NandImage.create(image_path, capacity=10)
+    for lba in range(10):
+        image.write(lba, 0xFFFFFFFF)
+    image.erase(2, 5)
+    assert [image.read(lba) for lba in range(10)] == [0xFFFFFFFF] * 2 + [0] * 5 + [0xFFFFFFFF] * 3
+    image.close()
+
+
+def test_reject_non_image_file(tmp_path):
+    path = tmp_path / "ssd_nand.txt"
+    path.write_text("0\t0x00000000\n")
+    with pytest.raises(ValueError):
+        NandImage(str(path))
+
+
+def test_convert_round_trip(tmp_path, image_path):
+    text_path = tmp_path / "ssd_nand.txt"
+    text_path.write_text("".join(f"{i}\t0x{i:08X}\n" for i in range(100)))
+
+    convert_text_to_image(str(text_path), image_path)
+    image = NandImage(image_path)
+    assert image.capacity == 100
+    assert image.read(42) == 42
+    image.close()
+
+    out_path = tmp_path / "out.txt"
+    convert_image_to_text(image_path, str(out_path))
+    assert out_path.read_text() == text_path.read_text()
+
+
+def test_ssd_with_image_file_manager(tmp_path, image_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(
+        file_manager=ImageFileManager(image_path),
+        buffer_manager=BufferManager(),
+        write_output_file=False,
+    )
+    assert ssd.run([None, "W", "10", "0xABCDABCD"]) == ""
+    assert ssd.run([None, "E", "11", "3"]) == ""
+    assert ssd.run([None, "F"]) == ""
+
+    assert ssd.run([None, "R", "10"]) == "0xABCDABCD"
+    assert ssd.file_manager.read_nand(10) == "0xABCDABCD"
+    assert ssd.file_manager.read_nand(100) == ""
+
+
+def test_fill_range_repeats_pattern(image_path):
+    image = NandImage.create(image_path, capacity=10)
+    image.fill_range(1, 8, [0xA, 0xB, 0xC])
+    assert image.read_range(0, 10) == [0, 0xA, 0xB, 0xC, 0xA, 0xB, 0xC, 0xA, 0, 0]
+    image.close()
+
+
+def test_device_capacity_prefers_image_header(tmp_path, image_path):
+    text_path = tmp_path / "ssd_nand.txt"
+    assert device_capacity(image_path, str(text_path)) == 100
+
+    text_path.write_text("".join(f"{i}\t0x00000000\n" for i in range(30)))
+    assert device_capacity(image_path, str(text_path)) == 30
+
+    NandImage.create(image_path, capacity=5000).close()
+    assert read_capacity(image_path) == 5000
+    assert device_capacity(image_path, str(text_path)) == 5000
+
+
+def test_text_capacity_is_counted_once_per_nand_version(tmp_path, monkeypatch, mocker):
+    monkeypatch.chdir(tmp_path)
+    file_manager = FileManager(capacity=30)
+    open_text = mocker.patch("nand_image.open", wraps=open)
+    assert text_capacity("ssd_nand.txt") == 30
+    assert FileManager().capacity == 30
+    assert all(call.args[0] != "ssd_nand.txt" for call in open_text.call_args_list)
+
+    # A rewrite by the manager keeps the saved count current; any other change is recounted.
+    file_manager.write_nand(3, "0x00000003")
+    assert text_capacity("ssd_nand.txt") == 30
+    assert all(call.args[0] != "ssd_nand.txt" for call in open_text.call_args_list)
+    with open("ssd_nand.txt", "a") as f:
+        f.write("30\t0x00000000\n")
+    assert text_capacity("ssd_nand.txt") == 31
+
+
+def test_ssd_honors_image_capacity(tmp_path, image_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(
+        file_manager=ImageFileManager(image_path, capacity=1000),
+        buffer_manager=BufferManager(),
+        write_output_file=False,
+    )
+    assert ssd.run([None, "I"]) == "1000"
+    assert ssd.run([None, "W", "999", "0x00000999"]) == ""
+    assert ssd.run([None, "R", "999"]) == "0x00000999"
+    assert ssd.run([None, "E", "995", "5"]) == ""
+    assert ssd.run([None, "R", "1000"]) == "ERROR"
+    assert "0 ~ 999" in capsys.readouterr().err
+    assert ssd.run([None, "RR", "990", "1001"]) == "ERROR"
+
+
+def test_million_lba_device(tmp_path, image_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    capacity = 10 ** 6
+    ssd = SSD(
+        file_manager=ImageFileManager(image_path, capacity=capacity),
+        buffer_manager=BufferManager(),
+        write_output_file=False,
+    )
+    assert os.path.getsize(image_path) == IMAGE_HEADER.size + capacity * 4
+    assert ssd.run([None, "RW", "0", str(capacity), "0x12345678"]) == ""
+    assert ssd.run([None, "E", str(capacity - 10), "10"]) == ""
+    assert ssd.run([None, "W", str(capacity // 2), "0x00000001"]) == ""
+
+    values = ssd.run([None, "RR", "0", str(capacity)]).split()
+    assert len(values) == capacity
+    assert values[capacity // 2] == "0x00000001"
+    assert values[-11:] == ["0x12345678"] + ["0x00000000"] * 10
+
+
+def test_format_device_creates_image(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    BufferManager().write(3, "0x00000003")
+    format_device(2048)
+    assert read_capacity("ssd_nand.img") == 2048
+    assert BufferManager().get_buffer() == []
+    assert create_file_manager().capacity == 2048
+
+
+def test_read_joined_range_matches_formatted_words(image_path):
+    image = NandImage.create(image_path, capacity=6)
+    image.write_range(0, [0x0, 0x1, 0xABCDEF01, 0xFFFFFFFF, 0x10, 0x80000000])
+    assert image.read_joined_range(1, 6).decode() == "0x00000001 0xABCDEF01 0xFFFFFFFF 0x00000010 0x80000000"
+    image.close()
@@ -0,0 +1,100 @@
+import pytest
+
+from buffer_manager import BufferManager
+from read_cache import ClockCache, LRUCache, create_read_cache
+from ssd import SSD, FileManager, SparseFileManager
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    assert cache.get(1) == "a"
+    cache.put(3, "c")
+    assert (cache.get(2), cache.get(1), cache.get(3)) == (None, "a", "c")
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.hit_rate == 0.75
+
+
+def test_clock_gives_referenced_entries_a_second_chance():
+    cache = ClockCache(3)
+    for lba in (1, 2, 3):
+        cache.put(lba, str(lba))
+    cache.put(4, "4")  # every bit was set: the sweep clears them and evicts 1
+    assert cache.get(1) is None
+    assert cache.get(2) == "2"
+    cache.put(5, "5")  # 2 was referenced again, so 3 goes
+    assert sorted(lba for lba in (2, 3, 4, 5) if cache.get(lba)) == [2, 4, 5]
+    assert len(cache) == 3
+
+
+@pytest.mark.parametrize("cache_type", [LRUCache, ClockCache])
+def test_discard_range(cache_type):
+    cache = cache_type(8)
+    for lba in range(8):
+        cache.put(lba * 10, "x")
+    cache.discard_range(15, 35)
+    cache.discard_range(0, 1)
+    assert [lba for lba in range(0, 80, 10) if cache.get(lba)] == [10, 40, 50, 60, 70]
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_create_read_cache_from_environment(monkeypatch):
+    assert isinstance(create_read_cache(), LRUCache)
+    monkeypatch.setenv("SSD_READ_CACHE", "16")
+    monkeypatch.setenv("SSD_READ_CACHE_POLICY", "clock")
+    cache = create_read_cache()
+    assert isinstance(cache, ClockCache) and cache.size == 16
+    assert create_read_cache(size=0) is None
+    with pytest.raises(ValueError):
+        create_read_cache(policy="fifo")
+
+
+@pytest.mark.parametrize("file_manager_type", [FileManager, SparseFileManager])
+def test_file_manager_serves_repeated_reads_from_cache(tmp_path, monkeypatch, file_manager_type):
+    monkeypatch.chdir(tmp_path)
+    file_manager = file_manager_type(read_cache=LRUCache(16))
+    file_manager.write_nand(3, "0x00000003")
+    assert file_manager.read_nand(3) == "0x00000003"
+    assert file_manager.read_nand(3) == "0x00000003"
+    assert file_manager.read_nand(4) == "0x00000000"
+    assert file_manager.read_nand(100) == ""
+    assert (file_manager.read_cache.hits, file_manager.read_cache.misses) == (2, 2)
+
+    file_manager.erase_nand(2, 3)
+    assert file_manager.read_nand(3) == "0x00000000"
+
+
+def test_file_manager_drops_cache_when_nand_is_replaced(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    file_manager = FileManager(read_cache=LRUCache(16))
+    assert file_manager.read_nand(5) == "0x00000000"
+
+    FileManager().write_nand(5, "0x00000005")
+    assert file_manager.read_nand(5) == "0x00000005"
+
+
+def test_file_manager_drops_cache_when_another_manager_erases(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    file_manager = FileManager(read_cache=LRUCache(16))
+    file_manager.write_nand(5, "0x00000005")
+    assert file_manager.read_nand(5) == "0x00000005"
+
+    # The erase only saves a trimmed extent; the NAND file is untouched.
+    FileManager().erase_nand(0, 10)
+    assert file_manager.read_nand(5) == "0x00000000"
+
+
+def test_flush_updates_cached_values(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(
+        file_manager=FileManager(read_cache=LRUCache(16)),
+        buffer_manager=BufferManager(),
+        write_output_file=False,
+    )
+    assert ssd.run([None, "R", "7"]) == "0x00000000"
+    ssd.run([None, "W", "7", "0x00000007"])
+    ssd.run([None, "F"])
+    assert ssd.run([None, "R", "7"]) == "0x00000007"
+    assert ssd.file_manager.read_cache.hits == 1
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from constant import ShellCommandEnum
+from script_farm import resolve_scripts, run_farm, run_job
+
+
+def test_resolve_scripts_accepts_prefixes_and_script_files(tmp_path):
+    script_file = tmp_path / "shell_script.txt"
+    script_file.write_text("1_FullWriteAndReadCompare\n4_\n")
+    assert resolve_scripts(["2_", str(script_file)]) == [
+        ShellCommandEnum.SCRIPT_2, ShellCommandEnum.SCRIPT_1, ShellCommandEnum.SCRIPT_4,
+    ]
+    with pytest.raises(ValueError):
+        resolve_scripts(["write"])
+
+
+def test_run_job_uses_a_fresh_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = run_job(ShellCommandEnum.SCRIPT_2.value, seed=3)
+
+    assert result["passed"] and result["error"] is None
+    assert result["workdir"] is None
+    assert os.getcwd() == str(tmp_path)
+    assert not (tmp_path / "ssd_nand.txt").exists()
+
+
+def test_run_farm_reports_every_job_in_order(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    report = run_farm([ShellCommandEnum.SCRIPT_1, ShellCommandEnum.SCRIPT_3], seeds=2, workers=2, storage="image")
+
+    assert [(result["script"], result["seed"]) for result in report["results"]] == [
+        ("1_FullWriteAndReadCompare", 0), ("1_FullWriteAndReadCompare", 1),
+        ("3_WriteReadAging", 0), ("3_WriteReadAging", 1),
+    ]
+    assert (report["passed"], report["failed"]) == (4, 0)
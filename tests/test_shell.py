@@ -1,17 +1,45 @@
+import os
+
 import pytest
 
+from commands import DeviceError, InProcessExecutor
 from constant import (
+    MESSAGE_ERROR,
     MESSAGE_HELP,
     MESSAGE_PASS,
     ShellCommandEnum,
     SIZE_LBA
 )
-from shell import Shell
+from logger import Logger
+from shell import InProcessSSDController, Shell, SSDController
+
+SSD_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ssd.py")
+
+
+@pytest.fixture(autouse=True)
+def device_dir(tmp_path, monkeypatch):
+    """Run every test against its own NAND, buffer and output files."""
+    monkeypatch.chdir(tmp_path)
+    # The shell logger keeps the relative log path it was created with.
+    os.makedirs(Logger().log_dir, exist_ok=True)
+    open(Logger().latest_log, "a").close()
+    return tmp_path
 
 
 @pytest.fixture
 def ssd_py_path(mocker):
-    return mocker.patch("shell.FILENAME_MAIN_SSD", new="../ssd.py")
+    return mocker.patch("shell.FILENAME_MAIN_SSD", new=SSD_PY)
+
+
+@pytest.fixture
+def in_process(monkeypatch):
+    # A new executor opens the device in this test's directory.
+    monkeypatch.setattr(InProcessSSDController, "executor", InProcessExecutor())
+    monkeypatch.setattr(InProcessSSDController, "_capacity", None)
+    monkeypatch.setattr(InProcessSSDController, "_local_capacity", None)
+    Shell.use_ssd_controller(InProcessSSDController)
+    yield InProcessSSDController
+    Shell.use_ssd_controller(SSDController)
 
 
 @pytest.fixture
@@ -41,13 +69,13 @@ def test_write_mock(file_mock, shell_mock):
 
 def test_full_read_mock(file_mock, shell_mock):
     Shell.execute_command(cmd=ShellCommandEnum.FULLREAD, args=[])
-    shell_mock.assert_called_with(['python', 'ssd.py', 'R', '99'], text=True)
+    shell_mock.assert_called_once_with(['python', 'ssd.py', 'RR', '0', '100'], text=True)
     file_mock.assert_any_call('ssd_output.txt', 'r')
 
 
 def test_full_write_mock(file_mock, shell_mock):
     Shell.execute_command(cmd=ShellCommandEnum.FULLWRITE, args=["0x00000003"])
-    shell_mock.assert_called_with(['python', 'ssd.py', 'W', '99', "0x00000003"], text=True)
+    shell_mock.assert_called_once_with(['python', 'ssd.py', 'RW', '0', '100', "0x00000003"], text=True)
     file_mock.assert_any_call('ssd_output.txt', 'r')
 
 
@@ -60,8 +88,7 @@ def test_erase_mock(file_mock, shell_mock):
 
 def test_erase_range_mock(file_mock, shell_mock):
     ret = Shell.execute_command(cmd=ShellCommandEnum.ERASE_RANGE, args=[10, 30])
-    assert shell_mock.call_count == 3
-    shell_mock.assert_called_with(['python', 'ssd.py', 'E', '30', '1'], text=True)
+    shell_mock.assert_called_once_with(['python', 'ssd.py', 'E', '10', '21'], text=True)
     file_mock.assert_any_call('ssd_output.txt', 'r')
     assert ret == "[Erase Range] Done"
 
@@ -214,4 +241,62 @@ def test_full_write_and_erase_100_and_full_read(ssd_py_path):
     for lba in range(SIZE_LBA):
         expected += f"\nLBA {lba:0>2} : 0x00000000"
     ret = Shell.execute_command(cmd=ShellCommandEnum.FULLREAD, args=[])
-    assert ret == expected
\ No newline at end of file
+    assert ret == expected
+
+
+def test_in_process_write_and_read_without_spawning(in_process, shell_mock):
+    ret = Shell.execute_command(cmd=ShellCommandEnum.WRITE, args=[7, "0x70007000"])
+    assert ret == "[Write] Done"
+
+    ret = Shell.execute_command(cmd=ShellCommandEnum.READ, args=[7])
+    assert ret == "[Read] LBA 07 : 0x70007000"
+    shell_mock.assert_not_called()
+
+
+def test_in_process_read_invalid_lba(in_process):
+    ret = Shell.execute_command(cmd=ShellCommandEnum.READ, args=[100])
+    assert ret == "[Read] ERROR"
+
+
+def test_in_process_scripts(in_process):
+    assert Shell.execute_command(cmd=ShellCommandEnum.SCRIPT_1, args=[]) == MESSAGE_PASS
+    assert Shell.execute_command(cmd=ShellCommandEnum.SCRIPT_3, args=[]) == MESSAGE_PASS
+    assert Shell.execute_command(cmd=ShellCommandEnum.SCRIPT_4, args=[3]) == MESSAGE_PASS
+
+
+def test_in_process_full_write_and_read_sees_buffered_writes(in_process):
+    assert Shell.execute_command(cmd=ShellCommandEnum.FULLWRITE, args=["0x11111111"]) == "[Full Write] Done"
+    Shell.execute_command(cmd=ShellCommandEnum.WRITE, args=[5, "0x55555555"])
+    Shell.execute_command(cmd=ShellCommandEnum.ERASE, args=[7, 2])
+
+    ret = Shell.execute_command(cmd=ShellCommandEnum.FULLREAD, args=[]).split("\n")
+    assert ret[0] == "[Full Read]"
+    assert ret[1 + 4] == "LBA 04 : 0x11111111"
+    assert ret[1 + 5] == "LBA 05 : 0x55555555"
+    assert ret[1 + 7] == "LBA 07 : 0x00000000"
+    assert ret[1 + 8] == "LBA 08 : 0x00000000"
+    assert ret[1 + 9] == "LBA 09 : 0x11111111"
+
+
+def test_in_process_controller_reads_device_capacity(in_process, monkeypatch):
+    monkeypatch.setattr(in_process, "_capacity", None)
+    assert in_process.capacity() == SIZE_LBA
+    ret = Shell.execute_command(cmd=ShellCommandEnum.ERASE, args=[SIZE_LBA - 1, 2])
+    assert ret == "[Erase] ERROR"
+
+
+def test_in_process_controller_asks_again_after_format(in_process, monkeypatch):
+    from ssd import format_device
+
+    assert in_process.capacity() == SIZE_LBA
+    format_device(50)
+    # The device process picks the new format up when it next opens the device.
+    monkeypatch.setattr(in_process, "executor", InProcessExecutor())
+    assert in_process.capacity() == 50
+
+
+def test_capacity_failure_is_an_error(in_process, mocker):
+    mocker.patch.object(in_process.executor, "run", return_value=False)
+    with pytest.raises(DeviceError):
+        in_process.capacity()
+    assert Shell.execute_command(cmd=ShellCommandEnum.ERASE, args=[0, 2]) == MESSAGE_ERROR
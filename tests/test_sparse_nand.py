@@ -0,0 +1,71 @@
+import pytest
+
+from buffer_manager import BufferManager
+from nand_image import device_capacity
+from sparse_nand import SparseNand, drop_range, read_sparse_capacity
+from ssd import SSD, SparseFileManager, create_file_manager, format_device
+
+
+@pytest.fixture
+def sparse_ssd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return SSD(
+        file_manager=SparseFileManager(str(tmp_path / "ssd_nand.sparse"), capacity=10 ** 6),
+        buffer_manager=BufferManager(),
+        write_output_file=False,
+    )
+
+
+def test_new_sparse_nand_holds_only_header(tmp_path):
+    path = str(tmp_path / "ssd_nand.sparse")
+    nand = SparseNand.create(path, capacity=10 ** 7)
+    assert read_sparse_capacity(path) == 10 ** 7
+    assert nand.load() == {}
+    assert (tmp_path / "ssd_nand.sparse").read_text() == "SSDSPARSE1 10000000\n"
+
+
+def test_reject_non_sparse_file(tmp_path):
+    path = tmp_path / "ssd_nand.txt"
+    path.write_text("0\t0x00000000\n")
+    with pytest.raises(ValueError):
+        SparseNand(str(path))
+
+
+def test_drop_range_either_way():
+    live = {1: "0x00000001", 5: "0x00000005", 900: "0x00000900"}
+    drop_range(live, 0, 3)
+    assert live == {5: "0x00000005", 900: "0x00000900"}
+    drop_range(live, 4, 1000)
+    assert live == {}
+
+
+def test_footprint_tracks_live_data(sparse_ssd, tmp_path):
+    sparse_ssd.run([None, "W", "123456", "0x00000001"])
+    sparse_ssd.run([None, "W", "7", "0x00000007"])
+    sparse_ssd.run([None, "W", "8", "0x00000000"])
+    sparse_ssd.run([None, "F"])
+    assert (tmp_path / "ssd_nand.sparse").read_text() == "SSDSPARSE1 1000000\n7\t0x00000007\n123456\t0x00000001\n"
+
+    sparse_ssd.run([None, "E", "5", "5"])
+    sparse_ssd.run([None, "F"])
+    assert sparse_ssd.file_manager.sparse.load() == {123456: "0x00000001"}
+
+
+def test_reads_synthesize_zeros(sparse_ssd):
+    sparse_ssd.run([None, "RW", "10", "20", "0x11111111"])
+    sparse_ssd.run([None, "W", "12", "0x22222222"])
+    assert sparse_ssd.run([None, "R", "999999"]) == "0x00000000"
+    assert sparse_ssd.run([None, "RR", "9", "14"]).split() == [
+        "0x00000000", "0x11111111", "0x11111111", "0x22222222", "0x11111111"
+    ]
+    assert len(sparse_ssd.run([None, "RR", "0", str(10 ** 6)]).split()) == 10 ** 6
+    assert sparse_ssd.run([None, "R", str(10 ** 6)]) == "ERROR"
+
+
+def test_format_sparse_device(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    format_device(4096)
+    format_device(2048, "sparse")
+    assert not (tmp_path / "ssd_nand.img").exists()
+    assert isinstance(create_file_manager(), SparseFileManager)
+    assert device_capacity() == 2048
@@ -1,10 +1,13 @@
-from unittest.mock import mock_open, patch, call
+import os
+import subprocess
+import sys
+from unittest.mock import Mock, call, mock_open, patch
 
 import pytest
 
 from buffer_manager import Buffer, BufferManager
-from constant import FILENAME_OUT
-from ssd import SSD, FileManager
+from constant import FILENAME_OUT, SIZE_LBA
+from ssd import SSD, FileManager, create_file_manager, format_device
 
 
 @pytest.fixture
@@ -71,7 +74,7 @@ def test_execute_command_when_write_normal_should_write_value():
     expected = '0\t0x11111111\n1\t0x22222222\n2\t0x33333333\n3\t0x33333333\n4\t0x33333333\n5\t0x33333333\n6\t0x33333333\n'
 
     with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers) as mock_get_buffer, \
-          patch('builtins.open', mock_open(read_data=initial_file_data)) as mock_file, \
+          patch('ssd.open', mock_open(read_data=initial_file_data), create=True) as mock_file, \
           patch.object(BufferManager, 'set_buffer') as mock_set_buffer, \
           patch.object(FileManager, 'write_output') as mock_write_buffer):
         ssd.run(commands[0])
@@ -114,8 +117,10 @@ def test_filemanager_nand_write(mock_file):
     with patch.object(FileManager, '_read_whole_lines', return_value=return_value):
         file_manager = FileManager()
         contents = "0x12341234"
-        file_manager.write_nand(lba, contents)
-        mock_file.assert_called_with('ssd_nand.txt', 'w')
+        with patch('ssd.replace_durably') as mock_replace:
+            file_manager.write_nand(lba, contents)
+        mock_file.assert_called_with('ssd_nand.txt.tmp', 'w')
+        mock_replace.assert_called_once_with('ssd_nand.txt.tmp', 'ssd_nand.txt')
 
 
 @patch('builtins.open', new_callable=mock_open)
@@ -139,15 +144,20 @@ def test_filemanager_write_file(mock_file):
 
 def test_execute_command_when_erase_size_is_out_of_range_should_write_error():
     run_execute_command_and_assert([None, "E", "-1"], 'w', 'ERROR')
-    run_execute_command_and_assert([None, "E", "0", "11"], 'w', 'ERROR')
+    run_execute_command_and_assert([None, "E", "0", "101"], 'w', 'ERROR')
     run_execute_command_and_assert([None, "E", "0", "0"], 'w', 'ERROR')
     run_execute_command_and_assert([None, "E", "98", "5"], 'w', 'ERROR')
     run_execute_command_and_assert([None, "E", "STR"], 'w', 'ERROR')
     run_execute_command_and_assert([None, "E", "0", "HAHA"], 'w', 'ERROR')
 
 
-def test_read_from_buffer_when_lba_is_cached():
-    ssd = SSD()
+def make_buffered_ssd(journal, initial_buffers, file_manager=None):
+    ssd = SSD(file_manager=file_manager or Mock(capacity=SIZE_LBA), buffer_manager=BufferManager(str(journal)))
+    ssd.buffer_manager.set_buffer(initial_buffers)
+    return ssd
+
+
+def test_read_from_buffer_when_lba_is_cached(tmp_path):
     commands = [
         [None, "R", "50"]
     ]
@@ -155,18 +165,16 @@ def test_read_from_buffer_when_lba_is_cached():
                        Buffer(command="W", lba=50, data="0x12345678", range=""),
                        Buffer(command="W", lba=20, data="0xABABCCCC", range="")]
     expected_write = "0x12345678"
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
+    ssd = make_buffered_ssd(tmp_path / "buffer.journal", initial_buffers)
+    with patch.object(BufferManager, 'set_buffer') as mock_set_buffer:
         ssd.run(commands[0])
 
         mock_set_buffer.assert_not_called()
-        mocked_open().read.assert_not_called()
-        mocked_open().write.assert_called_once_with(expected_write)
+        ssd.file_manager.read_nand.assert_not_called()
+        ssd.file_manager.write_output.assert_called_once_with(expected_write)
 
 
-def test_read_buffer_commands_when_not_exists():
-    ssd = SSD()
+def test_read_buffer_commands_when_not_exists(tmp_path):
     commands = [
         [None, "R", "12"]
     ]
@@ -174,35 +182,31 @@ def test_read_buffer_commands_when_not_exists():
                        Buffer(command="E", lba=10, data="", range=4)]
     expected_write = "0x00000000"
 
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
+    ssd = make_buffered_ssd(tmp_path / "buffer.journal", initial_buffers)
+    with patch.object(BufferManager, 'set_buffer') as mock_set_buffer:
         ssd.run(commands[0])
 
         mock_set_buffer.assert_not_called()
-        mocked_open().write.assert_called_once_with(expected_write)
+        ssd.file_manager.write_output.assert_called_once_with(expected_write)
 
 
-def execute_commands_check_buffer_with_expected_buffers(commands, expectd_buffers_for_all_commands, initial_buffers):
-    ssd = SSD()
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
-        for command, expected_buffers in zip(commands, expectd_buffers_for_all_commands):
-            ssd.run(command)
+def execute_commands_check_buffer_with_expected_buffers(journal, commands, expectd_buffers_for_all_commands,
+                                                        initial_buffers):
+    ssd = make_buffered_ssd(journal, initial_buffers)
+    for command, expected_buffers in zip(commands, expectd_buffers_for_all_commands):
+        ssd.run(command)
 
-            args, kwargs = mock_set_buffer.call_args
-            buffers = args[0]
-            assert len(buffers) == len(expected_buffers)
+        buffers = ssd.buffer_manager.get_buffer()
+        assert len(buffers) == len(expected_buffers)
 
-            for buffer, expected in zip(buffers, expected_buffers):
-                assert buffer.command == expected["command"]
-                assert buffer.lba == expected["lba"]
-                assert str(buffer.data if expected["command"] == "W" else buffer.range) == str(
-                    expected["data_or_range"])
+        for buffer, expected in zip(buffers, expected_buffers):
+            assert buffer.command == expected["command"]
+            assert buffer.lba == expected["lba"]
+            assert str(buffer.data if expected["command"] == "W" else buffer.range) == str(
+                expected["data_or_range"])
 
 
-def test_buffer_overwrites_earlier_instructions_with_last_for_same_lba():
+def test_buffer_overwrites_earlier_instructions_with_last_for_same_lba(tmp_path):
     commands = [
         [None, "W", "20", "0xABCDABCD"],
         [None, "W", "20", "0x12341234"],
@@ -215,10 +219,11 @@ def test_buffer_overwrites_earlier_instructions_with_last_for_same_lba():
         [{'command': 'E', 'lba': 20, 'data_or_range': 1}]
     ]
 
-    execute_commands_check_buffer_with_expected_buffers(commands, expectd_buffers_for_all_commands, initial_buffers)
+    execute_commands_check_buffer_with_expected_buffers(tmp_path / "buffer.journal", commands,
+                                                        expectd_buffers_for_all_commands, initial_buffers)
 
 
-def test_merge_buffer_commands_when_possible():
+def test_merge_buffer_commands_when_possible(tmp_path):
     commands = [
         [None, "E", "12", "3"]
     ]
@@ -226,15 +231,16 @@ def test_merge_buffer_commands_when_possible():
                        Buffer(command="E", lba=10, data="", range=4)]
     expectd_buffers_for_all_commands = [
         [
-            {"command": "W", "lba": 20, "data_or_range": "0xABCDABCD"},
-            {"command": "E", "lba": 10, "data_or_range": 5}
+            {"command": "E", "lba": 10, "data_or_range": 5},
+            {"command": "W", "lba": 20, "data_or_range": "0xABCDABCD"}
         ]
     ]
 
-    execute_commands_check_buffer_with_expected_buffers(commands, expectd_buffers_for_all_commands, initial_buffers)
+    execute_commands_check_buffer_with_expected_buffers(tmp_path / "buffer.journal", commands,
+                                                        expectd_buffers_for_all_commands, initial_buffers)
 
 
-def test_buffer_commands_write_when_possible():
+def test_buffer_commands_write_when_possible(tmp_path):
     commands = [
         [None, "W", "12", "0x0000AAAA"]
     ]
@@ -245,25 +251,27 @@ def test_buffer_commands_write_when_possible():
         ]
     ]
 
-    execute_commands_check_buffer_with_expected_buffers(commands, expectd_buffers_for_all_commands, initial_buffers)
+    execute_commands_check_buffer_with_expected_buffers(tmp_path / "buffer.journal", commands,
+                                                        expectd_buffers_for_all_commands, initial_buffers)
 
 
-def test_merge_buffer_commands_when_not_same_index():
+def test_merge_buffer_commands_when_not_same_index(tmp_path):
     commands = [
         [None, "W", "12", "0xAAAABBBB"]
     ]
     initial_buffers = [Buffer(command="W", lba=20, data="0xABCDABCD", range="")]
     expectd_buffers_for_all_commands = [
         [
-            {"command": "W", "lba": 20, "data_or_range": "0xABCDABCD"},
             {"command": "W", "lba": 12, "data_or_range": "0xAAAABBBB"},
+            {"command": "W", "lba": 20, "data_or_range": "0xABCDABCD"},
         ]
     ]
 
-    execute_commands_check_buffer_with_expected_buffers(commands, expectd_buffers_for_all_commands, initial_buffers)
+    execute_commands_check_buffer_with_expected_buffers(tmp_path / "buffer.journal", commands,
+                                                        expectd_buffers_for_all_commands, initial_buffers)
 
 
-def test_merge_buffer_commands_when_same_index():
+def test_merge_buffer_commands_when_same_index(tmp_path):
     commands = [
         [None, "W", "12", "0xAAAABBBB"]
     ]
@@ -271,13 +279,15 @@ def test_merge_buffer_commands_when_same_index():
                        Buffer(command="W", lba=22, data="0xABCDABCD", range="")]
     expectd_buffers_for_all_commands = [
         [
-            {"command": "W", "lba": 22, "data_or_range": "0xABCDABCD"},
             {"command": "W", "lba": 12, "data_or_range": "0xAAAABBBB"},
+            {"command": "W", "lba": 22, "data_or_range": "0xABCDABCD"},
         ]
     ]
-    execute_commands_check_buffer_with_expected_buffers(commands, expectd_buffers_for_all_commands, initial_buffers)
+    execute_commands_check_buffer_with_expected_buffers(tmp_path / "buffer.journal", commands,
+                                                        expectd_buffers_for_all_commands, initial_buffers)
+
 
-def test_merge_buffer_commands_when_same_index_with_erase_range_1():
+def test_merge_buffer_commands_when_same_index_with_erase_range_1(tmp_path):
     commands = [
         [None, "W", "12", "0xAAAABBBB"]
     ]
@@ -285,13 +295,15 @@ def test_merge_buffer_commands_when_same_index_with_erase_range_1():
                        Buffer(command="W", lba=22, data="0xABCDABCD", range="")]
     expectd_buffers_for_all_commands = [
         [
-            {"command": "W", "lba": 22, "data_or_range": "0xABCDABCD"},
             {"command": "W", "lba": 12, "data_or_range": "0xAAAABBBB"},
+            {"command": "W", "lba": 22, "data_or_range": "0xABCDABCD"},
         ]
     ]
-    execute_commands_check_buffer_with_expected_buffers(commands, expectd_buffers_for_all_commands, initial_buffers)
+    execute_commands_check_buffer_with_expected_buffers(tmp_path / "buffer.journal", commands,
+                                                        expectd_buffers_for_all_commands, initial_buffers)
 
-def test_merge_buffer_commands_when_erase_range_2():
+
+def test_merge_buffer_commands_when_erase_range_2(tmp_path):
     commands = [
         [None, "W", "12", "0xAAAABBBB"]
     ]
@@ -300,11 +312,12 @@ def test_merge_buffer_commands_when_erase_range_2():
     expectd_buffers_for_all_commands = [
         [
             {"command": "E", "lba": 13, "data_or_range": "1"},
-            {"command": "W", "lba": 22, "data_or_range": "0xABCDABCD"},
-            {"command": "W", "lba": 12, "data_or_range": "0xAAAABBBB"}
+            {"command": "W", "lba": 12, "data_or_range": "0xAAAABBBB"},
+            {"command": "W", "lba": 22, "data_or_range": "0xABCDABCD"}
         ]
     ]
-    execute_commands_check_buffer_with_expected_buffers(commands, expectd_buffers_for_all_commands, initial_buffers)
+    execute_commands_check_buffer_with_expected_buffers(tmp_path / "buffer.journal", commands,
+                                                        expectd_buffers_for_all_commands, initial_buffers)
 
 
 def test_flush_buffer_when_mode_is_flush_should_execute_instruction():
@@ -318,11 +331,15 @@ def test_flush_buffer_when_mode_is_flush_should_execute_instruction():
     expected_lines = expected.splitlines(keepends=True)
 
     with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers) as mock_get_buffer, \
-          patch('builtins.open', mock_open(read_data=initial_file_data)) as mock_file, \
+          patch('ssd.open', mock_open(read_data=initial_file_data), create=True) as mock_file, \
+          patch('ssd.replace_durably') as mock_replace, \
+          patch.object(BufferManager, 'begin_flush'), \
           patch.object(BufferManager, 'set_buffer') as mock_set_buffer, \
           patch.object(FileManager, 'write_output') as mock_write_output):
         ssd.run(commands[0])
 
+        mock_replace.assert_called_once_with("ssd_nand.txt.tmp", "ssd_nand.txt")
+
         args, kwargs = mock_set_buffer.call_args
         written_buffers = args[0]
         assert len(written_buffers) == 0
@@ -331,10 +348,9 @@ def test_flush_buffer_when_mode_is_flush_should_execute_instruction():
         assert write_calls == expected_calls
 
 
-def test_flush_buffer_when_buffers_are_full_should_execute_instruction():
-    ssd = SSD()
+def test_flush_buffer_when_buffers_are_full_should_execute_instruction(tmp_path):
     commands = [
-        [None, "W", "2", "0x12345678"]
+        [None, "W", "1", "0x12345678"]
     ]
     initial_buffers = [Buffer(command="W", lba=2, data="0xABCDABCD", range=""),
                        Buffer(command="W", lba=3, data="0xABCDABCD", range=""),
@@ -342,22 +358,44 @@ def test_flush_buffer_when_buffers_are_full_should_execute_instruction():
                        Buffer(command="W", lba=5, data="0xABCDABCD", range=""),
                        Buffer(command="W", lba=6, data="0xABCDABCD", range="")]
     initial_file_data = '0\t0x11111111\n1\t0x22222222\n2\t0x33333333\n3\t0x33333333\n4\t0x33333333\n5\t0x33333333\n6\t0x33333333\n'
-    expected = '0\t0x11111111\n1\t0x22222222\n2\t0xABCDABCD\n3\t0x33333333\n4\t0x33333333\n5\t0x33333333\n6\t0x33333333\n'
-    expected += '0\t0x11111111\n1\t0x22222222\n2\t0x33333333\n3\t0xABCDABCD\n4\t0x33333333\n5\t0x33333333\n6\t0x33333333\n'
-    expected += '0\t0x11111111\n1\t0x22222222\n2\t0x33333333\n3\t0x33333333\n4\t0xABCDABCD\n5\t0x33333333\n6\t0x33333333\n'
-    expected += '0\t0x11111111\n1\t0x22222222\n2\t0x33333333\n3\t0x33333333\n4\t0x33333333\n5\t0xABCDABCD\n6\t0x33333333\n'
-    expected += '0\t0x11111111\n1\t0x22222222\n2\t0x33333333\n3\t0x33333333\n4\t0x33333333\n5\t0x33333333\n6\t0xABCDABCD\n'
+    expected = '0\t0x11111111\n1\t0x12345678\n2\t0xABCDABCD\n3\t0xABCDABCD\n4\t0xABCDABCD\n5\t0xABCDABCD\n6\t0xABCDABCD\n'
     expected_lines = expected.splitlines(keepends=True)
 
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers) as mock_get_buffer, \
-          patch('builtins.open', mock_open(read_data=initial_file_data)) as mock_file, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer, \
-          patch.object(FileManager, 'write_output')):
+    ssd = make_buffered_ssd(tmp_path / "buffer.journal", initial_buffers, file_manager=FileManager())
+    with (patch('ssd.open', mock_open(read_data=initial_file_data), create=True) as mock_file, \
+          patch('ssd.replace_durably') as mock_replace, \
+          patch.object(FileManager, 'write_output') as mock_write_output):
         ssd.run(commands[0])
 
+        mock_replace.assert_called_once_with("ssd_nand.txt.tmp", "ssd_nand.txt")
+        mock_write_output.assert_called_once_with("")
         write_calls = mock_file().write.call_args_list
         expected_calls = [call(line) for line in expected_lines]
         assert write_calls == expected_calls
+        assert ssd.buffer_manager.get_buffer() == []
+
+
+def test_overwrite_in_full_buffer_does_not_flush(tmp_path):
+    initial_buffers = [Buffer(command="W", lba=lba, data="0xABCDABCD", range="") for lba in range(2, 7)]
+    ssd = make_buffered_ssd(tmp_path / "buffer.journal", initial_buffers, file_manager=FileManager())
+    with patch.object(SSD, 'flush') as mock_flush, patch.object(FileManager, 'write_output'):
+        ssd.run([None, "W", "2", "0x12345678"])
+
+    mock_flush.assert_not_called()
+    assert ssd.buffer_manager.lookup(2) == "0x12345678"
+
+
+@pytest.mark.parametrize("command", [[None, "R", "3"], [None, "RR", "0", "10"]])
+def test_read_with_full_buffer_does_not_flush(tmp_path, command):
+    initial_buffers = [Buffer(command="W", lba=lba, data="0xABCDABCD", range="") for lba in range(2, 7)]
+    ssd = make_buffered_ssd(tmp_path / "buffer.journal", initial_buffers, file_manager=FileManager())
+    with patch.object(SSD, 'flush') as mock_flush, patch.object(FileManager, 'read_nand', return_value="0x00000000"), \
+         patch.object(FileManager, 'read_nand_range', return_value=["0x00000000"] * 10), \
+         patch.object(FileManager, 'write_output'):
+        ssd.run(command)
+
+    mock_flush.assert_not_called()
+    assert len(ssd.buffer_manager) == 5
 
 
 def test_flush_buffer_should_write_empty_string_when_normal():
@@ -370,171 +408,82 @@ def test_flush_buffer_should_write_empty_string_when_normal():
     expected = '0\t0x11111111\n1\t0x22222222\n2\t0x33333333\n3\t0x33333333\n4\t0x33333333\n5\t0x33333333\n6\t0x33333333\n'
 
     with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers) as mock_get_buffer, \
-          patch('builtins.open', mock_open(read_data=initial_file_data)) as mock_file, \
+          patch('ssd.open', mock_open(read_data=initial_file_data), create=True) as mock_file, \
           patch.object(BufferManager, 'set_buffer') as mock_set_buffer, \
           patch.object(FileManager, 'write_output') as mock_write_buffer):
         ssd.run(commands[0])
         mock_write_buffer.assert_called_once_with("")
 
 
-def test_command_buffer_test_erase_keep_buffer():
-    ssd = SSD()
-    commands = [
-        [None, "E", "88", 6]
-    ]
+def run_erase_and_get_buffers(journal, command, initial_buffers):
+    ssd = make_buffered_ssd(journal, initial_buffers)
+    ssd.run(command)
+    return [(b.command, b.lba, b.range) for b in ssd.buffer_manager.get_buffer()]
+
+
+def test_command_buffer_test_erase_keep_buffer(tmp_path):
     initial_buffers = [
         Buffer(command="E", lba=93, data="", range=7),
     ]
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
-        ssd.run(commands[0])
+    buffers = run_erase_and_get_buffers(tmp_path / "buffer.journal", [None, "E", "88", 6], initial_buffers)
+    assert buffers == [("E", 88, 12)]
 
-        args, kwargs = mock_set_buffer.call_args
-        buffer_written1 = args[0][0]
-        assert buffer_written1.command == "E"
-        assert buffer_written1.lba == 93
-        assert buffer_written1.range == 7
-        assert len(args[0]) == 2
-        buffer_written1 = args[0][1]
-        assert buffer_written1.command == "E"
-        assert buffer_written1.lba == 88
-        assert buffer_written1.range == 6
-
-
-def test_command_buffer_test_erase_overlap_range():
-    ssd = SSD()
-    commands = [
-        [None, "E", "10", 3]
-    ]
+
+def test_command_buffer_test_erase_overlap_range(tmp_path):
     initial_buffers = [
         Buffer(command="E", lba=12, data="", range=2),
     ]
+    buffers = run_erase_and_get_buffers(tmp_path / "buffer.journal", [None, "E", "10", 3], initial_buffers)
+    assert buffers == [("E", 10, 4)]
 
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
-        ssd.run(commands[0])
-
-        args, kwargs = mock_set_buffer.call_args
-        buffer_written = args[0][0]
-        assert buffer_written.command == "E"
-        assert buffer_written.lba == 10
-        assert buffer_written.data == ""
-        assert buffer_written.range == 4
-
-        assert len(args[0]) == 1
 
-
-def test_command_buffer_test_erase_same_range_1():
-    ssd = SSD()
-    commands = [
-        [None, "E", "15", 5]
-    ]
+def test_command_buffer_test_erase_same_range_1(tmp_path):
     initial_buffers = [
         Buffer(command="E", lba=15, data="", range=5),
     ]
+    buffers = run_erase_and_get_buffers(tmp_path / "buffer.journal", [None, "E", "15", 5], initial_buffers)
+    assert buffers == [("E", 15, 5)]
 
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
-        ssd.run(commands[0])
-
-        args, kwargs = mock_set_buffer.call_args
-        buffer_written = args[0][0]
-        assert buffer_written.command == "E"
-        assert buffer_written.lba == 15
-        assert buffer_written.data == ""
-        assert buffer_written.range == 5
 
-        assert len(args[0]) == 1
-
-
-def test_command_buffer_test_erase_same_range_2():
-    ssd = SSD()
-    commands = [
-        [None, "E", "50", 6]
-    ]
+def test_command_buffer_test_erase_same_range_2(tmp_path):
     initial_buffers = [
         Buffer(command="E", lba=50, data="", range=6),
     ]
-
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
-        ssd.run(commands[0])
-
-        args, kwargs = mock_set_buffer.call_args
-        buffer_written1 = args[0][0]
-        assert buffer_written1.command == "E"
-        assert buffer_written1.lba == 50
-        assert buffer_written1.range == 6
-        assert len(args[0]) == 1
+    buffers = run_erase_and_get_buffers(tmp_path / "buffer.journal", [None, "E", "50", 6], initial_buffers)
+    assert buffers == [("E", 50, 6)]
 
 
-def test_command_buffer_test_erase_over10():
-    ssd = SSD()
-    commands = [
-        [None, "E", "22", 4]
-    ]
+def test_command_buffer_test_erase_over10(tmp_path):
     initial_buffers = [
         Buffer(command="E", lba=16, data="", range=9),
     ]
+    buffers = run_erase_and_get_buffers(tmp_path / "buffer.journal", [None, "E", "22", 4], initial_buffers)
+    assert buffers == [("E", 16, 10)]
 
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
-        ssd.run(commands[0])
 
-        args, kwargs = mock_set_buffer.call_args
-        buffer_written1 = args[0][0]
-        assert buffer_written1.command == "E"
-        assert buffer_written1.lba == 16
-        assert buffer_written1.range == 10
-        assert len(args[0]) == 1
+def test_erase_of_whole_device_is_one_buffer_entry(tmp_path):
+    initial_buffers = [
+        Buffer(command="E", lba=20, data="", range=5),
+        Buffer(command="W", lba=40, data="0x00000001", range=0),
+    ]
+    buffers = run_erase_and_get_buffers(tmp_path / "buffer.journal", [None, "E", "0", SIZE_LBA], initial_buffers)
+    assert buffers == [("E", 0, SIZE_LBA)]
 
 
-def test_erase_command_expands_buffer_range_by_merging():
-    ssd = SSD()
-    commands = [
-        [None, "E", "95", 5]
-    ]
+def test_erase_command_expands_buffer_range_by_merging(tmp_path):
     initial_buffers = [
         Buffer(command="E", lba=93, data="", range=7),
     ]
-
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
-        ssd.run(commands[0])
-        args, kwargs = mock_set_buffer.call_args
-        buffer_written1 = args[0][0]
-        assert buffer_written1.command == "E"
-        assert buffer_written1.lba == 93
-        assert buffer_written1.range == 7
-        assert len(args[0]) == 1
+    buffers = run_erase_and_get_buffers(tmp_path / "buffer.journal", [None, "E", "95", 5], initial_buffers)
+    assert buffers == [("E", 93, 7)]
 
 
-def test_command_buffer_erase_larger_new_range():
-    ssd = SSD()
-    commands = [
-        [None, "E", "50", 7]
-    ]
+def test_command_buffer_erase_larger_new_range(tmp_path):
     initial_buffers = [
         Buffer(command="E", lba=52, data="", range=2),
     ]
-
-    with (patch.object(BufferManager, 'get_buffer', return_value=initial_buffers),
-          patch('builtins.open', mock_open()) as mocked_open, \
-          patch.object(BufferManager, 'set_buffer') as mock_set_buffer):
-        ssd.run(commands[0])
-
-        args, kwargs = mock_set_buffer.call_args
-        buffer_written1 = args[0][0]
-        assert buffer_written1.command == "E"
-        assert buffer_written1.lba == 50
-        assert buffer_written1.range == 7
-        assert len(args[0]) == 1
+    buffers = run_erase_and_get_buffers(tmp_path / "buffer.journal", [None, "E", "50", 7], initial_buffers)
+    assert buffers == [("E", 50, 7)]
 
 
 def test_execute_command_when_flush_command_invalid_should_write_error():
@@ -586,8 +535,8 @@ def test_remove_erase_buffer_hard():
         [None, "W", "22", "0xABCDABC0"],
     ]
     expected = [
-        [None, "W", "21", "0xABCDABC0"],
         [None, "W", "20", "0xABCDABC0"],
+        [None, "W", "21", "0xABCDABC0"],
         [None, "W", "22", "0xABCDABC0"],
     ]
     execute_command_and_test_buffer_with_expected(commands, expected)
@@ -607,3 +556,104 @@ def execute_command_and_test_buffer_with_expected(commands, expected, data_flag=
             assert str(buffer_written.data) == gt[3]
         else:
             assert str(buffer_written.range) == gt[3]
+
+
+@pytest.fixture
+def ssd_in_tmp(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return SSD(file_manager=FileManager(), buffer_manager=BufferManager(), write_output_file=False)
+
+
+def test_run_batch_emits_one_result_per_command(ssd_in_tmp):
+    lines = ["W 3 0x00000003\n", "R 3\n", "\n", "E 3 1\n", "R 3\n", "R 100\n", "F\n"]
+    results = list(ssd_in_tmp.run_batch(lines))
+    assert results == ["", "0x00000003", "", "0x00000000", "ERROR", ""]
+
+
+def test_batch_mode_reports_missing_file(tmp_path):
+    ssd_py = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ssd.py")
+    result = subprocess.run([sys.executable, ssd_py, "B", "missing.txt"], cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 1
+    assert result.stdout == ""
+    assert result.stderr == "ssd.py B: cannot read missing.txt: No such file or directory\n"
+
+
+def test_run_batch_persists_nand_once(ssd_in_tmp, mocker):
+    spy = mocker.spy(FileManager, "_write_nand_file")
+    lines = [f"W {lba} 0x0000000{lba}" for lba in range(8)]
+    results = list(ssd_in_tmp.run_batch(lines))
+
+    assert results == [""] * 8
+    assert spy.call_count == 1
+    assert FileManager().read_nand(2) == "0x00000002"
+    assert len(BufferManager().get_buffer()) == 2
+
+
+def test_flush_rewrites_nand_once(ssd_in_tmp, mocker):
+    for lba in range(5):
+        ssd_in_tmp.run([None, "W", str(lba), f"0x0000000{lba}"])
+    ssd_in_tmp.run([None, "E", "2", "2"])
+    spy = mocker.spy(FileManager, "_write_nand_file")
+
+    assert ssd_in_tmp.run([None, "F"]) == ""
+    assert spy.call_count == 1
+    assert ssd_in_tmp.file_manager.read_nand_range(0, 5) == [
+        "0x00000000", "0x00000001", "0x00000000", "0x00000000", "0x00000004"
+    ]
+
+
+def test_flush_inside_batch_keeps_the_loaded_nand(ssd_in_tmp, mocker):
+    spy = mocker.spy(FileManager, "_write_nand_file")
+    lines = ["W 1 0x00000001", "F", "R 1", "W 2 0x00000002", "F"]
+    assert list(ssd_in_tmp.run_batch(lines)) == ["", "", "0x00000001", "", ""]
+    assert spy.call_count == 2
+
+
+def test_interrupted_flush_is_finished_by_the_next_command(ssd_in_tmp):
+    ssd_in_tmp.run([None, "W", "4", "0x00000004"])
+    ssd_in_tmp.buffer_manager.begin_flush()
+
+    restarted = SSD(file_manager=FileManager(), buffer_manager=BufferManager(), write_output_file=False)
+    assert restarted.buffer_manager.flush_pending
+    assert restarted.run([None, "R", "4"]) == "0x00000004"
+    assert restarted.file_manager.read_nand(4) == "0x00000004"
+    assert restarted.buffer_manager.get_buffer() == []
+    assert not BufferManager().flush_pending
+
+
+def test_range_read_overlays_buffer(ssd_in_tmp):
+    ssd_in_tmp.run([None, "RW", "0", "10", "0x11111111"])
+    ssd_in_tmp.run([None, "W", "2", "0x22222222"])
+    ssd_in_tmp.run([None, "E", "4", "2"])
+
+    values = ssd_in_tmp.run([None, "RR", "1", "7"]).split()
+    assert values == ["0x11111111", "0x22222222", "0x11111111", "0x00000000", "0x00000000", "0x11111111"]
+
+
+def test_range_write_repeats_pattern(ssd_in_tmp):
+    ssd_in_tmp.run([None, "W", "1", "0xFFFFFFFF"])
+    assert ssd_in_tmp.run([None, "RW", "0", "5", "0x00000001,0x00000002"]) == ""
+    values = ssd_in_tmp.run([None, "RR", "0", "6"]).split()
+    assert values == ["0x00000001", "0x00000002", "0x00000001", "0x00000002", "0x00000001", "0x00000000"]
+
+
+@pytest.mark.parametrize("backend", ["text", "image", "sparse"])
+def test_lowercase_values_read_back_alike_on_every_backend(tmp_path, monkeypatch, backend):
+    monkeypatch.chdir(tmp_path)
+    if backend != "text":
+        format_device(100, backend)
+    ssd = SSD(file_manager=create_file_manager(), buffer_manager=BufferManager(), write_output_file=False)
+    ssd.run([None, "W", "1", "0x0000abcd"])
+    ssd.run([None, "RW", "2", "4", "0xdeadbeef,0x0000ffff"])
+    assert ssd.run([None, "R", "1"]) == "0x0000ABCD"
+
+    ssd.run([None, "F"])
+    assert ssd.run([None, "R", "1"]) == "0x0000ABCD"
+    assert ssd.run([None, "RR", "1", "4"]) == "0x0000ABCD 0xDEADBEEF 0x0000FFFF"
+
+
+def test_range_commands_validate_arguments():
+    run_execute_command_and_assert([None, "RR", "5", "5"], 'w', 'ERROR')
+    run_execute_command_and_assert([None, "RR", "0", "101"], 'w', 'ERROR')
+    run_execute_command_and_assert([None, "RW", "0", "10", "0x1234"], 'w', 'ERROR')
+    run_execute_command_and_assert([None, "RW", "0", "10"], 'w', 'ERROR')
@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+
+from commands import ReadShellCommand, SocketExecutor, WriteShellCommand
+from constant import FILENAME, MESSAGE_DONE, ShellCommandEnum
+from shell import Shell, SocketSSDController, SSDController
+from ssd import format_device
+from ssd_server import MultiDeviceServer, SSDServer
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = SSDServer(str(tmp_path / "ssd.sock"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def executor(server):
+    executor = SocketExecutor(server.socket_path)
+    yield executor
+    executor.close()
+
+
+def test_socket_executor_returns_output_inline(executor):
+    assert WriteShellCommand("ssd.py", 3, "0x00000003", executor=executor).execute()
+    assert executor.output == ""
+
+    assert ReadShellCommand("ssd.py", 3, executor=executor).execute()
+    assert executor.output == "0x00000003"
+
+
+def test_socket_executor_reports_invalid_command(executor):
+    assert ReadShellCommand("ssd.py", 100, executor=executor).execute()
+    assert executor.output == "ERROR"
+
+
+def test_socket_executor_fails_without_daemon(tmp_path):
+    executor = SocketExecutor(str(tmp_path / "missing.sock"))
+    assert not ReadShellCommand("ssd.py", 0, executor=executor).execute()
+
+
+def test_flush_through_daemon_updates_nand(server, executor):
+    WriteShellCommand("ssd.py", 7, "0x12341234", executor=executor).execute()
+    executor.run("python", ["ssd.py", "F"])
+
+    with open(FILENAME) as f:
+        assert "7\t0x12341234\n" in f.read()
+
+
+def test_shell_with_socket_controller(executor, monkeypatch):
+    monkeypatch.setattr(SocketSSDController, "executor", executor)
+    monkeypatch.setattr(Shell.command_executor, "logging", lambda *args: None)
+    Shell.use_ssd_controller(SocketSSDController)
+    try:
+        assert SocketSSDController.write(5, "0x00000005") == MESSAGE_DONE
+        ret = Shell.execute_command(cmd=ShellCommandEnum.READ, args=[5])
+        assert ret == "[Read] LBA 05 : 0x00000005"
+    finally:
+        Shell.use_ssd_controller(SSDController)
+
+
+@pytest.fixture
+def multi_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root = tmp_path / "devices"
+    root.mkdir()
+    (root / "d0").mkdir()
+    format_device(1000, "image", str(root / "d1"))
+    server = MultiDeviceServer(str(root), str(tmp_path / "rack.sock"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_multi_device_server_routes_by_device(multi_server, tmp_path):
+    assert sorted(multi_server.devices) == ["d0", "d1"]
+    executors = {name: SocketExecutor(multi_server.socket_path, device=name) for name in ("d0", "d1")}
+    try:
+        for name, executor in executors.items():
+            assert WriteShellCommand("ssd.py", 3, f"0x0000000{name[1]}", executor=executor).execute()
+            assert executor.run("python", ["ssd.py", "F"])
+        assert executors["d1"].run("python", ["ssd.py", "I"]) and executors["d1"].output == "1000"
+
+        for name, executor in executors.items():
+            assert ReadShellCommand("ssd.py", 3, executor=executor).execute()
+            assert executor.output == f"0x0000000{name[1]}"
+    finally:
+        for executor in executors.values():
+            executor.close()
+
+    assert "3\t0x00000000\n" in (tmp_path / "devices" / "d0" / FILENAME).read_text()
+    assert not (tmp_path / FILENAME).exists()
+
+
+def test_multi_device_server_rejects_unknown_device(multi_server):
+    executor = SocketExecutor(multi_server.socket_path, device="missing")
+    try:
+        assert ReadShellCommand("ssd.py", 3, executor=executor).execute()
+        assert executor.output == "ERROR"
+    finally:
+        executor.close()
+    with pytest.raises(ValueError):
+        multi_server.mount("../escape")
+
+
+def test_multi_device_server_serves_devices_concurrently(multi_server):
+    names = [f"rack{i}" for i in range(8)]
+    for name in names:
+        multi_server.mount(name)
+
+    def drive(name: str, results: dict) -> None:
+        executor = SocketExecutor(multi_server.socket_path, device=name)
+        value = f"0x{int(name[4:]):08X}"
+        try:
+            for lba in range(20):
+                WriteShellCommand("ssd.py", lba, value, executor=executor).execute()
+            ReadShellCommand("ssd.py", 19, executor=executor).execute()
+            results[name] = executor.output == value
+        finally:
+            executor.close()
+
+    results = {}
+    threads = [threading.Thread(target=drive, args=(name, results)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == dict.fromkeys(names, True)
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import tracing
+from buffer_manager import BufferManager
+from ssd import SSD, FileManager
+
+
+@pytest.fixture
+def trace():
+    tracing.enable()
+    yield
+    tracing.disable()
+
+
+@tracing.traced
+def outer():
+    with tracing.span("inner", lba=3):
+        pass
+
+
+def test_spans_nest_by_time(trace):
+    outer()
+    inner, outer_event = tracing.disable()
+
+    assert (inner["name"], outer_event["name"]) == ("inner", "outer")
+    assert inner["args"] == {"lba": 3}
+    assert outer_event["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer_event["ts"] + outer_event["dur"]
+    assert all(event["ph"] == "X" for event in (inner, outer_event))
+
+
+def test_nothing_is_recorded_when_off():
+    assert not tracing.enabled()
+    assert tracing.span("inner") is tracing.span("other")
+    outer()
+    assert tracing.disable() == []
+
+
+def test_write_trace_appends_json_array(tmp_path, trace):
+    path = tmp_path / "trace.json"
+    outer()
+    tracing.write_trace(str(path), tracing.disable())
+    tracing.enable()
+    outer()
+    tracing.write_trace(str(path), tracing.disable())
+
+    events = json.loads(path.read_text().rstrip().rstrip(",") + "]")
+    assert [event["name"] for event in events] == ["inner", "outer"] * 2
+
+
+def test_ssd_command_records_nested_spans(tmp_path, monkeypatch, trace):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(file_manager=FileManager(), buffer_manager=BufferManager(), write_output_file=False)
+    ssd.run([None, "W", "3", "0x00000003"])
+    ssd.run([None, "F"])
+
+    names = [event["name"] for event in tracing.disable()]
+    assert names.count("SSD.run") == 2
+    assert {"SSD._validate_command", "SSD._execute_command", "SSD.flush",
+            "BufferManager._register_buffer", "FileManager._write_nand_file"} <= set(names)
@@ -0,0 +1,159 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from buffer_manager import BufferManager
+from ssd import SSD, FileManager, ImageFileManager, format_device
+from trim import TRIM_COMPACT_EXTENTS, TrimExtents
+
+
+SSD_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ssd.py")
+
+
+def run_ssd(cwd, *args) -> str:
+    """Run one ssd.py command in its own process and return what it wrote to ssd_output.txt."""
+    subprocess.run([sys.executable, SSD_PY, *args], cwd=cwd, check=True)
+    output = cwd / "ssd_output.txt"
+    return output.read_text() if output.exists() else ""
+
+
+@pytest.fixture
+def extents(tmp_path):
+    return TrimExtents(str(tmp_path / "ssd_nand.txt.trim"))
+
+
+def test_add_merges_overlapping_and_touching_extents(extents):
+    extents.add(10, 20)
+    extents.add(30, 40)
+    extents.add(20, 25)
+    assert list(extents) == [(10, 25), (30, 40)]
+    extents.add(5, 35)
+    assert list(extents) == [(5, 40)]
+
+
+def test_remove_splits_extents(extents):
+    extents.add(0, 100)
+    assert extents.remove(10, 11)
+    assert extents.remove(50, 60)
+    assert not extents.remove(55, 58)
+    assert list(extents) == [(0, 10), (11, 50), (60, 100)]
+    assert extents.contains(0) and not extents.contains(10) and not extents.contains(100)
+    assert extents.overlapping(5, 65) == [(5, 10), (11, 50), (60, 65)]
+
+
+def test_save_and_load_round_trip(extents):
+    extents.add(3, 7)
+    extents.save()
+    assert list(TrimExtents(extents.path)) == [(3, 7)]
+    extents.clear()
+    extents.save()
+    assert not os.path.exists(extents.path)
+
+
+def test_text_erase_is_metadata_until_the_next_rewrite(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    file_manager = FileManager()
+    file_manager.write_nand_range(0, ["0x00000001"] * 100)
+    nand_before = (tmp_path / "ssd_nand.txt").read_text()
+
+    assert file_manager.erase_nand(10, 80)
+    assert (tmp_path / "ssd_nand.txt").read_text() == nand_before
+    assert (tmp_path / "ssd_nand.txt.trim").read_text() == "10 90\n"
+    assert FileManager().read_nand_range(8, 12) == ["0x00000001"] * 2 + ["0x00000000"] * 2
+
+    assert file_manager.write_nand(50, "0x00000050")
+    assert not (tmp_path / "ssd_nand.txt.trim").exists()
+    values = FileManager().read_nand_range(0, 100)
+    assert values == ["0x00000001"] * 10 + ["0x00000000"] * 40 + ["0x00000050"] + ["0x00000000"] * 39 \
+        + ["0x00000001"] * 10
+
+
+def test_image_write_cuts_trimmed_extent(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    file_manager = ImageFileManager(capacity=1000)
+    file_manager.fill_nand_range(0, 1000, ["0xFFFFFFFF"])
+    file_manager.erase_nand(0, 1000)
+    file_manager.write_nand(500, "0x00000500")
+    file_manager.commit()
+
+    reopened = ImageFileManager()
+    assert reopened.read_nand(499) == "0x00000000"
+    assert reopened.read_nand(500) == "0x00000500"
+    assert reopened.read_nand_joined(498, 502, [], {501: "0x00000001"}) == \
+        "0x00000000 0x00000000 0x00000500 0x00000001"
+
+
+def test_image_compacts_many_extents(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    file_manager = ImageFileManager(capacity=1000)
+    file_manager.fill_nand_range(0, 1000, ["0xFFFFFFFF"])
+    for lba in range(0, 2 * (TRIM_COMPACT_EXTENTS + 1), 2):
+        file_manager.erase_nand(lba, 1)
+    file_manager.commit()
+
+    assert len(file_manager.trim) == 0
+    assert not os.path.exists("ssd_nand.img.trim")
+    assert file_manager.image.read_range(0, 4) == [0, 0xFFFFFFFF, 0, 0xFFFFFFFF]
+
+
+@pytest.mark.parametrize("file_manager_type", [FileManager, ImageFileManager])
+def test_ssd_erase_then_read_through_trim(tmp_path, monkeypatch, file_manager_type):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(file_manager=file_manager_type(), buffer_manager=BufferManager(), write_output_file=False)
+    ssd.run([None, "RW", "0", "100", "0x12345678"])
+    ssd.run([None, "E", "20", "10"])
+    ssd.run([None, "F"])
+    assert ssd.run([None, "R", "25"]) == "0x00000000"
+    assert ssd.run([None, "RR", "18", "22"]) == "0x12345678 0x12345678 0x00000000 0x00000000"
+
+
+def test_format_drops_trimmed_extents(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    file_manager = ImageFileManager(capacity=100)
+    file_manager.erase_nand(0, 100)
+    file_manager.commit()
+    format_device(100)
+    assert len(ImageFileManager().trim) == 0
+
+
+def test_text_write_over_last_extent_survives_new_processes(tmp_path):
+    run_ssd(tmp_path, "E", "5", "1")
+    run_ssd(tmp_path, "F")
+    run_ssd(tmp_path, "W", "5", "0x12345678")
+    run_ssd(tmp_path, "F")
+    assert run_ssd(tmp_path, "R", "5") == "0x12345678"
+    assert not (tmp_path / "ssd_nand.txt.trim").exists()
+
+    run_ssd(tmp_path, "E", "0", "1")
+    run_ssd(tmp_path, "F")
+    run_ssd(tmp_path, "RW", "0", "10", "0x11111111")
+    assert run_ssd(tmp_path, "R", "0") == "0x11111111"
+    run_ssd(tmp_path, "W", "50", "0x00000050")
+    run_ssd(tmp_path, "F")
+    assert (tmp_path / "ssd_nand.txt").read_text().splitlines()[0] == "0\t0x11111111"
+
+
+def test_image_range_write_over_extent_survives_new_processes(tmp_path):
+    run_ssd(tmp_path, "--format", "100")
+    run_ssd(tmp_path, "E", "0", "100")
+    run_ssd(tmp_path, "F")
+    run_ssd(tmp_path, "RW", "0", "100", "0x11111111")
+    assert run_ssd(tmp_path, "R", "5") == "0x11111111"
+    assert run_ssd(tmp_path, "RR", "0", "3") == "0x11111111 0x11111111 0x11111111"
+    assert not (tmp_path / "ssd_nand.img.trim").exists()
+
+
+@pytest.mark.parametrize("file_manager_type", [FileManager, ImageFileManager])
+def test_long_lived_manager_keeps_erases_of_other_managers(tmp_path, monkeypatch, file_manager_type):
+    monkeypatch.chdir(tmp_path)
+    first = file_manager_type()
+    first.write_nand(5, "0x12345678")
+
+    file_manager_type().erase_nand(0, 10)
+    assert first.read_nand(5) == "0x00000000"
+    first.erase_nand(50, 1)
+    first.write_nand(60, "0x00000060")
+    assert first.read_nand(5) == "0x00000000"
+    assert file_manager_type().read_nand(5) == "0x00000000"
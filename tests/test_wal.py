@@ -0,0 +1,125 @@
+import gc
+import weakref
+from unittest.mock import call, patch
+
+import pytest
+
+import wal as wal_module
+from wal import (
+    FSYNC_ALWAYS,
+    FSYNC_INTERVAL,
+    FSYNC_NONE,
+    FSYNC_POLICY_ENV,
+    WriteAheadLog,
+    fsync_policy,
+    replace_durably
+)
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / "ssd.wal"
+
+
+def test_read_tail_returns_only_new_records(log_path):
+    wal = WriteAheadLog(log_path, policy=FSYNC_NONE)
+    wal.append("W:1:0x00000001")
+    wal.append("E:2:3")
+
+    reader = WriteAheadLog(log_path, policy=FSYNC_NONE)
+    assert reader.read_tail() == (True, ["W:1:0x00000001", "E:2:3"])
+    assert reader.read_tail() == (False, [])
+
+    wal.append("F")
+    assert reader.read_tail() == (False, ["F"])
+    assert reader.num_records == 3
+
+
+def test_read_tail_cuts_corrupt_tail(log_path):
+    wal = WriteAheadLog(log_path, policy=FSYNC_NONE)
+    wal.append("W:1:0x00000001")
+    with open(log_path, "ab") as f:
+        f.write(WriteAheadLog.encode("W:2:0x00000002").replace(b"W:2", b"W:3"))
+
+    assert WriteAheadLog(log_path, policy=FSYNC_NONE).read_tail() == (True, ["W:1:0x00000001"])
+    assert log_path.read_bytes() == WriteAheadLog.encode("W:1:0x00000001")
+
+
+def test_checkpoint_replaces_log(log_path):
+    wal = WriteAheadLog(log_path, policy=FSYNC_NONE)
+    reader = WriteAheadLog(log_path, policy=FSYNC_NONE)
+    for lba in range(10):
+        wal.append(f"W:{lba}:0x00000000")
+    reader.read_tail()
+
+    wal.checkpoint("W:9:0x00000000")
+    assert wal.num_records == 1
+    assert reader.read_tail() == (True, ["W:9:0x00000000"])
+
+
+def test_always_policy_syncs_every_append(log_path, mocker):
+    fsync = mocker.patch("wal.os.fsync")
+    wal = WriteAheadLog(log_path, policy=FSYNC_ALWAYS)
+    wal.append("W:1:0x00000001")
+    wal.append("W:2:0x00000002")
+    assert fsync.call_count == 2
+
+
+def test_interval_policy_groups_appends(log_path, mocker):
+    fsync = mocker.patch("wal.fsync_path")
+    wal = WriteAheadLog(log_path, policy=FSYNC_INTERVAL, interval=60)
+    wal.append("W:1:0x00000001")
+    wal.append("W:2:0x00000002")
+    wal.append("W:3:0x00000003")
+    assert fsync.call_count == 1
+
+    wal.sync()
+    assert fsync.call_count == 2
+    wal.sync()
+    assert fsync.call_count == 2
+
+
+def test_interval_logs_are_synced_at_exit_without_being_kept_alive(log_path, mocker):
+    fsync = mocker.patch("wal.fsync_path")
+    wal = WriteAheadLog(log_path, policy=FSYNC_INTERVAL, interval=60)
+    wal.append("W:1:0x00000001")
+    wal.append("W:2:0x00000002")
+    timer = wal._timer
+    wal_module._sync_interval_logs()
+    assert fsync.call_count == 2
+
+    # The pending timer is cancelled too, so it stops referencing the log.
+    timer.join()
+    del timer
+    ref = weakref.ref(wal)
+    del wal
+    gc.collect()
+    assert ref() is None
+
+
+def test_replace_skips_directory_sync_on_windows(tmp_path, mocker):
+    fsync = mocker.patch("wal.fsync_path")
+    tmp_file = tmp_path / "ssd_nand.txt.tmp"
+    tmp_file.write_text("0\t0x00000000\n")
+    with patch.object(wal_module.os, "name", "nt"):
+        replace_durably(str(tmp_file), str(tmp_path / "ssd_nand.txt"), FSYNC_INTERVAL)
+    assert fsync.call_args_list == [call(str(tmp_file))]
+    assert (tmp_path / "ssd_nand.txt").exists()
+
+
+def test_none_policy_never_syncs(log_path, mocker):
+    fsync = mocker.patch("wal.os.fsync")
+    wal = WriteAheadLog(log_path, policy=FSYNC_NONE)
+    wal.append("W:1:0x00000001")
+    wal.checkpoint()
+    fsync.assert_not_called()
+
+
+def test_fsync_policy_from_environment(monkeypatch):
+    monkeypatch.delenv(FSYNC_POLICY_ENV, raising=False)
+    assert fsync_policy() == FSYNC_INTERVAL
+    monkeypatch.setenv(FSYNC_POLICY_ENV, FSYNC_ALWAYS)
+    assert fsync_policy() == FSYNC_ALWAYS
+    monkeypatch.setenv(FSYNC_POLICY_ENV, "sometimes")
+    with pytest.raises(ValueError):
+        fsync_policy()
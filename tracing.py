@@ -0,0 +1,111 @@
+"""Nested timing spans exported as a Chrome / Perfetto trace.
+
+Set $SSD_TRACE to a file name to record spans in the shell and in every ssd.py it starts.
+Each process appends its spans to that file at exit in the JSON array trace format, which
+chrome://tracing and ui.perfetto.dev open directly. Spans on the same thread nest by time.
+With the process transport, the gap between a ProcessExecutor.run span and the main span
+of the ssd.py it started is interpreter startup and imports.
+
+With tracing off, span() returns one shared no-op context manager and a @traced function
+costs a single global check before calling through.
+"""
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+TRACE_ENV = "SSD_TRACE"
+
+_events: Optional[list[dict]] = None
+_NO_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ("name", "args", "begin")
+
+    def __init__(self, name: str, args: Optional[dict]) -> None:
+        self.name = name
+        self.args = args
+        self.begin = 0
+
+    def __enter__(self) -> "_Span":
+        self.begin = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        end = time.perf_counter_ns()
+        if _events is None:
+            return
+        event = {
+            "name": self.name,
+            "cat": "ssd",
+            "ph": "X",
+            "ts": self.begin / 1000,
+            "dur": (end - self.begin) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if self.args:
+            event["args"] = self.args
+        _events.append(event)
+
+
+def enabled() -> bool:
+    return _events is not None
+
+
+def enable() -> None:
+    global _events
+    if _events is None:
+        _events = []
+
+
+def disable() -> list[dict]:
+    """Stop recording and return the spans recorded so far."""
+    global _events
+    events, _events = _events or [], None
+    return events
+
+
+def span(name: str, **args) -> contextlib.AbstractContextManager:
+    if _events is None:
+        return _NO_SPAN
+    return _Span(name, args)
+
+
+def traced(fn: Callable) -> Callable:
+    """Record every call of `fn` as a span named after its qualified name."""
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _events is None:
+            return fn(*args, **kwargs)
+        with _Span(name, None):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def write_trace(path: str, events: list[dict]) -> None:
+    """Append spans to a JSON array trace; the closing bracket is optional in that format."""
+    if not events:
+        return
+    with open(path, "a") as f:
+        if f.tell() == 0:
+            f.write("[\n")
+        f.write("".join(f"{json.dumps(event)},\n" for event in events))
+
+
+def _write_at_exit(path: str) -> None:
+    write_trace(path, disable())
+
+
+if os.environ.get(TRACE_ENV):
+    enable()
+    # Resolve now: the shell and the benchmarks change directory while running.
+    atexit.register(_write_at_exit, os.path.abspath(os.environ[TRACE_ENV]))
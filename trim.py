@@ -0,0 +1,113 @@
+import os
+from bisect import bisect_left, bisect_right
+from typing import Iterator, Optional
+
+from wal import replace_durably
+
+TRIM_SUFFIX = ".trim"
+TRIM_COMPACT_EXTENTS = 64
+
+
+class TrimExtents:
+    """Erased LBAs kept as metadata: sorted, disjoint [start, end) extents that read as zero.
+
+    Adding or removing a range only touches the extents it overlaps, so erasing a large
+    region costs O(#extents) instead of O(LBAs). The NAND under an extent may still hold
+    stale values until the owner zeroes them and clears the extent. save() writes one
+    "start end" line per extent to a file beside the NAND, or removes it when empty, and
+    refresh() reloads that file once another process has changed it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        self.dirty: bool = False
+        self._stamp: Optional[tuple[int, int, int]] = None
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return zip(self._starts, self._ends)
+
+    def stamp(self) -> Optional[tuple[int, int, int]]:
+        """Inode, size and mtime of the saved extents, or None when there are none."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def load(self) -> None:
+        self._starts, self._ends = [], []
+        self._stamp = self.stamp()
+        if self._stamp is not None:
+            with open(self.path, "r") as f:
+                for line in f:
+                    start, end = line.split()
+                    self._starts.append(int(start))
+                    self._ends.append(int(end))
+        self.dirty = False
+
+    def save(self) -> None:
+        if not self._starts:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        else:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.writelines(f"{start} {end}\n" for start, end in self)
+            replace_durably(tmp_path, self.path)
+        self._stamp = self.stamp()
+        self.dirty = False
+
+    def refresh(self) -> None:
+        """Reload the saved extents if they changed since this object last loaded or saved them.
+
+        Unsaved changes are kept; the owner refreshes before making them.
+        """
+        if not self.dirty and self.stamp() != self._stamp:
+            self.load()
+
+    def add(self, start: int, end: int) -> None:
+        """Trim [start, end), merging it with every extent it overlaps or touches."""
+        lo = bisect_left(self._ends, start)
+        hi = bisect_right(self._starts, end)
+        if lo < hi:
+            start, end = min(start, self._starts[lo]), max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+        self.dirty = True
+
+    def remove(self, start: int, end: int) -> bool:
+        """Stop treating [start, end) as erased, splitting extents at its edges."""
+        lo = bisect_right(self._ends, start)
+        hi = bisect_left(self._starts, end)
+        if lo >= hi:
+            return False
+        pieces = []
+        if self._starts[lo] < start:
+            pieces.append((self._starts[lo], start))
+        if self._ends[hi - 1] > end:
+            pieces.append((end, self._ends[hi - 1]))
+        self._starts[lo:hi] = [s for s, _ in pieces]
+        self._ends[lo:hi] = [e for _, e in pieces]
+        self.dirty = True
+        return True
+
+    def contains(self, lba: int) -> bool:
+        idx = bisect_right(self._starts, lba) - 1
+        return idx >= 0 and lba < self._ends[idx]
+
+    def overlapping(self, start: int, end: int) -> list[tuple[int, int]]:
+        """Trimmed parts of [start, end)."""
+        lo = bisect_right(self._ends, start)
+        hi = bisect_left(self._starts, end)
+        return [(max(s, start), min(e, end)) for s, e in zip(self._starts[lo:hi], self._ends[lo:hi])]
+
+    def clear(self) -> None:
+        if self._starts:
+            self._starts, self._ends = [], []
+            self.dirty = True
@@ -28,7 +28,7 @@ def get_two_diff_random_value(num_digit: int = 8, format_hexadecimal: bool = Tru
     return value1, value2
 
 
-def validate_erase_args(lba: int, size: int) -> bool:
+def validate_erase_args(lba: int, size: int, capacity: int = SIZE_LBA) -> bool:
     if not isinstance(lba, int):
         return False
     if not isinstance(size, int):
@@ -37,23 +37,23 @@ def validate_erase_args(lba: int, size: int) -> bool:
     start, end = (lba, lba + size)
     if start < 0:
         return False
-    if end > SIZE_LBA:
+    if end > capacity:
         return False
-    if size < 1 or size > SIZE_LBA:
+    if size < 1 or size > capacity:
         return False
     return True
 
 
-def validate_erase_range_args(start_lba: int, end_lba: int) -> bool:
+def validate_erase_range_args(start_lba: int, end_lba: int, capacity: int = SIZE_LBA) -> bool:
     if not isinstance(start_lba, int):
         return False
     if not isinstance(end_lba, int):
         return False
 
-    if start_lba < 0 or start_lba > SIZE_LBA - 1:
+    if start_lba < 0 or start_lba > capacity - 1:
         return False
 
-    if end_lba < 0 or end_lba > SIZE_LBA - 1:
+    if end_lba < 0 or end_lba > capacity - 1:
         return False
 
     if start_lba > end_lba:
@@ -62,6 +62,16 @@ def validate_erase_range_args(start_lba: int, end_lba: int) -> bool:
     return True
 
 
+def validate_range_args(start_lba: int, end_lba: int, capacity: int = SIZE_LBA) -> bool:
+    """Validate a half-open LBA range [start_lba, end_lba)."""
+    if not isinstance(start_lba, int):
+        return False
+    if not isinstance(end_lba, int):
+        return False
+
+    return 0 <= start_lba < end_lba <= capacity
+
+
 def validate_hexadecimal(data: str) -> bool:
     num_hex = 16
     num_digit = 8
@@ -0,0 +1,190 @@
+import atexit
+import os
+import threading
+import time
+import weakref
+import zlib
+from pathlib import Path
+from typing import Optional
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_NONE = "none"
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NONE)
+FSYNC_POLICY_ENV = "SSD_FSYNC"
+FSYNC_INTERVAL_ENV = "SSD_FSYNC_INTERVAL"
+FSYNC_INTERVAL_DEFAULT = 1.0
+
+
+def fsync_policy() -> str:
+    """The fsync policy selected by $SSD_FSYNC: "always", "interval" (default) or "none"."""
+    policy = os.environ.get(FSYNC_POLICY_ENV, FSYNC_INTERVAL)
+    if policy not in FSYNC_POLICIES:
+        raise ValueError(f"{FSYNC_POLICY_ENV} should be one of {FSYNC_POLICIES}")
+    return policy
+
+
+def fsync_path(path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path) -> None:
+    """Sync the entries of a directory. Windows cannot open directories and journals renames itself."""
+    if os.name == "nt":
+        return
+    fsync_path(path)
+
+
+def replace_durably(tmp_path, path, policy: Optional[str] = None) -> None:
+    """os.replace() a fully written temporary file, syncing it and the rename unless fsync is off."""
+    if (policy or fsync_policy()) != FSYNC_NONE:
+        fsync_path(tmp_path)
+        os.replace(tmp_path, path)
+        fsync_directory(os.path.dirname(os.path.abspath(path)))
+    else:
+        os.replace(tmp_path, path)
+
+
+class WriteAheadLog:
+    """Append-only log of checksummed records, one "<crc32>\\t<payload>\\n" line each.
+
+    Records are synced to disk according to the fsync policy: after every append
+    ("always"), at most `interval` seconds after an append, grouping whatever arrived in
+    between ("interval"), or never ("none"). A checkpoint replaces the whole log with a
+    single record through a temporary file.
+
+    read_tail() returns only the records appended since the previous call, so replay
+    costs time proportional to the log tail. A torn or corrupt tail is cut off.
+    """
+
+    def __init__(self, path, policy: Optional[str] = None, interval: Optional[float] = None) -> None:
+        self.path: Path = Path(path)
+        self.policy: str = policy or fsync_policy()
+        self.interval: float = (
+            interval if interval is not None
+            else float(os.environ.get(FSYNC_INTERVAL_ENV, FSYNC_INTERVAL_DEFAULT))
+        )
+        self.num_records: int = 0
+        self._inode: Optional[int] = None
+        self._offset: int = 0
+        self._dirty: bool = False
+        self._synced_at: float = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self.path.touch(exist_ok=True)
+        if self.policy == FSYNC_INTERVAL:
+            _interval_logs.add(self)
+
+    def append(self, payload: str) -> None:
+        with open(self.path, "ab") as f:
+            f.write(self.encode(payload))
+            if self.policy == FSYNC_ALWAYS:
+                f.flush()
+                os.fsync(f.fileno())
+        self.num_records += 1
+        self._sync_position()
+        if self.policy == FSYNC_INTERVAL:
+            self._schedule_sync()
+
+    def checkpoint(self, payload: str = "") -> None:
+        """Replace the log with one record holding `payload`, or with nothing."""
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            if payload:
+                f.write(self.encode(payload))
+        replace_durably(tmp_path, self.path, self.policy)
+        self.num_records = 1 if payload else 0
+        self._sync_position()
+        with self._lock:
+            self._dirty = False
+
+    def read_tail(self) -> tuple[bool, list[str]]:
+        """Payloads appended since the last call, and whether the log was replaced in between.
+
+        When it was replaced (by a checkpoint in another process), the payloads cover the
+        whole log and state built from earlier records has to be dropped first.
+        """
+        stat = os.stat(self.path)
+        if stat.st_ino == self._inode and stat.st_size == self._offset:
+            return False, []
+
+        replaced = stat.st_ino != self._inode or stat.st_size < self._offset
+        if replaced:
+            self.num_records, self._offset = 0, 0
+
+        payloads = []
+        offset = self._offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                payload = self.decode(line)
+                if payload is None:
+                    break
+                payloads.append(payload)
+                offset += len(line)
+
+        if offset != stat.st_size:
+            os.truncate(self.path, offset)
+        self.num_records += len(payloads)
+        self._inode, self._offset = stat.st_ino, offset
+        return replaced, payloads
+
+    def sync(self) -> None:
+        with self._lock:
+            timer, self._timer = self._timer, None
+            if timer is not None and timer is not threading.current_thread():
+                timer.cancel()
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._synced_at = time.monotonic()
+        try:
+            fsync_path(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _schedule_sync(self) -> None:
+        """Sync now if the last sync is older than the interval, otherwise once it is."""
+        with self._lock:
+            self._dirty = True
+            if self._timer is not None:
+                return
+            wait = self._synced_at + self.interval - time.monotonic()
+            if wait > 0:
+                self._timer = threading.Timer(wait, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self.sync()
+
+    def _sync_position(self) -> None:
+        stat = os.stat(self.path)
+        self._inode, self._offset = stat.st_ino, stat.st_size
+
+    @staticmethod
+    def encode(payload: str) -> bytes:
+        data = payload.encode()
+        return b"%08x\t%s\n" % (zlib.crc32(data), data)
+
+    @staticmethod
+    def decode(line: bytes) -> Optional[str]:
+        if not line.endswith(b"\n"):
+            return None
+        checksum, _, data = line.rstrip(b"\n").partition(b"\t")
+        if checksum != b"%08x" % zlib.crc32(data):
+            return None
+        return data.decode()
+
+
+_interval_logs: "weakref.WeakSet[WriteAheadLog]" = weakref.WeakSet()
+
+
+@atexit.register
+def _sync_interval_logs() -> None:
+    """Sync the appends still waiting for their interval in every live log."""
+    for wal in list(_interval_logs):
+        wal.sync()